@@ -0,0 +1,140 @@
+# backend/admission.py
+"""
+Приём запросов к STT и маршрутизации до того, как они займут память и потоки:
+- тело больше лимита -> 413 (по Content-Length сразу, без него — как только счётчик превысит лимит)
+- token bucket на клиента -> 429 с Retry-After (один киоск не забивает сервер)
+- общий лимит одновременных запросов -> 503 с Retry-After (перегрузка = быстрые отказы)
+Состояние — в памяти процесса; при нескольких воркерах лимиты действуют на каждый отдельно.
+"""
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+
+from .metrics import REJECTED
+
+
+class TokenBucket:
+    """rate токенов в секунду, не больше burst; take() -> 0 или сколько секунд ждать токен."""
+    __slots__ = ("rate", "burst", "tokens", "stamp")
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate, self.burst = rate, burst
+        self.tokens, self.stamp = burst, now
+
+    def take(self, now: float) -> float:
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return 0.0
+        return (1.0 - self.tokens) / self.rate
+
+
+class ClientLimiter:
+    """Корзины по клиентам; самые давние вытесняются сверх max_clients (LRU)."""
+    def __init__(self, rate: float, burst: float, max_clients: int = 4096):
+        self.rate, self.burst, self.max_clients = rate, max(1.0, burst), max_clients
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, client: str) -> float:
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        with self._lock:
+            b = self._buckets.get(client)
+            if b is None:
+                b = self._buckets[client] = TokenBucket(self.rate, self.burst, now)
+                if len(self._buckets) > self.max_clients:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(client)
+            return b.take(now)
+
+
+def client_id(scope, trust_proxy: bool = False) -> str:
+    if trust_proxy:
+        for name, value in scope.get("headers", []):
+            if name == b"x-forwarded-for":
+                return value.decode("latin-1").split(",")[0].strip()
+    client = scope.get("client")
+    return client[0] if client else "-"
+
+
+def _content_length(scope) -> Optional[int]:
+    for name, value in scope.get("headers", []):
+        if name == b"content-length":
+            try:
+                return int(value)
+            except ValueError:
+                return None
+    return None
+
+
+class AdmissionMiddleware:
+    """
+    ASGI-middleware для перечисленных путей: limits = {path: макс. байт тела}.
+    WebSocket на этих путях проверяется только корзиной клиента (при рукопожатии);
+    объём и длительность каждой фразы в потоке ограничивает StreamSession.
+    """
+    def __init__(self, app, limits: Dict[str, int], rate: float, burst: float,
+                 max_concurrent: int, trust_proxy: bool = False):
+        self.app = app
+        self.limits = limits
+        self.clients = ClientLimiter(rate, burst)
+        self.max_concurrent = max_concurrent
+        self.trust_proxy = trust_proxy
+        # все запросы идут в одном event loop — счётчику lock не нужен
+        self.active = 0
+
+    async def _reject(self, scope, receive, send, status: int, reason: str, detail: str,
+                      retry_after: Optional[float] = None):
+        REJECTED.inc(reason)
+        headers = {"Retry-After": str(max(1, math.ceil(retry_after)))} if retry_after is not None else None
+        await JSONResponse({"detail": detail}, status_code=status, headers=headers)(scope, receive, send)
+
+    async def __call__(self, scope, receive, send):
+        limit = self.limits.get(scope.get("path", "")) if scope["type"] in ("http", "websocket") else None
+        if limit is None:
+            return await self.app(scope, receive, send)
+
+        wait = self.clients.take(client_id(scope, self.trust_proxy))
+        if scope["type"] == "websocket":
+            if wait:
+                REJECTED.inc("rate")
+                await send({"type": "websocket.close", "code": 1013})
+                return
+            return await self.app(scope, receive, send)
+
+        if wait:
+            return await self._reject(scope, receive, send, 429, "rate", "слишком много запросов", wait)
+        size = _content_length(scope)
+        if size is not None and size > limit:
+            return await self._reject(scope, receive, send, 413, "too_large", f"тело больше {limit} байт")
+        if self.active >= self.max_concurrent > 0:
+            return await self._reject(scope, receive, send, 503, "busy", "сервер перегружен, попробуйте позже", 1)
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # chunked-загрузка без Content-Length: обрываем чтение на лимите
+                    REJECTED.inc("too_large")
+                    raise HTTPException(status_code=413, detail=f"тело больше {limit} байт")
+            return message
+
+        self.active += 1
+        try:
+            await self.app(scope, limited_receive, send)
+        finally:
+            self.active -= 1
+
@@ -0,0 +1,110 @@
+# backend/answer_cache.py
+"""
+Кэш ответов /api/ask-text и /api/ask-voice: нормализованный запрос -> результат маршрутизации.
+Ключ включает хэш index.json, поэтому после перезагрузки каталога старые ответы
+просто перестают находиться (и вытесняются по LRU/TTL).
+Локальный уровень — LRU+TTL в памяти процесса; опционально общий уровень в SQLite,
+чтобы воркеры gunicorn делились попаданиями.
+"""
+import json
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+from .utils import TTLCache
+
+
+class SqliteStore:
+    """Общий для процессов словарь key -> JSON со сроком жизни (WAL, соединение на поток)."""
+    PRUNE_EVERY = 256
+
+    def __init__(self, path: str, ttl: float, maxsize: int):
+        self.path, self.ttl, self.maxsize = path, ttl, maxsize
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._puts = 0
+        with self._conn() as db:
+            db.execute("CREATE TABLE IF NOT EXISTS answers "
+                       "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)")
+            db.execute("CREATE INDEX IF NOT EXISTS answers_expires ON answers(expires)")
+
+    def _conn(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = self._local.db = sqlite3.connect(self.path, timeout=0.5, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    def get(self, key: str) -> Optional[Dict]:
+        row = self._conn().execute("SELECT value FROM answers WHERE key = ? AND expires > ?",
+                                   (key, time.time())).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, key: str, value: Dict):
+        db = self._conn()
+        db.execute("INSERT OR REPLACE INTO answers (key, value, expires) VALUES (?, ?, ?)",
+                   (key, json.dumps(value, ensure_ascii=False), time.time() + self.ttl))
+        self._puts += 1
+        if self._puts % self.PRUNE_EVERY == 0:
+            # просроченные и самые старые сверх лимита
+            db.execute("DELETE FROM answers WHERE expires <= ?", (time.time(),))
+            db.execute("DELETE FROM answers WHERE key IN (SELECT key FROM answers "
+                       "ORDER BY expires DESC LIMIT -1 OFFSET ?)", (self.maxsize,))
+
+
+class AnswerCache:
+    def __init__(self, maxsize: int, ttl: float, shared_path: str = ""):
+        self.local = TTLCache(maxsize, ttl)
+        self.shared: Optional[SqliteStore] = None
+        self.shared_hits = 0
+        self.shared_errors = 0
+        if shared_path and maxsize > 0:
+            try:
+                self.shared = SqliteStore(shared_path, ttl, maxsize * 8)
+            except sqlite3.Error as e:
+                print("[answer-cache] shared store disabled:", e, file=sys.stderr)
+
+    @staticmethod
+    def key(catalogue: str, query: str) -> str:
+        return f"{catalogue}:{query}"
+
+    def get(self, key: str) -> Optional[Dict]:
+        value = self.local.get(key)
+        if value is not None or self.shared is None:
+            return value
+        try:
+            value = self.shared.get(key)
+        except sqlite3.Error as e:
+            # общий уровень — только ускорение: при блокировке/ошибке считаем промахом
+            self.shared_errors += 1
+            print("[answer-cache] shared get failed:", e, file=sys.stderr)
+            return None
+        if value is not None:
+            self.shared_hits += 1
+            self.local.put(key, value)
+        return value
+
+    def put(self, key: str, value: Dict):
+        self.local.put(key, value)
+        if self.shared is not None:
+            try:
+                self.shared.put(key, value)
+            except sqlite3.Error as e:
+                self.shared_errors += 1
+                print("[answer-cache] shared put failed:", e, file=sys.stderr)
+
+    def stats(self) -> Dict:
+        hits, misses = self.local.hits, self.local.misses
+        return {
+            "size": len(self.local),
+            "hits": hits + self.shared_hits,
+            "local_hits": hits,
+            "shared_hits": self.shared_hits,
+            "misses": misses - self.shared_hits,
+            "shared": self.shared is not None,
+            "shared_errors": self.shared_errors,
+        }
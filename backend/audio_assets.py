@@ -0,0 +1,177 @@
+# backend/audio_assets.py
+"""
+Готовые аудио-ответы (STATIC_AUDIO_DIR) для /api/audio/...:
+- адрес с хэшем содержимого (?v=...) — клиент и прокси кэшируют его навсегда (immutable)
+- сильный ETag, If-None-Match -> 304, Range -> 206
+- опционально рядом лежат Opus-версии (opus/<имя>.opus, ~24 кбит/с моно) — в разы меньше mp3;
+  собираются заранее: python -m backend.audio_assets --jobs 4
+"""
+import argparse
+import hashlib
+import os
+import subprocess
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .config import cfg
+
+OPUS_DIR = "opus"
+READ_CHUNK = 64 * 1024
+
+
+@dataclass(frozen=True)
+class Asset:
+    path: Path
+    size: int
+    etag: str           # "sha1[:20]" в кавычках — сильный ETag
+    media_type: str
+
+
+def _media_type(path: Path) -> str:
+    return {".mp3": "audio/mpeg", ".opus": "audio/ogg", ".ogg": "audio/ogg",
+            ".wav": "audio/wav", ".m4a": "audio/mp4"}.get(path.suffix.lower(), "application/octet-stream")
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    (start, end) включительно для одного диапазона "bytes=a-b" / "bytes=a-" / "bytes=-n";
+    None — отдать файл целиком (нет заголовка или несколько диапазонов).
+    ValueError — диапазон за концом файла (416).
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    first, _, last = header[6:].strip().partition("-")
+    if not (first.isdigit() or first == "") or not (last.isdigit() or last == "") or first == last == "":
+        return None  # кривой заголовок — игнорируем, как и положено по RFC 9110
+    if not first:
+        n = int(last)
+        if n == 0:
+            raise ValueError("empty suffix range")
+        return max(0, size - n), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError("range not satisfiable")
+    return start, end
+
+
+def iter_file(path: Path, start: int, end: int) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        f.seek(start)
+        left = end - start + 1
+        while left > 0:
+            chunk = f.read(min(READ_CHUNK, left))
+            if not chunk:
+                break
+            left -= len(chunk)
+            yield chunk
+
+
+class AudioAssets:
+    """Хэши файлов считаются один раз и пересчитываются только при смене mtime/размера."""
+    def __init__(self, root: str):
+        self.root = Path(root).resolve()
+        self._cache: Dict[Path, Tuple[int, int, Asset]] = {}
+        self._lock = threading.Lock()
+
+    def _resolve(self, name: str) -> Optional[Path]:
+        path = (self.root / name).resolve()
+        if self.root not in path.parents or not path.is_file():
+            return None
+        return path
+
+    def _asset(self, path: Path) -> Asset:
+        st = path.stat()
+        with self._lock:
+            hit = self._cache.get(path)
+        if hit and hit[0] == st.st_mtime_ns and hit[1] == st.st_size:
+            return hit[2]
+        h = hashlib.sha1()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(READ_CHUNK), b""):
+                h.update(chunk)
+        asset = Asset(path, st.st_size, f'"{h.hexdigest()[:20]}"', _media_type(path))
+        with self._lock:
+            self._cache[path] = (st.st_mtime_ns, st.st_size, asset)
+        return asset
+
+    def get(self, name: str, opus: bool = False) -> Optional[Asset]:
+        """Файл по имени внутри root; opus=True — Opus-версия, если она собрана."""
+        path = self._resolve(name)
+        if path is None:
+            return None
+        if opus:
+            alt = self._resolve(str(Path(OPUS_DIR) / Path(name).with_suffix(".opus")))
+            if alt is not None:
+                return self._asset(alt)
+        return self._asset(path)
+
+    def has_opus(self, name: str) -> bool:
+        return self._resolve(str(Path(OPUS_DIR) / Path(name).with_suffix(".opus"))) is not None
+
+    def name_for(self, audio_rel: str) -> Optional[str]:
+        """'static/audio/x.mp3' -> 'x.mp3', если файл лежит в root; иначе None."""
+        path = Path(audio_rel.lstrip("/")).resolve()
+        if self.root not in path.parents:
+            return None
+        return path.relative_to(self.root).as_posix()
+
+    @staticmethod
+    def version(asset: Asset) -> str:
+        """Версия для ?v= — префикс хэша содержимого."""
+        return asset.etag.strip('"')[:12]
+
+    def url_for(self, name: str) -> str:
+        # версия — хэш исходного файла: новый файл = новый адрес, старый можно кэшировать вечно
+        asset = self.get(name)
+        version = self.version(asset) if asset else "0"
+        return f"/api/audio/{name}?v={version}"
+
+
+def transcode_opus(src: Path, dst: Path) -> bool:
+    """mp3 -> Ogg Opus моно; пропускает, если dst новее src."""
+    if dst.is_file() and dst.stat().st_mtime >= src.stat().st_mtime:
+        return False
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dst.with_suffix(".part.opus")
+    cmd = ["ffmpeg", "-hide_banner", "-loglevel", "error", "-y", "-i", str(src),
+           "-ac", "1", "-c:a", "libopus", "-b:a", cfg.AUDIO_OPUS_BITRATE, "-application", "voip", str(tmp)]
+    try:
+        subprocess.run(cmd, check=True)
+        os.replace(tmp, dst)
+    finally:
+        tmp.unlink(missing_ok=True)
+    return True
+
+
+def build_opus_variants(root: str, jobs: int = 2) -> List[str]:
+    root_p = Path(root)
+    sources = [p for p in root_p.rglob("*.mp3") if OPUS_DIR not in p.relative_to(root_p).parts]
+    done = []
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        futs = {pool.submit(transcode_opus, p, root_p / OPUS_DIR / p.relative_to(root_p).with_suffix(".opus")): p
+                for p in sources}
+        for fut, src in futs.items():
+            try:
+                if fut.result():
+                    done.append(src.name)
+            except Exception as e:
+                print(f"[audio] opus failed: {src}: {e}", file=sys.stderr)
+    return done
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Собрать Opus-версии аудио-ответов (для медленных каналов).")
+    ap.add_argument("--root", default=cfg.STATIC_AUDIO_DIR)
+    ap.add_argument("--jobs", type=int, default=os.cpu_count() or 2)
+    args = ap.parse_args()
+    done = build_opus_variants(args.root, args.jobs)
+    print(f"Opus variants built: {len(done)} in {Path(args.root) / OPUS_DIR}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+# backend/audio_decode.py
+import shutil
+import subprocess
+import threading
+from typing import BinaryIO, Iterator, List, Union
+
+# 4000 фреймов PCM16 — тот же размер порции, что раньше читали из WAV
+PCM_CHUNK_BYTES = 8000
+# порция входа при подаче файла (загрузки) в stdin ffmpeg
+INPUT_CHUNK_BYTES = 64 * 1024
+
+
+class DecodeError(RuntimeError):
+    """ffmpeg не смог декодировать вход; в сообщении — хвост его stderr."""
+
+
+class AudioTooLong(DecodeError):
+    """Декодированная запись длиннее разрешённого; ffmpeg остановлен, не дочитав вход."""
+
+
+def _feed_stdin(proc: subprocess.Popen, data: Union[bytes, BinaryIO]):
+    try:
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            proc.stdin.write(data)
+        else:
+            # файл загрузки (SpooledTemporaryFile) — порциями, без копии целиком в памяти
+            shutil.copyfileobj(data, proc.stdin, INPUT_CHUNK_BYTES)
+    except (BrokenPipeError, ValueError):
+        # ffmpeg закрыл вход раньше (ошибка формата) — причину покажет stderr
+        pass
+    finally:
+        try:
+            proc.stdin.close()
+        except Exception:
+            pass
+
+
+def _ffmpeg_cmd(rate: int, loudnorm: bool, low_latency: bool = False) -> List[str]:
+    cmd = ["ffmpeg", "-hide_banner", "-loglevel", "error"]
+    if low_latency:
+        # поток из сети: не ждём секунды данных на анализ, выдаём PCM сразу по пакетам
+        cmd.extend(["-probesize", "32", "-analyzeduration", "0", "-fflags", "nobuffer"])
+    cmd.extend([
+        "-i", "pipe:0",
+        "-ac", "1",
+        "-ar", str(rate),
+    ])
+    if loudnorm:
+        # нормализация громкости (может занять немного больше времени)
+        cmd.extend(["-af", "loudnorm=I=-23:TP=-2:LRA=11"])
+    if low_latency:
+        cmd.extend(["-flush_packets", "1"])
+    cmd.extend(["-f", "s16le", "-acodec", "pcm_s16le", "pipe:1"])
+    return cmd
+
+
+def _err_tail(raw: bytes) -> str:
+    tail = raw.decode("utf-8", "replace").splitlines()[-15:]
+    return "ffmpeg failed:\n" + "\n".join(tail)
+
+
+def ffmpeg_pcm_chunks(data: Union[bytes, BinaryIO], rate: int = 16000, loudnorm: bool = False,
+                      chunk_bytes: int = PCM_CHUNK_BYTES, max_seconds: float = 0) -> Iterator[bytes]:
+    """
+    Декодирует любой контейнер (webm/ogg/mp3/m4a/wav...) без временных файлов:
+    bytes или открытый файл -> stdin ffmpeg -> сырой PCM s16le mono `rate` из stdout порциями.
+    Порции отдаются по мере декодирования, поэтому распознавание идёт параллельно с ffmpeg.
+    max_seconds > 0: как только PCM длиннее — AudioTooLong (остаток входа не декодируется).
+    """
+    max_bytes = int(max_seconds * rate) * 2 if max_seconds > 0 else 0
+    proc = subprocess.Popen(_ffmpeg_cmd(rate, loudnorm),
+                            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    # пишем вход из отдельного потока, иначе при большом файле оба пайпа упрутся в буферы
+    writer = threading.Thread(target=_feed_stdin, args=(proc, data), daemon=True)
+    writer.start()
+    # stderr тоже читаем параллельно, чтобы ffmpeg не заблокировался на нём
+    err_buf: list[bytes] = []
+    err_reader = threading.Thread(target=lambda: err_buf.append(proc.stderr.read()), daemon=True)
+    err_reader.start()
+
+    finished = False
+    total = 0
+    try:
+        while True:
+            chunk = proc.stdout.read(chunk_bytes)
+            if not chunk:
+                break
+            total += len(chunk)
+            if max_bytes and total > max_bytes:
+                raise AudioTooLong(f"audio longer than {max_seconds:g}s")
+            yield chunk
+        finished = True
+    finally:
+        if not finished:
+            # потребитель прервал чтение — ffmpeg больше не нужен
+            proc.kill()
+        proc.stdout.close()
+        writer.join()
+        err_reader.join()
+        proc.wait()
+
+    if proc.returncode != 0:
+        raise DecodeError(_err_tail(b"".join(err_buf)))
+
+
+class FFmpegStreamDecoder:
+    """
+    Долгоживущий ffmpeg для потокового распознавания: фрагменты контейнера (webm/ogg
+    от MediaRecorder с timeslice) пишутся в stdin по мере записи, а декодированный
+    PCM копится в буфере фоновым потоком. feed() возвращает всё, что уже готово.
+    """
+    def __init__(self, rate: int = 16000, loudnorm: bool = False):
+        self._proc = subprocess.Popen(_ffmpeg_cmd(rate, loudnorm, low_latency=True),
+                                      stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        self._lock = threading.Lock()
+        self._pcm = bytearray()
+        self._err = b""
+        self._reader = threading.Thread(target=self._read_stdout, daemon=True)
+        self._reader.start()
+        self._err_reader = threading.Thread(target=self._read_stderr, daemon=True)
+        self._err_reader.start()
+
+    def _read_stdout(self):
+        out = self._proc.stdout
+        while True:
+            # read1: отдаём то, что ffmpeg уже выдал, не дожидаясь полной порции
+            chunk = out.read1(PCM_CHUNK_BYTES)
+            if not chunk:
+                break
+            with self._lock:
+                self._pcm += chunk
+
+    def _read_stderr(self):
+        self._err = self._proc.stderr.read()
+
+    def _take(self) -> bytes:
+        with self._lock:
+            data = bytes(self._pcm)
+            self._pcm.clear()
+        return data
+
+    def feed(self, data: bytes) -> bytes:
+        try:
+            self._proc.stdin.write(data)
+            self._proc.stdin.flush()
+        except (BrokenPipeError, ValueError):
+            # ffmpeg уже завершился — причину отдаст close()
+            pass
+        return self._take()
+
+    def close(self) -> bytes:
+        """Закрывает вход, дожидается конца декодирования и возвращает остаток PCM."""
+        try:
+            self._proc.stdin.close()
+        except Exception:
+            pass
+        self._reader.join()
+        self._err_reader.join()
+        self._proc.wait()
+        if self._proc.returncode != 0:
+            raise DecodeError(_err_tail(self._err))
+        return self._take()
+
+    def kill(self):
+        if self._proc.poll() is None:
+            self._proc.kill()
+        try:
+            self._proc.stdin.close()
+        except Exception:
+            pass
+        self._proc.wait()
@@ -1,23 +1,295 @@
 # backend/audio_router.py
-import json, os, re
-from typing import Dict, List, Tuple, Optional
+import hashlib, json, os, re, sys, threading, time
+from typing import Dict, List, Tuple, Optional, Iterator
 from .config import cfg
+from .stemmer import stem as _stem
+from .translit import to_cyrillic
 
 def _norm(s: str) -> str:
-    return re.sub(r"\s+", " ", (s or "").lower()).strip()
+    s = re.sub(r"\s+", " ", (s or "").lower()).strip()
+    # латиница/смешанное письмо -> кириллица ключей (и для запросов, и для keys_norm)
+    return to_cyrillic(s) if cfg.AUDIO_TRANSLIT else s
 
-class AudioRouter:
+
+class _KeyAutomaton:
     """
-    Ищет подходящий аудио-ответ по простым правилам:
-    - точное вхождение нормализованных ключей (подстрока)
-    - пересечение слов (очень простая эвристика)
-    - если не нашли — отдаём default_audio
+    Aho–Corasick по нормализованным ключам: за один проход по запросу
+    находит все ключи, которые входят в него подстрокой.
+    """
+    def __init__(self, patterns: List[str]):
+        goto: List[Dict[str, int]] = [{}]
+        out: List[int] = [-1]  # id ключа, который заканчивается в узле
+        for pid, pat in enumerate(patterns):
+            node = 0
+            for ch in pat:
+                nxt = goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[node][ch] = nxt
+                    goto.append({})
+                    out.append(-1)
+                node = nxt
+            out[node] = pid
+
+        fail = [0] * len(goto)
+        # ближайший по fail-цепочке узел, где заканчивается какой-то ключ
+        out_link = [0] * len(goto)
+        queue = list(goto[0].values())
+        for node in queue:
+            for ch, nxt in goto[node].items():
+                f = fail[node]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                f = goto[f].get(ch, 0)
+                fail[nxt] = f
+                out_link[nxt] = f if out[f] != -1 else out_link[f]
+                queue.append(nxt)
+
+        self._goto, self._fail, self._out, self._out_link = goto, fail, out, out_link
+
+    def find(self, text: str) -> Iterator[int]:
+        goto, fail, out, out_link = self._goto, self._fail, self._out, self._out_link
+        state = 0
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            node = state if out[state] != -1 else out_link[state]
+            while node:
+                yield out[node]
+                node = out_link[node]
+
+
+class _RuleIndex:
+    """
+    Предкомпилированные ключи для AudioRouter._rule_match:
+    - автомат подстрок по уникальным ключам
+    - инвертированный индекс слово -> ключи (для пересечения слов)
+    Скоринг тот же, что у линейного перебора, но стоит порядка числа совпавших ключей.
+    """
+    def __init__(self, items: List[Dict]):
+        pattern_ids: Dict[str, int] = {}
+        self.patterns: List[str] = []
+        self.pattern_items: List[List[int]] = []
+        self.key_item: List[int] = []
+        self.key_size: List[int] = []
+        self.token_keys: Dict[str, List[int]] = {}
+
+        for i, it in enumerate(items):
+            for k in it["keys_norm"]:
+                if not k:
+                    continue
+                pid = pattern_ids.get(k)
+                if pid is None:
+                    pid = pattern_ids[k] = len(self.patterns)
+                    self.patterns.append(k)
+                    self.pattern_items.append([])
+                self.pattern_items[pid].append(i)
+
+                kid = len(self.key_item)
+                k_words = set(k.split())
+                self.key_item.append(i)
+                self.key_size.append(len(k_words))
+                for w in k_words:
+                    self.token_keys.setdefault(w, []).append(kid)
+
+        self.automaton = _KeyAutomaton(self.patterns)
+
+    def best(self, n: str) -> Tuple[Optional[int], int]:
+        scores: Dict[int, int] = {}
+        # 1) подстрока: каждый ключ считается один раз, сколько бы раз ни встретился
+        for pid in set(self.automaton.find(n)):
+            bonus = 5 + len(self.patterns[pid])
+            for i in self.pattern_items[pid]:
+                scores[i] = scores.get(i, 0) + bonus
+        # 2) пересечение слов
+        inter: Dict[int, int] = {}
+        for w in set(n.split()):
+            for kid in self.token_keys.get(w, ()):
+                inter[kid] = inter.get(kid, 0) + 1
+        for kid, cnt in inter.items():
+            i = self.key_item[kid]
+            scores[i] = scores.get(i, 0) + 3 * cnt + (1 if self.key_size[kid] == cnt else 0)
+
+        # как в линейном переборе: максимум, при равенстве — более ранний элемент
+        best_i, best_score = None, 0
+        for i, score in scores.items():
+            if score > best_score or (score == best_score and best_i is not None and i < best_i):
+                best_i, best_score = i, score
+        return best_i, best_score
+
+
+def _max_edits(stem: str) -> int:
+    # короткие основы — только точное совпадение, иначе всё совпадёт со всем
+    n = len(stem)
+    if n < 5:
+        return 0
+    return 1 if n < 8 else 2
+
+
+def _deletes(word: str, depth: int) -> set:
+    out, frontier = {word}, {word}
+    for _ in range(depth):
+        frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))}
+        out |= frontier
+    return out
+
+
+def _edit_distance(a: str, b: str, limit: int) -> int:
+    """Дамерау–Левенштейн (OSA) с отсечкой: > limit -> limit + 1."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev2, prev = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        row_min = cur[0]
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            v = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if prev2 is not None and i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                v = min(v, prev2[j - 2] + 1)
+            cur[j] = v
+            row_min = min(row_min, v)
+        if row_min > limit:
+            return limit + 1
+        prev2, prev = prev, cur
+    return prev[-1]
+
+
+class _FuzzyIndex:
+    """
+    Запасной уровень для шумных транскриптов: основы слов после срезания аффиксов
+    + словарь удалений в стиле SymSpell (до 1–2 правок) по всем основам ключей.
+    Поиск стоит порядка числа удалений слов запроса, а не размера каталога: окрестность
+    каждого слова и число ключей на основу ограничены, чтобы частые основы не раздували перебор.
+    """
+    # ключ засчитывается, если покрыта хотя бы половина его основ — или, наоборот,
+    # в нём нашлись все основы запроса (одно слово "нөкістің" не покроет половину "нөкіс ауданы ...")
+    MIN_COVER = 0.5
+    # слова запроса короче (частицы "бе", "ма", обрывки) в нечётком поиске не участвуют
+    MIN_TOKEN = 3
+    # основа из стольких ключей ничего не различает: кандидатов не порождает,
+    # но засчитывается ключам, найденным по другим словам
+    MAX_POSTINGS = 64
+    # опечатка: больше стольких основ в окрестности удалений — слово многозначно, пропускаем
+    MAX_FANOUT = 32
+    # ... и так же, если ближайших исправлений (на одном расстоянии) больше стольких
+    MAX_CORRECTIONS = 2
+    # победитель должен опережать элемент, совпавший по другим основам, не меньше чем на столько
+    MIN_MARGIN = 2
+
+    def __init__(self, items: List[Dict]):
+        self.key_item: List[int] = []
+        self.key_stems: List[frozenset] = []
+        self.stem_keys: Dict[str, List[int]] = {}
+        self.deletes: Dict[str, List[str]] = {}
+
+        for i, it in enumerate(items):
+            for k in it["keys_norm"]:
+                stems = frozenset(_stem(w) for w in k.split())
+                if not stems:
+                    continue
+                kid = len(self.key_item)
+                self.key_item.append(i)
+                self.key_stems.append(stems)
+                for st in stems:
+                    self.stem_keys.setdefault(st, []).append(kid)
+
+        for st in self.stem_keys:
+            for d in _deletes(st, _max_edits(st)):
+                self.deletes.setdefault(d, []).append(st)
+
+    def _lookup(self, stem: str) -> Dict[str, int]:
+        """Ближайшие основы словаря в пределах допустимых правок -> расстояние."""
+        if stem in self.stem_keys:
+            return {stem: 0}
+        depth = _max_edits(stem)
+        if not depth:
+            return {}
+        cands = set()
+        for d in _deletes(stem, depth):
+            cands.update(self.deletes.get(d, ()))
+            if len(cands) > self.MAX_FANOUT:
+                return {}
+        found: Dict[str, int] = {}
+        for cand in cands:
+            limit = min(depth, _max_edits(cand))
+            dist = _edit_distance(stem, cand, limit)
+            if dist <= limit:
+                found[cand] = dist
+        if not found:
+            return found
+        nearest = min(found.values())
+        found = {st: dist for st, dist in found.items() if dist == nearest}
+        return found if len(found) <= self.MAX_CORRECTIONS else {}
+
+    def best(self, n: str) -> Optional[int]:
+        tokens = {_stem(w) for w in n.split()}
+        # основа запроса -> найденные для неё основы словаря
+        matched = [self._lookup(t) for t in tokens if len(t) >= self.MIN_TOKEN]
+        if not matched:
+            return None
+        # кандидаты — только по различающим основам
+        kids = set()
+        for found in matched:
+            for st in found:
+                posting = self.stem_keys[st]
+                if len(posting) <= self.MAX_POSTINGS:
+                    kids.update(posting)
+
+        # covered == len(matched): ключ покрывает запрос целиком (у каждого слова нашлась основа)
+        scores: Dict[int, int] = {}
+        evidence: Dict[int, set] = {}
+        exact: set = set()
+        for kid in kids:
+            stems = self.key_stems[kid]
+            # вес совпавшей основы: точная 3, одна правка 2, две — 1
+            hits: Dict[str, int] = {}
+            covered = 0
+            for found in matched:
+                hit = False
+                for st, dist in found.items():
+                    if st in stems:
+                        hits[st] = max(hits.get(st, 0), 3 - dist)
+                        hit = True
+                covered += hit
+            size = len(stems)
+            if len(hits) < self.MIN_COVER * size and covered < len(matched):
+                continue
+            i = self.key_item[kid]
+            scores[i] = scores.get(i, 0) + sum(hits.values()) + (1 if len(hits) == size else 0)
+            evidence.setdefault(i, set()).update(hits)
+            if 3 in hits.values() or covered == len(matched):
+                exact.add(i)
+
+        best_i, best_score = None, 0
+        for i, score in scores.items():
+            if score > best_score or (score == best_score and best_i is not None and i < best_i):
+                best_i, best_score = i, score
+        # одних исправленных опечаток мало: нужна хотя бы одна точная основа или весь запрос
+        if best_i is None or best_i not in exact:
+            return None
+        # элементы, совпавшие по тем же (или части тех же) основам, — не соперники:
+        # ничья между ними решается как у правил; соперник объясняет запрос иначе
+        won = evidence[best_i]
+        rival = max((score for i, score in scores.items() if not evidence[i] <= won), default=0)
+        return best_i if best_score - rival >= self.MIN_MARGIN else None
+
+
+class _Catalogue:
+    """
+    Неизменяемый снимок index.json: элементы + предкомпилированный индекс.
+    AudioRouter подменяет снимок целиком, поэтому запрос, начавшийся на старом,
+    так и доработает на старом.
     """
     def __init__(self, index_path: str):
         if not os.path.isfile(index_path):
             raise RuntimeError(f"Audio index not found: {index_path}")
-        with open(index_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        self.mtime = os.path.getmtime(index_path)
+        with open(index_path, "rb") as f:
+            raw = f.read()
+        self.source_hash = hashlib.sha1(raw).hexdigest()
+        data = json.loads(raw.decode("utf-8"))
 
         # поддерживаем 2 схемы:
         #  A) {"default_audio": "...", "items":[{ "audio":"...", "keys":[...], "tag":"..." }] }
@@ -44,8 +316,129 @@ class AudioRouter:
                 "tag": tag,
                 "keys_norm": [_norm(k) for k in keys if isinstance(k, str)]
             })
+        self.index = _RuleIndex(self.items)
+        self.fuzzy = _FuzzyIndex(self.items) if cfg.AUDIO_FUZZY else None
+        self.semantic = self._build_semantic() if cfg.AUDIO_SEMANTIC else None
+        self.n_keys = len(self.index.key_item)
+        # все слова ключей — словарь для грамматики распознавателя
+        self.vocabulary = sorted({w for it in self.items for k in it["keys_norm"] for w in k.split()})
+
+    def _build_semantic(self):
+        # опциональный уровень: sentence-transformers может быть не установлен
+        try:
+            from .semantic import SemanticIndex, get_encoder
+            return SemanticIndex(self.items, self.source_hash, get_encoder())
+        except Exception as e:
+            print("[AudioRouter] semantic tier disabled:", e, file=sys.stderr)
+            return None
+
+
+class AudioRouter:
+    """
+    Ищет подходящий аудио-ответ по простым правилам:
+    - точное вхождение нормализованных ключей (подстрока)
+    - пересечение слов (очень простая эвристика)
+    - нечёткое совпадение основ слов (аффиксы срезаны, 1–2 опечатки) — matched_by="fuzzy"
+    - близость эмбеддингов к ключам (если правила не нашли или нашли слабо) — matched_by="semantic"
+    - если не нашли — отдаём default_audio
+    index.json можно менять на лету: reload() (или фоновый опрос mtime) собирает новый
+    снимок в фоне и атомарно подменяет ссылку на него.
+    """
+    def __init__(self, index_path: str):
+        self.index_path = index_path
+        self.version = 0
+        self.last_reload: Dict = {}
+        self._reload_lock = threading.Lock()
+        self._watcher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._snap: _Catalogue = None
+        self.reload()
+
+    @property
+    def items(self) -> List[Dict]:
+        return self._snap.items
+
+    @property
+    def default_audio(self) -> str:
+        return self._snap.default_audio
+
+    @property
+    def source_hash(self) -> str:
+        """sha1 текущего index.json — одинаков во всех процессах (в отличие от version)."""
+        return self._snap.source_hash
+
+    def vocabulary(self) -> List[str]:
+        """Уникальные слова всех ключей текущего снимка (для грамматики Vosk)."""
+        return self._snap.vocabulary
 
-    def _rule_match(self, q: str) -> Optional[Dict]:
+    def reload(self) -> Dict:
+        """
+        Перечитывает index.json и подменяет снимок. При ошибке старый снимок остаётся
+        (кроме самой первой загрузки — там ошибка пробрасывается).
+        Возвращает отчёт: число элементов/ключей и время сборки.
+        """
+        with self._reload_lock:
+            t0 = time.perf_counter()
+            try:
+                snap = _Catalogue(self.index_path)
+            except Exception as e:
+                if self._snap is None:
+                    raise
+                self.last_reload = {**self.last_reload, "ok": False, "error": str(e)}
+                return self.last_reload
+            self._snap = snap
+            self.version += 1
+            self.last_reload = {
+                "ok": True,
+                "version": self.version,
+                "items": len(snap.items),
+                "keys": snap.n_keys,
+                "build_ms": round(1000 * (time.perf_counter() - t0), 1),
+                "mtime": snap.mtime,
+            }
+            return self.last_reload
+
+    def _watch(self, interval: float):
+        seen = self._snap.mtime
+        while not self._stop.wait(interval):
+            try:
+                mtime = os.path.getmtime(self.index_path)
+            except OSError:
+                continue
+            # битый файл не перечитываем по кругу — ждём следующего изменения
+            if mtime != seen:
+                seen = mtime
+                if mtime == self._snap.mtime:
+                    continue
+                info = self.reload()
+                print("[AudioRouter] reloaded:", info, file=sys.stderr)
+
+    def start_watching(self, interval: float):
+        """Фоновый опрос mtime index.json; interval <= 0 — выключено."""
+        if interval <= 0 or self._watcher is not None:
+            return
+        self._stop.clear()
+        self._watcher = threading.Thread(target=self._watch, args=(interval,),
+                                         name="audio-index-watch", daemon=True)
+        self._watcher.start()
+
+    def stop_watching(self):
+        self._stop.set()
+        self._watcher = None
+
+    def _rule_match(self, q: str, snap: Optional[_Catalogue] = None) -> Optional[Dict]:
+        return self._rule_match_scored(q, snap)[0]
+
+    def _rule_match_scored(self, q: str, snap: Optional[_Catalogue] = None) -> Tuple[Optional[Dict], int]:
+        snap = snap or self._snap
+        n = _norm(q)
+        if not n:
+            return None, 0
+        i, score = snap.index.best(n)
+        return (snap.items[i] if i is not None else None), score
+
+    def _rule_match_scan(self, q: str) -> Optional[Dict]:
+        # эталонный линейный перебор (для проверки индекса и бенчмарка)
         n = _norm(q)
         if not n:
             return None
@@ -69,14 +462,50 @@ class AudioRouter:
                 best_item, best_score = it, score
         return best_item
 
+    def _fuzzy_match(self, q: str, snap: Optional[_Catalogue] = None) -> Optional[Dict]:
+        snap = snap or self._snap
+        n = _norm(q)
+        if not n or snap.fuzzy is None:
+            return None
+        i = snap.fuzzy.best(n)
+        return snap.items[i] if i is not None else None
+
+    def _semantic_match(self, q: str, snap: Optional[_Catalogue] = None) -> Optional[Dict]:
+        snap = snap or self._snap
+        n = _norm(q)
+        if not n or snap.semantic is None:
+            return None
+        try:
+            i, sim = snap.semantic.best(n)
+        except Exception as e:
+            print("[AudioRouter] semantic match failed:", e, file=sys.stderr)
+            return None
+        if i is None or sim < cfg.AUDIO_SEMANTIC_MIN_SIM:
+            return None
+        return snap.items[i]
+
     def find(self, query_text: str) -> Tuple[str, str, str]:
         """
-        Возвращает (audio_url, tag, matched_by), где matched_by ∈ {"rules","default"}.
+        Возвращает (audio_url, tag, matched_by), где matched_by ∈ {"rules","fuzzy","semantic","default"}.
+        Может считать эмбеддинг запроса — из async-кода вызывать в threadpool.
         """
-        it = self._rule_match(query_text)
+        snap = self._snap  # один снимок на весь запрос
+        it, score = self._rule_match_scored(query_text, snap)
+        if it and score >= cfg.AUDIO_RULES_MIN_SCORE:
+            return it["audio"], it["tag"], "rules"
+        if not it:
+            fz = self._fuzzy_match(query_text, snap)
+            if fz:
+                return fz["audio"], fz["tag"], "fuzzy"
+        sem = self._semantic_match(query_text, snap)
+        if sem:
+            return sem["audio"], sem["tag"], "semantic"
         if it:
+            # слабое совпадение правил всё же лучше, чем default
             return it["audio"], it["tag"], "rules"
-        return self.default_audio, "default", "default"
+        return snap.default_audio, "default", "default"
 
 def create_audio_router():
-    return AudioRouter(cfg.AUDIO_INDEX_PATH)
+    router = AudioRouter(cfg.AUDIO_INDEX_PATH)
+    router.start_watching(cfg.AUDIO_INDEX_POLL_SEC)
+    return router
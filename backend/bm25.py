@@ -0,0 +1,193 @@
+# backend/bm25.py
+"""
+Лексический индекс BM25 по тем же чанкам, что лежат в Chroma (собирается в backend.ingest).
+Короткие запросы из Vosk с названиями и числами ("нөкіс ауданы 1932") он находит лучше
+векторного поиска и без прохода модели.
+
+На диске — папка рядом с Chroma (CHROMA_DIR/<коллекция>.bm25/):
+    meta.json         параметры, словарь термин -> номер, id чанков и источники
+    offsets.npy       int64 [термины + 1] — границы списков в postings
+    docs.npy          int32 [вхождения]   — номер чанка
+    tf.npy            uint16 [вхождения]  — частота термина в чанке
+    doc_len.npy       float32 [чанки]     — длина чанка в терминах
+    text.bin          тексты чанков подряд (utf-8) + text_offsets.npy int64 [чанки + 1]
+Массивы открываются через np.load(mmap_mode="r"): воркеры делят страницы через page cache.
+"""
+import json
+import os
+import re
+import shutil
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .stemmer import stem
+from .translit import to_cyrillic
+
+FORMAT_VERSION = 1
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Нижний регистр, латиница -> кириллица, основы слов (те же аффиксы, что у AudioRouter)."""
+    return [stem(t) for t in _TOKEN_RE.findall(to_cyrillic((text or "").lower()))]
+
+
+def index_path(chroma_dir: str, collection: str) -> Path:
+    return Path(chroma_dir) / f"{collection}.bm25"
+
+
+class BM25Index:
+    def __init__(self, meta: Dict, arrays: Dict[str, np.ndarray], text: np.ndarray):
+        self.k1, self.b = meta["k1"], meta["b"]
+        self.avgdl = meta["avgdl"] or 1.0
+        self.vocab: Dict[str, int] = meta["vocab"]
+        self.ids: List[str] = meta["ids"]
+        self.sources: List[str] = meta["sources"]
+        self.offsets, self.docs, self.tf = arrays["offsets"], arrays["docs"], arrays["tf"]
+        self.doc_len, self.text_offsets = arrays["doc_len"], arrays["text_offsets"]
+        self._text = text
+        n = len(self.ids)
+        df = np.diff(self.offsets).astype(np.float64)
+        self.idf = np.log1p((n - df + 0.5) / (df + 0.5)).astype(np.float32)
+        # знаменатель BM25 без tf: k1 * (1 - b + b * dl / avgdl) — один раз на чанк
+        self._norm = (self.k1 * (1 - self.b + self.b * self.doc_len / self.avgdl)).astype(np.float32)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def build(cls, ids: List[str], documents: List[str], sources: List[str],
+              k1: float = 1.2, b: float = 0.75) -> "BM25Index":
+        vocab: Dict[str, int] = {}
+        postings: List[Dict[int, int]] = []
+        doc_len = np.zeros(len(ids), dtype=np.float32)
+        for d, text in enumerate(documents):
+            terms = tokenize(text)
+            doc_len[d] = len(terms)
+            for t in terms:
+                tid = vocab.setdefault(t, len(vocab))
+                if tid == len(postings):
+                    postings.append({})
+                postings[tid][d] = postings[tid].get(d, 0) + 1
+        offsets = np.zeros(len(postings) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(p) for p in postings])
+        docs = np.fromiter((d for p in postings for d in p), dtype=np.int32, count=int(offsets[-1]))
+        tf = np.fromiter((min(n, 65535) for p in postings for n in p.values()), dtype=np.uint16,
+                         count=int(offsets[-1]))
+        blobs = [t.encode("utf-8") for t in documents]
+        text_offsets = np.zeros(len(blobs) + 1, dtype=np.int64)
+        text_offsets[1:] = np.cumsum([len(x) for x in blobs])
+        meta = {"version": FORMAT_VERSION, "k1": k1, "b": b,
+                "avgdl": float(doc_len.mean()) if len(ids) else 0.0,
+                "vocab": vocab, "ids": list(ids), "sources": list(sources)}
+        arrays = {"offsets": offsets, "docs": docs, "tf": tf, "doc_len": doc_len, "text_offsets": text_offsets}
+        return cls(meta, arrays, np.frombuffer(b"".join(blobs), dtype=np.uint8))
+
+    def save(self, path: Path):
+        """Пишет во временную папку и подменяет старую — читатели не видят полузаписанный индекс."""
+        path = Path(path)
+        tmp = path.with_name(path.name + ".tmp")
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir(parents=True)
+        meta = {"version": FORMAT_VERSION, "k1": self.k1, "b": self.b, "avgdl": self.avgdl,
+                "vocab": self.vocab, "ids": self.ids, "sources": self.sources}
+        (tmp / "meta.json").write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
+        for name in ("offsets", "docs", "tf", "doc_len", "text_offsets"):
+            np.save(tmp / f"{name}.npy", getattr(self, name))
+        (tmp / "text.bin").write_bytes(self._text.tobytes())
+        old = path.with_name(path.name + ".old")
+        shutil.rmtree(old, ignore_errors=True)
+        if path.exists():
+            os.replace(path, old)
+        os.replace(tmp, path)
+        shutil.rmtree(old, ignore_errors=True)
+
+    @classmethod
+    def load(cls, path: Path) -> Optional["BM25Index"]:
+        path = Path(path)
+        try:
+            meta = json.loads((path / "meta.json").read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        if meta.get("version") != FORMAT_VERSION:
+            return None
+        arrays = {name: np.load(path / f"{name}.npy", mmap_mode="r")
+                  for name in ("offsets", "docs", "tf", "doc_len", "text_offsets")}
+        text_path = path / "text.bin"
+        text = (np.memmap(text_path, dtype=np.uint8, mode="r") if text_path.stat().st_size
+                else np.zeros(0, dtype=np.uint8))
+        return cls(meta, arrays, text)
+
+    def document(self, i: int) -> str:
+        return self._text[self.text_offsets[i]:self.text_offsets[i + 1]].tobytes().decode("utf-8")
+
+    def scores(self, query: str) -> Tuple[np.ndarray, float]:
+        """
+        Счёт BM25 по всем чанкам и доля idf запроса, которую покрывает лучший чанк
+        (1.0 — в нём все слова запроса; незнакомые индексу слова долю уменьшают).
+        """
+        terms = set(tokenize(query))
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+        tids = [self.vocab[t] for t in terms if t in self.vocab]
+        for tid in tids:
+            lo, hi = self.offsets[tid], self.offsets[tid + 1]
+            docs = self.docs[lo:hi]
+            tf = self.tf[lo:hi].astype(np.float32)
+            # в одном списке чанк встречается один раз — обычное сложение по индексам без add.at
+            scores[docs] += self.idf[tid] * tf * (self.k1 + 1) / (tf + self._norm[docs])
+        if not tids:
+            return scores, 0.0
+        best = int(scores.argmax())
+        # неизвестные индексу слова (шум распознавания) тоже уменьшают уверенность
+        total_idf = float(sum(self.idf[tid] for tid in tids)) + (len(terms) - len(tids)) * float(self.idf.max())
+        covered = 0.0
+        for tid in tids:
+            lo, hi = self.offsets[tid], self.offsets[tid + 1]
+            if best in self.docs[lo:hi]:
+                covered += float(self.idf[tid])
+        return scores, covered / total_idf if total_idf else 0.0
+
+    def search(self, query: str, top_k: int) -> Tuple[List[Tuple[int, float]], float]:
+        """([(номер чанка, счёт), ...] по убыванию, покрытие лучшего) — только чанки со счётом > 0."""
+        scores, coverage = self.scores(query)
+        k = min(top_k, int(np.count_nonzero(scores)))
+        if k <= 0:
+            return [], 0.0
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(int(i), float(scores[i])) for i in top], coverage
+
+
+def rrf(rankings: Iterable[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """Reciprocal rank fusion: сумма 1 / (k + место) по спискам; по убыванию."""
+    fused: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, start=1):
+            fused[key] = fused.get(key, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda kv: -kv[1])
+
+
+def confident(hits: List[Tuple[int, float]], coverage: float, margin: float) -> bool:
+    """Лексике можно верить без векторов: все слова запроса в лучшем чанке и он заметно впереди."""
+    if margin <= 0 or not hits or coverage < 0.999:
+        return False
+    return len(hits) == 1 or hits[0][1] >= margin * hits[1][1]
+
+
+def build_from_collection(coll, path: Path, batch: int = 1000) -> BM25Index:
+    """Все чанки коллекции Chroma (без эмбеддингов) -> BM25Index на диске."""
+    ids: List[str] = []
+    documents: List[str] = []
+    sources: List[str] = []
+    total = coll.count()
+    for off in range(0, total, batch):
+        res = coll.get(include=["documents", "metadatas"], limit=batch, offset=off)
+        for cid, doc, meta in zip(res["ids"], res["documents"], res["metadatas"]):
+            ids.append(cid)
+            documents.append(doc or "")
+            sources.append((meta or {}).get("source", ""))
+    index = BM25Index.build(ids, documents, sources)
+    index.save(path)
+    return index
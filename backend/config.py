@@ -10,9 +10,94 @@ class Config:
     VOSK_MODEL_PATH: str = os.getenv("VOSK_MODEL_PATH", "models/vosk-model-small-kz-0.15")
 
     AUDIO_INDEX_PATH: str = os.getenv("AUDIO_INDEX_PATH", "data/answers/index.json")
+    # как часто проверять mtime index.json для горячей перезагрузки (0 — не следить)
+    AUDIO_INDEX_POLL_SEC: float = float(os.getenv("AUDIO_INDEX_POLL_SEC", "2"))
+    # запросы и ключи на латинице сводятся к кириллице перед сопоставлением
+    AUDIO_TRANSLIT: bool = os.getenv("AUDIO_TRANSLIT", "1") == "1"
+    # нечёткий уровень AudioRouter (основы слов + опечатки), если правила ничего не нашли
+    AUDIO_FUZZY: bool = os.getenv("AUDIO_FUZZY", "1") == "1"
+    # семантический уровень AudioRouter (sentence-transformers): выкл. по умолчанию
+    AUDIO_SEMANTIC: bool = os.getenv("AUDIO_SEMANTIC", "0") == "1"
+    # минимальная косинусная близость запроса к ключу для matched_by="semantic"
+    AUDIO_SEMANTIC_MIN_SIM: float = float(os.getenv("AUDIO_SEMANTIC_MIN_SIM", "0.85"))
+    # совпадение правил слабее этого счёта сначала перепроверяется семантикой (0 — доверять всегда)
+    AUDIO_RULES_MIN_SCORE: int = int(os.getenv("AUDIO_RULES_MIN_SCORE", "0"))
+
+    EMBEDDING_MODEL: str = os.getenv("EMBEDDING_MODEL", "intfloat/multilingual-e5-small")
+    # база знаний (RAG): Chroma и папка с документами для backend.ingest
+    CHROMA_DIR: str = os.getenv("CHROMA_DIR", "./storage/chroma")
+    CHROMA_COLLECTION: str = os.getenv("CHROMA_COLLECTION", "knowledge_base")
+    DOCS_DIR: str = os.getenv("DOCS_DIR", "./data/docs")
+    TOP_K: int = int(os.getenv("TOP_K", "5"))
+    # поиск RAG: hybrid — BM25 + векторы через reciprocal rank fusion, dense — только Chroma,
+    # lexical — только BM25. Кандидатов с каждой стороны — RAG_FUSION_DEPTH.
+    # Быстрый путь: лучший чанк BM25 содержит все слова запроса и в RAG_LEXICAL_MARGIN раз
+    # обгоняет второй — эмбеддинг не считаем (0 — всегда гибрид)
+    RAG_MODE: str = os.getenv("RAG_MODE", "hybrid")
+    RAG_FUSION_DEPTH: int = int(os.getenv("RAG_FUSION_DEPTH", "20"))
+    RAG_RRF_K: int = int(os.getenv("RAG_RRF_K", "60"))
+    RAG_LEXICAL_MARGIN: float = float(os.getenv("RAG_LEXICAL_MARGIN", "2.0"))
+    # кэш эмбеддингов запросов RAG (LRU по памяти) и окно склейки одновременных search()
+    RAG_EMBED_CACHE_MB: float = float(os.getenv("RAG_EMBED_CACHE_MB", "32"))
+    RAG_BATCH_WINDOW_MS: float = float(os.getenv("RAG_BATCH_WINDOW_MS", "3"))
+    # чанков на один encode + coll.add при загрузке
+    INGEST_BATCH: int = int(os.getenv("INGEST_BATCH", "64"))
+    # окно и размер микро-батча для эмбеддингов запросов
+    EMBED_BATCH_WINDOW_MS: float = float(os.getenv("EMBED_BATCH_WINDOW_MS", "5"))
+    EMBED_BATCH_MAX: int = int(os.getenv("EMBED_BATCH_MAX", "32"))
+    CACHE_DIR: str = os.getenv("CACHE_DIR", "./storage/cache")
+
+    # LLM-классификатор (Ollama)
+    LLM_PROVIDER: str = os.getenv("LLM_PROVIDER", "ollama")
+    OLLAMA_BASE_URL: str = os.getenv("OLLAMA_BASE_URL", "http://127.0.0.1:11434")
+    OLLAMA_MODEL: str = os.getenv("OLLAMA_MODEL", "qwen:1.8b")
+    LLM_TIMEOUT_SEC: float = float(os.getenv("LLM_TIMEOUT_SEC", "10"))
+    LLM_CONNECT_TIMEOUT_SEC: float = float(os.getenv("LLM_CONNECT_TIMEOUT_SEC", "2"))
+    LLM_MAX_CONNECTIONS: int = int(os.getenv("LLM_MAX_CONNECTIONS", "8"))
+    LLM_MAX_CONCURRENCY: int = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+    LLM_CACHE_SIZE: int = int(os.getenv("LLM_CACHE_SIZE", "1024"))
+    LLM_CACHE_TTL_SEC: float = float(os.getenv("LLM_CACHE_TTL_SEC", "3600"))
+    # после стольких ошибок подряд LLM пропускается на LLM_BREAKER_COOLDOWN_SEC
+    LLM_BREAKER_FAILS: int = int(os.getenv("LLM_BREAKER_FAILS", "3"))
+    LLM_BREAKER_COOLDOWN_SEC: float = float(os.getenv("LLM_BREAKER_COOLDOWN_SEC", "30"))
+
+    # кэш ответов ask-text/ask-voice по нормализованному запросу (сбрасывается сменой index.json);
+    # ANSWER_CACHE_DB — путь к SQLite, общему для воркеров (пусто — только память процесса)
+    ANSWER_CACHE_SIZE: int = int(os.getenv("ANSWER_CACHE_SIZE", "1024"))
+    ANSWER_CACHE_TTL_SEC: float = float(os.getenv("ANSWER_CACHE_TTL_SEC", "3600"))
+    ANSWER_CACHE_DB: str = os.getenv("ANSWER_CACHE_DB", "")
+
+    # приём запросов к /api/transcribe, /api/ask-voice, /api/ask-text (backend/admission.py):
+    # лимит тела загрузки и длительности записи (413), корзина на клиента — запросов в секунду
+    # и запас (429; 0 — без лимита), одновременных запросов на процесс (503; 0 — без лимита).
+    # ADMISSION_TRUST_PROXY=1 — клиент по X-Forwarded-For (только за своим прокси). За прокси
+    # без него все клиенты делят одну корзину; в Dockerfile (Render) включено.
+    UPLOAD_MAX_BYTES: int = int(os.getenv("UPLOAD_MAX_BYTES", str(5 * 1024 * 1024)))
+    UPLOAD_MAX_SEC: float = float(os.getenv("UPLOAD_MAX_SEC", "30"))
+    ADMISSION_RATE_PER_SEC: float = float(os.getenv("ADMISSION_RATE_PER_SEC", "2"))
+    ADMISSION_BURST: float = float(os.getenv("ADMISSION_BURST", "10"))
+    ADMISSION_MAX_CONCURRENT: int = int(os.getenv("ADMISSION_MAX_CONCURRENT", "32"))
+    ADMISSION_TRUST_PROXY: bool = os.getenv("ADMISSION_TRUST_PROXY", "0") == "1"
+
+    # токен для /api/admin/*; пусто — эндпоинты закрыты (403), index.json подхватит опрос mtime
+    ADMIN_TOKEN: str = os.getenv("ADMIN_TOKEN", "")
+
+    # что грузить фоном сразу после старта (остальное — при первом обращении);
+    # /api/ready отвечает 200, когда всё из списка загружено. Пусто — без прогрева
+    WARMUP_ENGINES: tuple = tuple(
+        n.strip() for n in os.getenv("WARMUP_ENGINES", "router,stt").split(",") if n.strip()
+    )
+    WARMUP_DELAY_SEC: float = float(os.getenv("WARMUP_DELAY_SEC", "0.2"))
+
     STATIC_AUDIO_DIR: str = os.getenv("STATIC_AUDIO_DIR", "static/audio")
+    # битрейт Opus-версий ответов (python -m backend.audio_assets)
+    AUDIO_OPUS_BITRATE: str = os.getenv("AUDIO_OPUS_BITRATE", "24k")
 
     OUTPUT_DIR: str = os.getenv("OUTPUT_DIR", "./storage/outputs")
+    # espeak-ng: голос и темп; кэш готовых mp3 в OUTPUT_DIR ограничен по размеру (LRU)
+    KAA_TTS_VOICE: str = os.getenv("KAA_TTS_VOICE", "kk")
+    TTS_WPM: int = int(os.getenv("TTS_WPM", "150"))
+    TTS_CACHE_MAX_MB: int = int(os.getenv("TTS_CACHE_MAX_MB", "200"))
     FRONTEND_DIR: str = os.getenv("FRONTEND_DIR", "./frontend")
 
 cfg = Config()
@@ -0,0 +1,85 @@
+# backend/engines.py
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Optional
+
+
+class EngineUnavailable(RuntimeError):
+    """Движок не удалось загрузить (нет модели, не установлен пакет и т.п.)."""
+
+
+class _Engine:
+    def __init__(self, name: str, loader: Callable[[], Any]):
+        self.name = name
+        self.loader = loader
+        self.value: Any = None
+        self.state = "idle"  # idle | loading | ready | error
+        self.error: Optional[str] = None
+        self.load_ms: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def get(self) -> Any:
+        if self.state == "ready":
+            return self.value
+        with self._lock:
+            if self.state != "ready":
+                self.state = "loading"
+                t0 = time.perf_counter()
+                try:
+                    self.value = self.loader()
+                except Exception as e:
+                    self.state, self.error = "error", str(e)
+                    raise EngineUnavailable(f"{self.name}: {e}") from e
+                self.load_ms = round(1000 * (time.perf_counter() - t0), 1)
+                self.state, self.error = "ready", None
+        return self.value
+
+
+class EngineRegistry:
+    """
+    Тяжёлые подсистемы (модель Vosk, эмбеддер, Chroma) грузятся при первом обращении
+    или фоновым прогревом — процесс отвечает на / и статику сразу после старта.
+    """
+    def __init__(self):
+        self._engines: Dict[str, _Engine] = {}
+
+    def register(self, name: str, loader: Callable[[], Any]):
+        self._engines[name] = _Engine(name, loader)
+
+    def get(self, name: str) -> Any:
+        return self._engines[name].get()
+
+    def peek(self, name: str) -> Any:
+        """Значение, если уже загружено, иначе None (без загрузки)."""
+        eng = self._engines.get(name)
+        return eng.value if eng is not None and eng.state == "ready" else None
+
+    def is_ready(self, names: Iterable[str]) -> bool:
+        return all(n in self._engines and self._engines[n].state == "ready" for n in names)
+
+    def status(self) -> Dict[str, dict]:
+        return {
+            n: {"state": e.state, "load_ms": e.load_ms, **({"error": e.error} if e.error else {})}
+            for n, e in self._engines.items()
+        }
+
+    def warm_up(self, names: Iterable[str], delay: float = 0.0) -> threading.Thread:
+        """Загружает движки в фоновом потоке (после delay — чтобы сервер успел занять порт)."""
+        names = [n for n in names if n in self._engines]
+
+        def run():
+            if delay > 0:
+                time.sleep(delay)
+            for n in names:
+                try:
+                    self.get(n)
+                except EngineUnavailable as e:
+                    print("[engines] warm-up failed:", e, file=sys.stderr)
+
+        t = threading.Thread(target=run, name="engines-warmup", daemon=True)
+        t.start()
+        return t
+
+
+ENGINES = EngineRegistry()
@@ -1,21 +1,33 @@
 from __future__ import annotations
+import argparse
+import hashlib
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
 from pathlib import Path
-from typing import List
+from typing import Dict, List, Tuple
 
 # Устойчивый импорт cfg (работает и как модуль, и как скрипт)
 try:
     from .config import cfg  # python -m backend.ingest
 except ImportError:
-    import os, sys
+    import sys
     sys.path.append(os.path.dirname(os.path.dirname(__file__)))  # ../
     from backend.config import cfg  # python backend/ingest.py
 
 import re
 import chromadb
 from chromadb.config import Settings
-from sentence_transformers import SentenceTransformer
 from pypdf import PdfReader
 
+try:
+    from .bm25 import build_from_collection, index_path
+except ImportError:
+    from backend.bm25 import build_from_collection, index_path
+
 
 def load_text_from_file(path: Path) -> str:
     ext = path.suffix.lower()
@@ -49,7 +61,91 @@ def chunk_text(text: str, max_len: int = 800, overlap: int = 100) -> List[str]:
     return chunks
 
 
+def _file_hash(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _parse(path: str) -> Tuple[str, List[str]]:
+    # выполняется в процессе пула: PdfReader — чистый Python и упирается в CPU
+    raw = load_text_from_file(Path(path))
+    return path, (chunk_text(raw) if raw else [])
+
+
+def _chunk_id(source: str, j: int) -> str:
+    # путь, а не имя файла: одинаковые имена в разных папках не конфликтуют
+    return f"{hashlib.sha1(source.encode('utf-8')).hexdigest()[:12]}-{j}"
+
+
+def _manifest_path() -> Path:
+    return Path(cfg.CHROMA_DIR) / f"{cfg.CHROMA_COLLECTION}.manifest.json"
+
+
+def _load_manifest() -> Dict[str, dict]:
+    try:
+        return json.loads(_manifest_path().read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_manifest(manifest: Dict[str, dict]):
+    path = _manifest_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(manifest, ensure_ascii=False, indent=1), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def _scan_docs(docs_dir: Path, manifest: Dict[str, dict]) -> Tuple[Dict[str, dict], List[str]]:
+    """Текущее состояние папки и список файлов, которые надо (пере)индексировать."""
+    current, changed = {}, []
+    for p in sorted(docs_dir.glob("**/*")):
+        if not p.is_file() or p.suffix.lower() not in [".txt", ".md", ".pdf"]:
+            continue
+        st = p.stat()
+        key = str(p)
+        old = manifest.get(key)
+        # размер и mtime не менялись — хэш не пересчитываем
+        if old and old.get("size") == st.st_size and old.get("mtime") == st.st_mtime:
+            current[key] = old
+            continue
+        digest = _file_hash(p)
+        current[key] = {"sha256": digest, "size": st.st_size, "mtime": st.st_mtime, "chunks": 0}
+        if not old or old.get("sha256") != digest:
+            changed.append(key)
+        else:
+            current[key]["chunks"] = old.get("chunks", 0)
+    return current, changed
+
+
+def _open_collection(client, coll_name: str, full: bool):
+    if full:
+        # полная пересборка: удаляем коллекцию целиком
+        try:
+            client.delete_collection(coll_name)
+        except Exception:
+            pass
+    return client.get_or_create_collection(coll_name)
+
+
+def _build_bm25(coll, coll_name: str):
+    # лексический индекс целиком по коллекции (тексты без эмбеддингов — это быстро):
+    # так он всегда совпадает с Chroma, и при инкрементальной загрузке тоже
+    t0 = time.perf_counter()
+    index = build_from_collection(coll, index_path(cfg.CHROMA_DIR, coll_name))
+    print(f"BM25 index: {len(index)} chunks, {len(index.vocab)} terms in {time.perf_counter() - t0:.1f}s")
+
+
 def main():
+    ap = argparse.ArgumentParser(description="Инкрементальная загрузка документов в Chroma.")
+    ap.add_argument("--full", action="store_true", help="пересобрать коллекцию с нуля")
+    ap.add_argument("--jobs", type=int, default=os.cpu_count() or 2, help="процессов для разбора PDF")
+    ap.add_argument("--batch", type=int, default=cfg.INGEST_BATCH, help="чанков на encode + coll.add")
+    args = ap.parse_args()
+
     # Отключаем анонимную телеметрию, чтобы не было "ClientStartEvent ..."
     client = chromadb.PersistentClient(
         path=cfg.CHROMA_DIR,
@@ -57,45 +153,78 @@ def main():
     )
     coll_name = cfg.CHROMA_COLLECTION
 
-    # Создаём/очищаем коллекцию
-    try:
-        coll = client.get_or_create_collection(coll_name)
-        if coll.count() and coll.count() > 0:
-            client.delete_collection(coll_name)
-            coll = client.get_or_create_collection(coll_name)
-    except Exception:
-        # На случай гонок или старых версий API — просто пробуем пересоздать
-        try:
-            client.delete_collection(coll_name)
-        except Exception:
-            pass
-        coll = client.get_or_create_collection(coll_name)
-
-    embedder = SentenceTransformer(cfg.EMBEDDING_MODEL)
+    manifest = _load_manifest()
+    # без манифеста не знаем, что уже лежит в коллекции, — пересобираем
+    full = args.full or not manifest
+    if full:
+        manifest = {}
+    coll = _open_collection(client, coll_name, full)
 
     docs_dir = Path(cfg.DOCS_DIR)
-    docs, metas, ids = [], [], []
+    current, changed = _scan_docs(docs_dir, manifest)
+    removed = [k for k in manifest if k not in current]
 
-    for p in docs_dir.glob("**/*"):
-        if not p.is_file():
-            continue
-        if p.suffix.lower() not in [".txt", ".md", ".pdf"]:
-            continue
-        raw = load_text_from_file(p)
-        if not raw:
-            continue
-        for j, ch in enumerate(chunk_text(raw)):
-            docs.append(ch)
-            metas.append({"source": str(p)})
-            ids.append(f"{p.name}-{j}")
+    for src in removed:
+        coll.delete(where={"source": src})
+    # недоиндексированные файлы из манифеста уберём: запишем заново по мере готовности
+    state = {k: v for k, v in current.items() if k not in changed}
+    _save_manifest(state)
 
-    if not docs:
+    if not current:
         print(f"No docs found in {cfg.DOCS_DIR}. Put .txt/.md/.pdf there.")
+        if removed:
+            _build_bm25(coll, coll_name)
+        return
+    if not changed:
+        print(f"Up to date: {len(current)} files, removed {len(removed)}.")
+        if removed or not index_path(cfg.CHROMA_DIR, coll_name).is_dir():
+            _build_bm25(coll, coll_name)
         return
 
-    embs = embedder.encode(docs, normalize_embeddings=True).tolist()
-    coll.add(documents=docs, metadatas=metas, ids=ids, embeddings=embs)
-    print(f"Ingested {len(docs)} chunks from {cfg.DOCS_DIR} into '{coll_name}'")
+    t0 = time.perf_counter()
+    total = 0
+    embedder = None
+
+    def flush(src: str, chunks: List[str]):
+        nonlocal total
+        for b in range(0, len(chunks), args.batch):
+            part = chunks[b:b + args.batch]
+            embs = embedder.encode(part, normalize_embeddings=True).tolist()
+            coll.add(
+                documents=part,
+                metadatas=[{"source": src}] * len(part),
+                ids=[_chunk_id(src, b + j) for j in range(len(part))],
+                embeddings=embs,
+            )
+            total += len(part)
+        rate = total / max(time.perf_counter() - t0, 1e-9)
+        print(f"  {src}: {len(chunks)} chunks  (total {total}, {rate:.1f} chunks/s)")
+
+    # разбор — в пуле процессов; в полёте не больше 2*jobs файлов, чтобы не держать всё в памяти.
+    # spawn, а не fork: воркеры не наследуют потоки и память torch; модель грузим уже после
+    # запуска пула (и импорт тоже здесь — воркерам torch не нужен), первые файлы разбираются параллельно
+    with ProcessPoolExecutor(max_workers=max(1, args.jobs), mp_context=get_context("spawn")) as pool:
+        pending = deque()
+        queue = list(changed)
+        while queue or pending:
+            while queue and len(pending) < 2 * max(1, args.jobs):
+                pending.append(pool.submit(_parse, queue.pop(0)))
+            if embedder is None:
+                from sentence_transformers import SentenceTransformer
+                embedder = SentenceTransformer(cfg.EMBEDDING_MODEL)
+                t0 = time.perf_counter()  # скорость — без загрузки модели, как раньше
+            src, chunks = pending.popleft().result()
+            # старые чанки изменённого файла
+            coll.delete(where={"source": src})
+            if chunks:
+                flush(src, chunks)
+            state[src] = {**current[src], "chunks": len(chunks)}
+            _save_manifest(state)
+
+    dt = time.perf_counter() - t0
+    print(f"Ingested {total} chunks from {len(changed)} changed files "
+          f"(removed {len(removed)}) into '{coll_name}' in {dt:.1f}s, {total / max(dt, 1e-9):.1f} chunks/s")
+    _build_bm25(coll, coll_name)
 
 
 if __name__ == "__main__":
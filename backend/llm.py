@@ -1,5 +1,11 @@
-import sys, json, requests
+import sys, json, time, asyncio, threading, weakref
+from typing import Callable, Optional
+
+import httpx
+
 from .config import cfg
+from .metrics import LLM_CALLS, timed
+from .utils import TTLCache
 
 def _messages_to_prompt(user, tags):
     sys_prompt = (
@@ -11,45 +17,237 @@ def _messages_to_prompt(user, tags):
     prompt = f"[SYSTEM]\n{sys_prompt}\nAvailable tags:\n{tag_list}\n\n[USER]\n{user}\n[ASSISTANT]\n"
     return prompt
 
-def _ollama_generate(prompt) -> str:
-    base = cfg.OLLAMA_BASE_URL.rstrip("/")
-    model = cfg.OLLAMA_MODEL
-    url = f"{base}/api/generate"
-    payload = {"model": model, "prompt": prompt, "stream": False, "options": {"temperature": 0.0}}
-    r = requests.post(url, json=payload, timeout=60)
-    try:
-        data = r.json()
-        resp = (data.get("response") or "").strip()
-        if resp:
-            return resp
-    except Exception:
-        # возможно NDJSON-стрим — соберём
+
+def _paraphrase_prompt(text: str) -> str:
+    sys_prompt = (
+        "Rewrite the user's text in Karakalpak (Latin script). Keep the meaning, "
+        "names and numbers. Answer with ONLY the rewritten text."
+    )
+    return f"[SYSTEM]\n{sys_prompt}\n\n[USER]\n{text}\n[ASSISTANT]\n"
+
+
+class _CircuitBreaker:
+    """
+    После `threshold` ошибок подряд LLM не вызываем `cooldown` секунд (сразу фолбэк),
+    потом пропускаем один пробный запрос.
+    """
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold, self.cooldown = threshold, cooldown
+        self.fails = 0
+        self.open_until = 0.0
+
+    def allow(self) -> bool:
+        if self.fails < self.threshold:
+            return True
+        now = time.monotonic()
+        if now >= self.open_until:
+            # half-open: один пробный вызов, остальные до его исхода — сразу фолбэк
+            self.open_until = now + self.cooldown
+            return True
+        return False
+
+    def success(self):
+        self.fails = 0
+
+    def failure(self):
+        self.fails += 1
+        if self.fails >= self.threshold:
+            self.open_until = time.monotonic() + self.cooldown
+
+    @property
+    def is_open(self) -> bool:
+        return self.fails >= self.threshold and time.monotonic() < self.open_until
+
+
+class OllamaClient:
+    """
+    Асинхронный клиент Ollama: один httpx.AsyncClient с keep-alive на процесс,
+    ограничение одновременных запросов и потоковый разбор NDJSON.
+    """
+    def __init__(self):
+        # AsyncClient и семафор привязаны к event loop — держим по паре на loop
+        # (loop uvicorn + фоновый loop синхронной обёртки)
+        self._per_loop: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+        self.breaker = _CircuitBreaker(cfg.LLM_BREAKER_FAILS, cfg.LLM_BREAKER_COOLDOWN_SEC)
+
+    def _http(self) -> tuple[httpx.AsyncClient, asyncio.Semaphore]:
+        loop = asyncio.get_running_loop()
+        st = self._per_loop.get(loop)
+        if st is None:
+            client = httpx.AsyncClient(
+                base_url=cfg.OLLAMA_BASE_URL.rstrip("/"),
+                timeout=httpx.Timeout(cfg.LLM_TIMEOUT_SEC, connect=cfg.LLM_CONNECT_TIMEOUT_SEC),
+                limits=httpx.Limits(max_connections=cfg.LLM_MAX_CONNECTIONS,
+                                    max_keepalive_connections=cfg.LLM_MAX_CONNECTIONS),
+            )
+            st = self._per_loop[loop] = (client, asyncio.Semaphore(cfg.LLM_MAX_CONCURRENCY))
+        return st
+
+    async def aclose(self):
+        st = self._per_loop.pop(asyncio.get_running_loop(), None)
+        if st is not None:
+            await st[0].aclose()
+
+    async def generate(self, prompt: str, done: Optional[Callable[[str], bool]] = None,
+                       options: Optional[dict] = None) -> str:
+        """
+        Читает NDJSON-стрим /api/generate построчно. Если done(текст_на_сейчас) вернул True —
+        соединение закрывается сразу, не дожидаясь конца генерации.
+        """
+        client, sem = self._http()
+        payload = {
+            "model": cfg.OLLAMA_MODEL,
+            "prompt": prompt,
+            "stream": True,
+            "options": {"temperature": 0.0, **(options or {})},
+        }
         out = []
-        for line in (r.text or "").splitlines():
-            try:
-                j = json.loads(line)
-                if "response" in j and j["response"]:
-                    out.append(j["response"])
-            except Exception:
-                pass
-        if out:
-            return "".join(out).strip()
-    r.raise_for_status()
-    return ""
+        async with sem:
+            async with client.stream("POST", "/api/generate", json=payload) as r:
+                r.raise_for_status()
+                async for line in r.aiter_lines():
+                    if not line.strip():
+                        continue
+                    try:
+                        j = json.loads(line)
+                    except ValueError:
+                        continue
+                    if j.get("error"):
+                        raise RuntimeError(f"ollama: {j['error']}")
+                    if j.get("response"):
+                        out.append(j["response"])
+                        if done is not None and done("".join(out)):
+                            break
+                    if j.get("done"):
+                        break
+        return "".join(out).strip()
 
-def classify_to_tag(user_query: str, tags: list[str]) -> str:
+
+_client = OllamaClient()
+_cache = TTLCache(cfg.LLM_CACHE_SIZE, cfg.LLM_CACHE_TTL_SEC)
+
+
+def _norm_query(q: str) -> str:
+    return " ".join((q or "").lower().split())
+
+
+def _tag_ready(tags: list[str]) -> Callable[[str], bool]:
+    """
+    Когда можно прекращать читать стрим: первая строка уже закончилась,
+    или она — тег, который не является началом другого тега.
+    """
+    known = set(tags) | {"NONE"}
+    def done(text: str) -> bool:
+        if "\n" in text.lstrip():
+            return True
+        head = text.strip()
+        return head in known and not any(t != head and t.startswith(head) for t in known)
+    return done
+
+
+async def _ollama_generate(prompt, done: Optional[Callable[[str], bool]] = None) -> str:
+    return await _client.generate(prompt, done=done, options={"num_predict": 32, "stop": ["\n"]})
+
+
+async def classify_to_tag_async(user_query: str, tags: list[str]) -> str:
     provider = (getattr(cfg, "LLM_PROVIDER", "ollama") or "ollama").strip().lower()
     if not tags:
         return "NONE"
-    if provider == "ollama":
-        try:
-            prompt = _messages_to_prompt(user_query, tags)
-            out = _ollama_generate(prompt)
-            # берём только первое слово/строку
-            tag = out.strip().splitlines()[0].strip()
-            if tag in tags or tag == "NONE":
-                return tag
-        except Exception as e:
-            print("[LLM] classify failed:", e, file=sys.stderr)
-    # фолбэк — без LLM
-    return "NONE"
+    if provider != "ollama":
+        return "NONE"
+
+    key = (_norm_query(user_query), tuple(tags))
+    cached = _cache.get(key)
+    if cached is not None:
+        LLM_CALLS.inc("cached")
+        return cached
+    if not _client.breaker.allow():
+        # бэкенд недавно падал — не ждём таймаут, сразу фолбэк
+        LLM_CALLS.inc("breaker_open")
+        return "NONE"
+
+    try:
+        prompt = _messages_to_prompt(user_query, tags)
+        with timed("llm"):
+            out = await _ollama_generate(prompt, done=_tag_ready(tags))
+        _client.breaker.success()
+        LLM_CALLS.inc("ok")
+    except Exception as e:
+        _client.breaker.failure()
+        LLM_CALLS.inc("error")
+        print("[LLM] classify failed:", e, file=sys.stderr)
+        # фолбэк — без LLM
+        return "NONE"
+
+    # берём только первое слово/строку
+    lines = out.strip().splitlines()
+    tag = lines[0].strip() if lines else ""
+    result = tag if (tag in tags or tag == "NONE") else "NONE"
+    _cache.put(key, result)
+    return result
+
+
+async def paraphrase_to_kaa_async(text: str) -> str:
+    """Пересказ на каракалпакском; при любой проблеме с LLM — исходный текст."""
+    provider = (getattr(cfg, "LLM_PROVIDER", "ollama") or "ollama").strip().lower()
+    if provider != "ollama" or not text.strip():
+        return text
+
+    key = ("kaa", _norm_query(text))
+    cached = _cache.get(key)
+    if cached is not None:
+        LLM_CALLS.inc("cached")
+        return cached
+    if not _client.breaker.allow():
+        LLM_CALLS.inc("breaker_open")
+        return text
+
+    try:
+        with timed("llm"):
+            out = await _client.generate(_paraphrase_prompt(text), options={"num_predict": 256})
+        _client.breaker.success()
+        LLM_CALLS.inc("ok")
+    except Exception as e:
+        _client.breaker.failure()
+        LLM_CALLS.inc("error")
+        print("[LLM] paraphrase failed:", e, file=sys.stderr)
+        return text
+
+    result = out or text
+    _cache.put(key, result)
+    return result
+
+
+# ---- Синхронная обёртка для старого кода: свой event loop в фоновом потоке ----
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+
+def _background_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="llm-loop", daemon=True).start()
+        return _loop
+
+
+def classify_to_tag(user_query: str, tags: list[str]) -> str:
+    """Блокирующий вариант classify_to_tag_async (нельзя вызывать из event loop)."""
+    fut = asyncio.run_coroutine_threadsafe(classify_to_tag_async(user_query, tags), _background_loop())
+    return fut.result()
+
+
+def paraphrase_to_kaa(text: str) -> str:
+    """Блокирующий вариант paraphrase_to_kaa_async (нельзя вызывать из event loop)."""
+    fut = asyncio.run_coroutine_threadsafe(paraphrase_to_kaa_async(text), _background_loop())
+    return fut.result()
+
+
+def llm_stats() -> dict:
+    return {
+        "cache_hits": _cache.hits,
+        "cache_misses": _cache.misses,
+        "breaker_open": _client.breaker.is_open,
+        "breaker_fails": _client.breaker.fails,
+    }
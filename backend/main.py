@@ -1,18 +1,31 @@
-from fastapi import FastAPI, Request, UploadFile, File, HTTPException
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi import FastAPI, Request, UploadFile, File, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse, Response
 from fastapi.staticfiles import StaticFiles
+from starlette.concurrency import run_in_threadpool
 from jinja2 import Environment, FileSystemLoader, select_autoescape
 
 import os
+import hmac
 import json
+import time
 import wave
-import tempfile
-import subprocess
 from pathlib import Path
+from typing import BinaryIO, Callable, Iterable
 
 # если cfg и audio_router у тебя есть — оставляем
 from .config import cfg  # можно не использовать, но пусть будет для совместимости
-from .audio_router import create_audio_router
+from .audio_router import create_audio_router, _norm
+from .answer_cache import AnswerCache
+from .stt_pool import STTExecutor, STTBusy, RecognizerPool
+from .audio_decode import ffmpeg_pcm_chunks, DecodeError, AudioTooLong, PCM_CHUNK_BYTES
+from .pcm import decode_pcm_upload
+from .stt_stream import StreamSession, StreamTooLarge
+from .vad import trim_silence, VadStats
+from .audio_assets import AudioAssets, parse_range, iter_file
+from .metrics import REGISTRY, ANSWERS, REJECTED, Gauge, MetricsMiddleware, observe_stage, timed
+from .admission import AdmissionMiddleware
+from .tts import stream_tts
+from .engines import ENGINES, EngineUnavailable
 
 # ---- Настройки Vosk / аудио ----
 os.environ.setdefault("VOSK_LOG_LEVEL", "0")  # тише логов Vosk
@@ -20,78 +33,235 @@ os.environ.setdefault("VOSK_LOG_LEVEL", "0")  # тише логов Vosk
 VOSK_MODEL_PATH = Path(os.getenv("VOSK_MODEL_PATH", "models/vosk-model-small-kz-0.15")).resolve()
 VOSK_SAMPLE_RATE = int(os.getenv("VOSK_SAMPLE_RATE", "16000"))
 
+# частоты сырого PCM в потоковом распознавании: каждая — свой набор распознавателей в пуле,
+# поэтому произвольную частоту от клиента не принимаем (контейнеры ffmpeg и так сводит к VOSK_SAMPLE_RATE)
+STREAM_PCM_RATES = frozenset({8000, 16000, 44100, 48000, VOSK_SAMPLE_RATE})
+
 # опционально: список доменных слов через запятую для подсказки распознавателю
 # пример: VOSK_PHRASES="Нүкіс,Хорезм,район,ассистент"
 VOSK_PHRASES = [p.strip() for p in os.getenv("VOSK_PHRASES", "").split(",") if p.strip()]
+# грамматика из слов ключей data/answers/index.json (+ wake-слова): распознаватель ищет
+# только среди того, на что AudioRouter может ответить. Обновляется при перезагрузке каталога
+VOSK_GRAMMAR_FROM_INDEX = os.getenv("VOSK_GRAMMAR_FROM_INDEX", "0") == "1"
 
 # опционально включить нормализацию громкости (может помочь со слабым микрофоном)
 ENABLE_LOUDNORM = os.getenv("FFMPEG_LOUDNORM", "0") == "1"
 
+# пул распознавания: сколько utterance декодируем параллельно и сколько ждут в очереди,
+# сверх этого /api/transcribe сразу отвечает 503
+STT_WORKERS = int(os.getenv("STT_WORKERS", "2"))
+STT_QUEUE_MAX = int(os.getenv("STT_QUEUE_MAX", "8"))
+
+# серверный VAD: тишина по краям загруженной записи в Vosk не попадает, запись без речи
+# вообще не распознаётся. Порог — шум + VAD_MARGIN_DB, но не ниже VAD_MIN_DB (dBFS)
+VAD_ENABLED = os.getenv("VAD_ENABLED", "1") == "1"
+VAD_PARAMS = {
+    "min_db": float(os.getenv("VAD_MIN_DB", "-45")),
+    "margin_db": float(os.getenv("VAD_MARGIN_DB", "10")),
+    "pad_ms": int(os.getenv("VAD_PAD_MS", "200")),
+    "min_speech_ms": int(os.getenv("VAD_MIN_SPEECH_MS", "90")),
+}
+
 
 # ---- Класс STT на базе Vosk ----
-try:
-    from vosk import Model, KaldiRecognizer
-except Exception as e:
-    raise RuntimeError(
-        "Не удалось импортировать vosk. Убедись, что в requirements.txt есть 'vosk' "
-        "и контейнер пересобран."
-    ) from e
+def _import_vosk():
+    # vosk импортируем только при загрузке модели — старт процесса от него не зависит
+    try:
+        import vosk
+    except Exception as e:
+        raise RuntimeError(
+            "Не удалось импортировать vosk. Убедись, что в requirements.txt есть 'vosk' "
+            "и контейнер пересобран."
+        ) from e
+    return vosk
 
 
 class VoskSTT:
-    def __init__(self, model_path: Path, sample_rate: int = 16000, phrases: list[str] | None = None):
+    def __init__(self, model_path: Path, sample_rate: int = 16000, phrases: list[str] | None = None,
+                 vocabulary: Callable[[], tuple[int, list[str]]] | None = None, max_idle: int = 4):
         if not model_path.exists():
             raise RuntimeError(f"Vosk модель не найдена: {model_path}")
-        self.model = Model(str(model_path))
+        self._vosk = _import_vosk()
+        self.model_path = model_path
+        self.model = self._vosk.Model(str(model_path))
         self.sample_rate = sample_rate
         self.phrases = phrases or []
-
-    def _make_recognizer(self, rate: int):
-        # если есть подсказки — используем грамматику
-        if self.phrases:
-            grammar = json.dumps(self.phrases, ensure_ascii=False)
-            rec = KaldiRecognizer(self.model, rate, grammar)
+        # vocabulary() -> (версия каталога, слова): грамматика из ключей index.json
+        self.vocabulary = vocabulary
+        self._grammar: tuple[int | None, str | None] = (None, self._grammar_json([]))
+        # распознаватели переиспользуются между запросами (KaldiRecognizer не потокобезопасен —
+        # пул отдаёт каждый только одному потоку за раз)
+        self.recognizers = RecognizerPool(self._make_recognizer, max_idle=max_idle)
+
+    def _grammar_json(self, words: list[str]) -> str | None:
+        if not words:
+            # только подсказки VOSK_PHRASES (или свободное распознавание)
+            return json.dumps(self.phrases, ensure_ascii=False) if self.phrases else None
+        # [unk] — чтобы речь вне каталога не притягивалась к ближайшему слову
+        return json.dumps(sorted(set(self.phrases) | set(words)) + ["[unk]"], ensure_ascii=False)
+
+    def grammar(self) -> str | None:
+        """Грамматика для KaldiRecognizer; пересобирается только при смене версии каталога."""
+        if self.vocabulary is None:
+            return self._grammar[1]
+        version, words = self.vocabulary()
+        if self._grammar[0] != version:
+            self._grammar = (version, self._grammar_json(words))
+        return self._grammar[1]
+
+    def recognizer_key(self, rate: int) -> tuple[int, str | None]:
+        return rate, self.grammar()
+
+    def _make_recognizer(self, rate: int, grammar: str | None):
+        if grammar:
+            rec = self._vosk.KaldiRecognizer(self.model, rate, grammar)
         else:
-            rec = KaldiRecognizer(self.model, rate)
+            rec = self._vosk.KaldiRecognizer(self.model, rate)
         rec.SetWords(True)
         return rec
 
+    def transcribe_pcm(self, chunks: Iterable[bytes]) -> dict:
+        # поток порций PCM16 mono self.sample_rate (например, прямо из stdout ffmpeg)
+        key = self.recognizer_key(self.sample_rate)
+        rec = self.recognizers.acquire(key)
+        try:
+            for data in chunks:
+                rec.AcceptWaveform(data)
+            final = json.loads(rec.FinalResult())
+        finally:
+            self.recognizers.release(key, rec)
+        text = (final.get("text") or "").strip()
+        return {"text": text, "raw": final}
+
     def transcribe_wav(self, wav_path: str) -> dict:
-        # ожидаем WAV: PCM16 mono 16k — мы это гарантируем ниже через ffmpeg
+        # ожидаем WAV: PCM16 mono 16k
         with wave.open(wav_path, "rb") as wf:
             if wf.getnchannels() != 1 or wf.getsampwidth() != 2 or wf.getframerate() != self.sample_rate:
                 raise RuntimeError("Неверный формат WAV для Vosk (ожидается PCM16 mono 16k).")
-
-            rec = self._make_recognizer(wf.getframerate())
-
-            while True:
-                data = wf.readframes(4000)
-                if not data:
-                    break
-                rec.AcceptWaveform(data)
-
-            final = json.loads(rec.FinalResult())
-            text = (final.get("text") or "").strip()
-            return {"text": text, "raw": final}
+            return self.transcribe_pcm(iter(lambda: wf.readframes(4000), b""))
 
 
 # ---- FastAPI и шаблоны ----
 app = FastAPI()
+# лимиты тела, корзина на клиента и общий лимит одновременных запросов — до разбора multipart
+ASK_TEXT_MAX_BYTES = 16 * 1024
+app.add_middleware(
+    AdmissionMiddleware,
+    limits={"/api/transcribe": cfg.UPLOAD_MAX_BYTES, "/api/ask-voice": cfg.UPLOAD_MAX_BYTES,
+            "/api/ask-text": ASK_TEXT_MAX_BYTES, "/api/transcribe/ws": cfg.UPLOAD_MAX_BYTES,
+            # GET без тела, но каждый запрос — пара процессов espeak+ffmpeg: корзина и общий лимит
+            "/api/tts": ASK_TEXT_MAX_BYTES},
+    rate=cfg.ADMISSION_RATE_PER_SEC, burst=cfg.ADMISSION_BURST,
+    max_concurrent=cfg.ADMISSION_MAX_CONCURRENT, trust_proxy=cfg.ADMISSION_TRUST_PROXY,
+)
+# этапы запроса -> Server-Timing и гистограммы /metrics (внешний слой: видит и отказы)
+app.add_middleware(MetricsMiddleware)
 templates = Environment(
     loader=FileSystemLoader("templates"),
     autoescape=select_autoescape(["html", "xml"])
 )
 
+# ---- Тяжёлые движки: грузятся лениво (первый запрос) или фоновым прогревом ----
+def _load_embedder():
+    from .semantic import get_encoder
+    return get_encoder().warm()
+
+
+def _load_rag():
+    from .rag import get_rag
+    return get_rag()
+
+
+def _catalogue_vocabulary() -> tuple[int, list[str]]:
+    router = _router()
+    return router.version, router.vocabulary() + list(VOICE_WAKE_WORDS)
+
+
+def _load_stt() -> "VoskSTT":
+    return VoskSTT(VOSK_MODEL_PATH, sample_rate=VOSK_SAMPLE_RATE, phrases=VOSK_PHRASES,
+                   vocabulary=_catalogue_vocabulary if VOSK_GRAMMAR_FROM_INDEX else None,
+                   max_idle=STT_WORKERS)
+
+
+ENGINES.register("stt", _load_stt)
+ENGINES.register("router", create_audio_router)
+ENGINES.register("embedder", _load_embedder)
+ENGINES.register("rag", _load_rag)
+
+
+def _stt() -> VoskSTT:
+    return ENGINES.get("stt")
+
+
+def _router():
+    return ENGINES.get("router")
+
+
 # Глобальные singletons
-STT: VoskSTT | None = None
-AUDIO = None
+STT_POOL: STTExecutor | None = None
+VAD_STATS = VadStats()
 
 
 @app.on_event("startup")
 def _startup():
-    global STT, AUDIO
-    STT = VoskSTT(VOSK_MODEL_PATH, sample_rate=VOSK_SAMPLE_RATE, phrases=VOSK_PHRASES)
-    AUDIO = create_audio_router()
+    global STT_POOL
+    STT_POOL = STTExecutor(workers=STT_WORKERS, queue_max=STT_QUEUE_MAX)
+    if cfg.WARMUP_ENGINES:
+        ENGINES.warm_up(cfg.WARMUP_ENGINES, delay=cfg.WARMUP_DELAY_SEC)
+
+
+@app.on_event("shutdown")
+def _shutdown():
+    if STT_POOL is not None:
+        STT_POOL.shutdown()
+    router = ENGINES.peek("router")
+    if router is not None:
+        router.stop_watching()
+
+
+@app.exception_handler(EngineUnavailable)
+async def _engine_unavailable(_req: Request, exc: EngineUnavailable):
+    return JSONResponse({"detail": str(exc)}, status_code=503)
+
+
+# ---- Готовность: какие движки уже загружены ----
+@app.get("/api/ready")
+def api_ready():
+    ready = ENGINES.is_ready(cfg.WARMUP_ENGINES)
+    body = {"ready": ready, "engines": ENGINES.status()}
+    return JSONResponse(body, status_code=200 if ready else 503)
+
+
+# ---- Метрики Prometheus: гауги читаются в момент опроса ----
+def _stt_gauges() -> dict:
+    if STT_POOL is None:
+        return {}
+    st = STT_POOL.stats()
+    return {("in_flight",): st["in_flight"], ("queue_depth",): st["queue_depth"],
+            ("rejected",): st["rejected"], ("workers",): st["workers"]}
+
+
+def _engine_gauges() -> dict:
+    return {(name,): 1 if st["state"] == "ready" else 0 for name, st in ENGINES.status().items()}
+
+
+def _router_gauges() -> dict:
+    router = ENGINES.peek("router")
+    return {(): router.version} if router is not None else {}
+
+
+REGISTRY.register(Gauge("stt_pool", "Пул распознавания: в работе, в очереди, отклонено, потоков",
+                        _stt_gauges, ("kind",)))
+REGISTRY.register(Gauge("engine_ready", "Движок загружен (1) или нет (0)", _engine_gauges, ("engine",)))
+REGISTRY.register(Gauge("answer_cache", "Кэш ответов: попадания, промахи, размер",
+                        lambda: {(k,): ANSWER_CACHE.stats()[k] for k in ("hits", "shared_hits", "misses", "size")},
+                        ("kind",)))
+REGISTRY.register(Gauge("audio_router_version", "Версия снимка index.json", _router_gauges))
+
+
+@app.get("/metrics")
+def metrics():
+    return Response(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 
 @app.get("/", response_class=HTMLResponse)
@@ -103,86 +273,225 @@ def index():
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
 
-# ---- Утилита конвертации аудио в WAV PCM16 mono 16k ----
-def _ensure_wav(in_path: str) -> str:
-    """
-    Приводим любой входной формат (webm/ogg/mp3/m4a/wav и т.п.) к WAV PCM16 mono 16k.
-    Это критично для качества Vosk.
-    """
-    out_path = in_path + ".wav"
-    cmd = [
-        "ffmpeg", "-y",
-        "-i", in_path,
-        "-ac", "1",
-        "-ar", str(VOSK_SAMPLE_RATE),
-        "-acodec", "pcm_s16le",
-    ]
-    if ENABLE_LOUDNORM:
-        # нормализация громкости (может занять немного больше времени)
-        cmd.extend(["-af", "loudnorm=I=-23:TP=-2:LRA=11"])
-
-    cmd.append(out_path)
-
-    proc = subprocess.run(cmd, capture_output=True, text=True)
-    if proc.returncode != 0:
-        err_tail = (proc.stderr or "").splitlines()[-15:]
-        raise HTTPException(status_code=400, detail="ffmpeg failed:\n" + "\n".join(err_tail))
-    return out_path
+# ---- Блокирующая часть STT: выполняется в потоке STT_POOL, не в event loop ----
+def _pcm_chunks(pcm: bytes) -> Iterable[bytes]:
+    return (pcm[i:i + PCM_CHUNK_BYTES] for i in range(0, len(pcm), PCM_CHUNK_BYTES))
 
 
-# ---- STT endpoint: принимаем единый файл (не фрагменты) ----
-@app.post("/api/transcribe")
-async def api_transcribe(file: UploadFile = File(...)):
-    if STT is None:
+def _transcribe_upload(data: bytes | BinaryIO, content_type: str = "") -> dict:
+    """
+    WAV и audio/L16 (AudioWorklet-захват фронта) разбираем сами, без процесса ffmpeg:
+    PCM16 mono 16k идёт в Vosk как есть, другая частота/каналы — через NumPy.
+    Остальные форматы (webm/ogg/mp3/m4a и т.п.) декодирует ffmpeg — загрузка подаётся
+    в него порциями, без лишних копий в памяти.
+    Запись длиннее UPLOAD_MAX_SEC обрывается на лимите -> 413.
+    """
+    stt = _stt()
+    try:
+        pcm = None
+        if not ENABLE_LOUDNORM:  # loudnorm есть только в ffmpeg
+            t0 = time.perf_counter()
+            pcm = decode_pcm_upload(data, content_type, VOSK_SAMPLE_RATE, max_seconds=cfg.UPLOAD_MAX_SEC)
+            # этап "decode" пишем один раз: для ffmpeg его замерят ниже
+            if pcm is not None:
+                observe_stage("decode", time.perf_counter() - t0)
+        if pcm is None:
+            chunks = ffmpeg_pcm_chunks(data, rate=VOSK_SAMPLE_RATE, loudnorm=ENABLE_LOUDNORM,
+                                       max_seconds=cfg.UPLOAD_MAX_SEC)
+            if not VAD_ENABLED:
+                # ffmpeg и Vosk работают вперемешку — этап "stt" включает декодирование
+                with timed("stt"):
+                    return stt.transcribe_pcm(chunks)
+            with timed("decode"):
+                pcm = b"".join(chunks)
+        elif not VAD_ENABLED:
+            with timed("stt"):
+                return stt.transcribe_pcm(_pcm_chunks(pcm))
+        with timed("vad"):
+            speech = trim_silence(pcm, VOSK_SAMPLE_RATE, **VAD_PARAMS)
+    except AudioTooLong as e:
+        REJECTED.inc("too_long")
+        raise HTTPException(status_code=413, detail=str(e))
+    except DecodeError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    VAD_STATS.record(speech)
+    if not speech.speech:
+        # тишина/шум — распознаватель не трогаем
+        return {"text": "", "raw": {}, "vad": speech.report()}
+    with timed("stt"):
+        result = stt.transcribe_pcm(speech.chunks())
+    result["vad"] = speech.report()
+    return result
+
+
+def _read_upload(file: UploadFile) -> BinaryIO:
+    # тело уже принято (с лимитом AdmissionMiddleware) во временный файл — в память не читаем,
+    # ffmpeg получит его порциями; файл закрывается после отправки ответа (и SSE тоже)
+    if STT_POOL is None:
         raise HTTPException(status_code=503, detail="STT сервис не инициализирован")
+    f = file.file
+    f.seek(0, os.SEEK_END)
+    size = f.tell()
+    f.seek(0)
+    if not size:
+        raise HTTPException(status_code=400, detail="Пустой файл")
+    return f
 
-    suffix = os.path.splitext(file.filename or ".webm")[-1] or ".webm"
-    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-        data = await file.read()
-        if not data:
-            raise HTTPException(status_code=400, detail="Пустой файл")
-        tmp.write(data)
-        tmp.flush()
-        raw_path = tmp.name
 
-    wav_path = None
+async def _transcribe(data: bytes | BinaryIO, content_type: str = "") -> dict:
     try:
-        wav_path = _ensure_wav(raw_path)
-        result = STT.transcribe_wav(wav_path)
-        # чтобы не ломать фронт, возвращаем только text (raw можно включить при отладке)
-        return {"text": result["text"]}
+        return await STT_POOL.run(_transcribe_upload, data, content_type)
+    except STTBusy:
+        raise HTTPException(status_code=503, detail="STT перегружен, попробуйте позже",
+                            headers={"Retry-After": "1"})
+    except EngineUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"STT error: {e}")
+
+
+# ---- STT endpoint: принимаем единый файл (не фрагменты) ----
+@app.post("/api/transcribe")
+async def api_transcribe(file: UploadFile = File(...)):
+    result = await _transcribe(_read_upload(file), file.content_type or "")
+    # чтобы не ломать фронт, возвращаем только text (raw можно включить при отладке)
+    # и сводку VAD: была ли речь и сколько мс тишины отрезано
+    return {"text": result["text"], "vad": result.get("vad")}
+
+
+# ---- Потоковое STT: аудио приходит по мере записи, partial/result — сразу обратно ----
+def _open_stream(fmt: str, rate: int) -> StreamSession:
+    # контейнер декодирует ffmpeg сразу в частоту модели; сырой PCM — в той частоте, что объявил клиент
+    if fmt in ("webm", "ogg"):
+        rate = VOSK_SAMPLE_RATE
+    stt = _stt()
+    key = stt.recognizer_key(rate)
+    rec = stt.recognizers.acquire(key)
+    try:
+        return StreamSession(rec, fmt, rate, loudnorm=ENABLE_LOUDNORM,
+                             release=lambda r: stt.recognizers.release(key, r),
+                             max_bytes=cfg.UPLOAD_MAX_BYTES, max_seconds=cfg.UPLOAD_MAX_SEC)
+    except Exception:
+        stt.recognizers.release(key, rec)
+        raise
+
+
+@app.websocket("/api/transcribe/ws")
+async def api_transcribe_ws(ws: WebSocket):
+    """
+    Протокол (одна фраза за раз, соединение живёт между фразами):
+      -> {"type": "start", "format": "webm"|"ogg"|"pcm16", "sample_rate": 16000}
+      -> бинарные сообщения с аудио
+      -> {"type": "end"}
+      <- {"type": "partial"|"result"|"final"|"error", ...}
+    Фраза больше UPLOAD_MAX_BYTES или длиннее UPLOAD_MAX_SEC -> error и закрытие с кодом 1009.
+    """
+    await ws.accept()
+    if STT_POOL is None:
+        await ws.close(code=1013)
+        return
+
+    session: StreamSession | None = None
+    close_code = None
+    try:
+        while close_code is None:
+            msg = await ws.receive()
+            if msg["type"] == "websocket.disconnect":
+                break
+            events = []
+            try:
+                if msg.get("bytes") is not None:
+                    if session is not None:
+                        events = await STT_POOL.run(session.feed, msg["bytes"])
+                elif msg.get("text"):
+                    cmd = json.loads(msg["text"])
+                    if not isinstance(cmd, dict):
+                        raise ValueError("command must be a JSON object")
+                    if cmd.get("type") == "start":
+                        if session is not None:
+                            session.close()
+                            session = None
+                        fmt = str(cmd.get("format") or "webm").lower()
+                        rate = cmd.get("sample_rate") or VOSK_SAMPLE_RATE
+                        if fmt not in ("webm", "ogg") and not (type(rate) is int and rate in STREAM_PCM_RATES):
+                            raise ValueError(f"unsupported sample_rate: {rate!r}, "
+                                             f"expected one of {sorted(STREAM_PCM_RATES)}")
+                        session = await STT_POOL.run(_open_stream, fmt, rate)
+                    elif cmd.get("type") == "end":
+                        if session is None:
+                            events = [{"type": "final", "text": ""}]
+                        else:
+                            events = await STT_POOL.run(session.finish)
+                            session = None
+            except (StreamTooLarge, AudioTooLong) as e:
+                # лимиты загрузки файлом действуют и на поток: дальше не слушаем
+                REJECTED.inc("too_large" if isinstance(e, StreamTooLarge) else "too_long")
+                events = [{"type": "error", "detail": str(e)}]
+                close_code = 1009
+            except STTBusy:
+                events = [{"type": "error", "detail": "busy"}]
+            except EngineUnavailable as e:
+                events = [{"type": "error", "detail": str(e)}]
+            except (DecodeError, ValueError) as e:
+                events = [{"type": "error", "detail": str(e)}]
+            if events and events[-1]["type"] == "error" and session is not None:
+                # фраза потеряна — клиент отправит её через /api/transcribe
+                session.close()
+                session = None
+            for ev in events:
+                await ws.send_json(ev)
+        if close_code is not None:
+            await ws.close(code=close_code)
+    except WebSocketDisconnect:
+        pass
     finally:
-        for p in (raw_path, wav_path):
-            if p:
-                try:
-                    os.remove(p)
-                except Exception:
-                    pass
+        if session is not None:
+            session.close()
 
 
-# ---- Основной: текст → находим и отдаём URL аудиофайла ----
-@app.post("/api/ask-text")
-async def api_ask_text(req: Request):
-    body = await req.json()
-    user_text = (body.get("text") or "").strip()
-    if not user_text:
-        return JSONResponse({"error": "empty text"}, status_code=400)
+# ---- Состояние очереди распознавания ----
+@app.get("/api/stt/stats")
+def api_stt_stats():
+    if STT_POOL is None:
+        raise HTTPException(status_code=503, detail="STT сервис не инициализирован")
+    stt = ENGINES.peek("stt")
+    return {**STT_POOL.stats(), "vad": VAD_STATS.stats(),
+            "recognizers": stt.recognizers.stats() if stt is not None else None}
 
-    # убираем wake-word "Хурлиман/Khurliman/Hurliman"
+
+# ---- Маршрутизация текста в аудио-ответ ----
+WAKE_WORDS = ("хурлиман", "hurli", "hurliman", "khurliman", "qurliman")
+# фронт будит ассистента словом "көмекші" и сам срезает его перед /api/ask-text;
+# в голосовом эндпоинте это делает сервер
+VOICE_WAKE_WORDS = WAKE_WORDS + ("көмекші", "көмекши", "көмек ші", "көмек ши")
+
+
+def _strip_wake_word(user_text: str, words=WAKE_WORDS) -> tuple[str, bool]:
     low = user_text.lower()
-    for w in ("хурлиман", "hurli", "hurliman", "khurliman", "qurliman"):
+    for w in words:
         if low.startswith(w + " "):
-            user_text = user_text[len(w) + 1:].strip()
-            break
+            return user_text[len(w) + 1:].strip(), True
+    return user_text, False
+
 
-    audio_rel, tag, matched_by = AUDIO.find(user_text)
+def _audio_url(audio_rel: str) -> str:
+    # клипы из STATIC_AUDIO_DIR — через /api/audio с версией по содержимому (кэш навсегда),
+    # остальное — как раньше, из /static
+    name = AUDIO_ASSETS.name_for(audio_rel)
+    if name is not None and AUDIO_ASSETS.get(name) is not None:
+        return AUDIO_ASSETS.url_for(name)
+    return "/" + audio_rel.lstrip("/")
+
+
+def _answer(user_text: str) -> dict:
+    with timed("route"):
+        audio_rel, tag, matched_by = _router().find(user_text)
+    ANSWERS.inc(matched_by)
 
     # audio_rel лежит внутри /static/, фронт сможет воспроизвести
-    audio_url = "/" + audio_rel.lstrip("/")
+    audio_url = _audio_url(audio_rel)
 
     return {
         "matched_tag": tag,
@@ -190,3 +499,192 @@ async def api_ask_text(req: Request):
         "audio_url": audio_url,
         "screen_text": f"{tag} ({matched_by})"
     }
+
+
+# одни и те же вопросы приходят постоянно — повторный ответ без маршрутизации
+ANSWER_CACHE = AnswerCache(cfg.ANSWER_CACHE_SIZE, cfg.ANSWER_CACHE_TTL_SEC, cfg.ANSWER_CACHE_DB)
+
+
+def _answer_cached(user_text: str) -> dict:
+    # хэш index.json в ключе: новый каталог — новые ключи, старые ответы не находятся
+    key = AnswerCache.key(_router().source_hash, _norm(user_text))
+    hit = ANSWER_CACHE.get(key)
+    if hit is not None:
+        ANSWERS.inc(hit["matched_by"])
+        return hit
+    result = _answer(user_text)
+    ANSWER_CACHE.put(key, result)
+    return result
+
+
+# ---- Основной: текст → находим и отдаём URL аудиофайла ----
+@app.post("/api/ask-text")
+async def api_ask_text(req: Request):
+    body = await req.json()
+    user_text = (body.get("text") or "").strip()
+    if not user_text:
+        return JSONResponse({"error": "empty text"}, status_code=400)
+
+    # убираем wake-word "Хурлиман/Khurliman/Hurliman"
+    user_text, _ = _strip_wake_word(user_text)
+    # find() может считать эмбеддинг запроса (semantic) — не в event loop
+    return await run_in_threadpool(_answer_cached, user_text)
+
+
+# ---- Аудио-ответы: ETag, вечный кэш по версии, Range, Opus для медленных каналов ----
+AUDIO_ASSETS = AudioAssets(cfg.STATIC_AUDIO_DIR)
+AUDIO_IMMUTABLE = "public, max-age=31536000, immutable"
+
+
+def _wants_opus(req: Request, fmt: str) -> bool:
+    if fmt:
+        return fmt == "opus"
+    accept = req.headers.get("accept", "")
+    return "audio/ogg" in accept or "audio/opus" in accept
+
+
+@app.get("/api/audio/manifest")
+def api_audio_manifest():
+    """Все клипы каталога (+ default) с версионированными адресами — фронт заранее кладёт их в кэш."""
+    router = _router()
+    rels = [it["audio"] for it in router.items] + [router.default_audio]
+    clips = []
+    for rel in dict.fromkeys(rels):
+        name = AUDIO_ASSETS.name_for(rel)
+        asset = AUDIO_ASSETS.get(name) if name is not None else None
+        if asset is None:
+            continue
+        clips.append({"url": AUDIO_ASSETS.url_for(name), "bytes": asset.size,
+                      "opus": AUDIO_ASSETS.has_opus(name)})
+    return JSONResponse({"version": router.version, "clips": clips},
+                        headers={"Cache-Control": "no-cache"})
+
+
+@app.get("/api/audio/{name:path}")
+def api_audio(name: str, req: Request, v: str = "", fmt: str = ""):
+    opus = _wants_opus(req, fmt)
+    asset = AUDIO_ASSETS.get(name, opus=opus)
+    if asset is None:
+        raise HTTPException(status_code=404, detail="audio not found")
+    source = AUDIO_ASSETS.get(name)
+    # адрес ровно с актуальной версией не изменится никогда; без версии, с устаревшей или чужой
+    # (или Opus ещё не собран, а просили его) — перепроверка по ETag, иначе клиент навсегда
+    # закэширует под старым адресом новые байты
+    final = v == AUDIO_ASSETS.version(source) and (asset.path.suffix == ".opus" or not opus)
+    headers = {
+        "ETag": asset.etag,
+        "Accept-Ranges": "bytes",
+        "Vary": "Accept",
+        "Cache-Control": AUDIO_IMMUTABLE if final else "no-cache",
+    }
+    if asset.etag in [t.strip() for t in req.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers=headers)
+
+    rng = req.headers.get("range")
+    if rng and req.headers.get("if-range", asset.etag) != asset.etag:
+        rng = None  # файл сменился с тех пор, как клиент получил начало — отдаём целиком
+    try:
+        span = parse_range(rng, asset.size)
+    except ValueError:
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{asset.size}"})
+    if span is None:
+        return StreamingResponse(iter_file(asset.path, 0, asset.size - 1), media_type=asset.media_type,
+                                 headers={**headers, "Content-Length": str(asset.size)})
+    start, end = span
+    headers.update({"Content-Range": f"bytes {start}-{end}/{asset.size}",
+                    "Content-Length": str(end - start + 1)})
+    return StreamingResponse(iter_file(asset.path, start, end), status_code=206,
+                             media_type=asset.media_type, headers=headers)
+
+
+# ---- Озвучка произвольного текста: mp3 уходит клиенту по мере кодирования ----
+TTS_MAX_CHARS = 500
+
+
+@app.get("/api/tts")
+def api_tts(text: str = ""):
+    text = text.strip()
+    if not text:
+        raise HTTPException(status_code=400, detail="empty text")
+    if len(text) > TTS_MAX_CHARS:
+        raise HTTPException(status_code=413, detail=f"text longer than {TTS_MAX_CHARS} chars")
+    return StreamingResponse(stream_tts(text), media_type="audio/mpeg")
+
+
+# ---- Перезагрузка каталога ответов без рестарта процесса ----
+def _check_admin(req: Request):
+    # без настроенного токена админ-эндпоинты закрыты: пересборку индекса не должен дёргать кто угодно
+    if not cfg.ADMIN_TOKEN or not hmac.compare_digest(req.headers.get("x-admin-token", ""), cfg.ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="forbidden")
+
+
+@app.post("/api/admin/reload-answers")
+def api_reload_answers(req: Request):
+    _check_admin(req)
+    # def-эндпоинт: FastAPI выполнит его в threadpool, сборка индекса не держит event loop
+    info = _router().reload()
+    if not info.get("ok"):
+        raise HTTPException(status_code=422, detail=info)
+    return info
+
+
+@app.get("/api/admin/answers")
+def api_answers_info(req: Request):
+    _check_admin(req)
+    return {**_router().last_reload, "cache": ANSWER_CACHE.stats()}
+
+
+# ---- Голос → ответ за один запрос: STT + wake-word + AudioRouter ----
+def _voice_query(text: str) -> dict:
+    query, wake = _strip_wake_word(text, VOICE_WAKE_WORDS)
+    if text.lower() in VOICE_WAKE_WORDS:
+        query, wake = "", True
+    return {"text": text, "query": query, "wake": wake}
+
+
+def _is_noise(text: str) -> bool:
+    # пустой транскрипт или только [unk] из грамматики — в речи нет ни одного слова
+    return not any(ch.isalnum() for w in text.lower().split() if w != "[unk]" for ch in w)
+
+
+# ответ на тишину/шум: без маршрутизации, мимо answers_total и кэша ответов
+NO_ANSWER = {"matched_tag": None, "matched_by": None, "audio_url": None, "screen_text": ""}
+
+
+def _voice_answer(voice: dict) -> dict:
+    if _is_noise(voice["text"]):
+        return NO_ANSWER
+    return _answer_cached(voice["query"])
+
+
+def _sse(event: str, payload: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+
+async def _ask_voice_events(data: BinaryIO, content_type: str):
+    # транскрипт уходит клиенту сразу, ответ — следующим событием
+    try:
+        result = await _transcribe(data, content_type)
+    except HTTPException as e:
+        yield _sse("error", {"status": e.status_code, "detail": e.detail})
+        return
+    voice = {**_voice_query(result["text"]), "vad": result.get("vad")}
+    yield _sse("transcript", voice)
+    yield _sse("answer", await run_in_threadpool(_voice_answer, voice))
+
+
+@app.post("/api/ask-voice")
+async def api_ask_voice(req: Request, file: UploadFile = File(...)):
+    """
+    Возвращает {"text", "query", "wake", "matched_tag", "matched_by", "audio_url", "screen_text"};
+    на тишину/шум (пустой транскрипт) поля ответа — null, маршрутизация не вызывается.
+    С заголовком Accept: text/event-stream — SSE: событие transcript, затем answer.
+    """
+    data = _read_upload(file)
+    if "text/event-stream" in req.headers.get("accept", ""):
+        return StreamingResponse(_ask_voice_events(data, file.content_type or ""), media_type="text/event-stream",
+                                 headers={"Cache-Control": "no-cache"})
+
+    result = await _transcribe(data, file.content_type or "")
+    voice = {**_voice_query(result["text"]), "vad": result.get("vad")}
+    return {**voice, **(await run_in_threadpool(_voice_answer, voice))}
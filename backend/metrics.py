@@ -0,0 +1,197 @@
+# backend/metrics.py
+"""
+Метрики в текстовом формате Prometheus (/metrics) + заголовок Server-Timing.
+Без внешних зависимостей; на горячем пути — только lock + bisect (~1 мкс на наблюдение).
+Гауги считаются в момент опроса (callback), поэтому запросы их не трогают.
+В многопроцессном режиме (gunicorn) у каждого воркера свои значения.
+"""
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# этапы текущего запроса для Server-Timing: [(stage, seconds), ...]
+_timings: contextvars.ContextVar[Optional[List[Tuple[str, float]]]] = contextvars.ContextVar("timings", default=None)
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(v) -> str:
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], le: Optional[str] = None) -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if le is not None:
+        parts.append(f'le="{le}"')
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _num(v: float) -> str:
+    return repr(float(v)) if v != int(v) else str(int(v))
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = ()):
+        self.name, self.help, self.labelnames = name, help, labelnames
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, v in items:
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_num(v)}"
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, labelnames
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [счётчики по корзинам (+Inf последней), сумма]
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            s = self._series.get(labels)
+            if s is None:
+                s = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            s[0][i] += 1
+            s[1] += value
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            items = sorted((k, (list(v[0]), v[1])) for k, v in self._series.items())
+        for labels, (counts, total) in items:
+            acc = 0
+            for le, c in zip(self.buckets + (float("inf"),), counts):
+                acc += c
+                bound = "+Inf" if le == float("inf") else _num(le)
+                yield f"{self.name}_bucket{_labels(self.labelnames, labels, bound)} {acc}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labels)} {_num(round(total, 6))}"
+            yield f"{self.name}_count{_labels(self.labelnames, labels)} {acc}"
+
+
+class Gauge:
+    """Значения берутся у fn() при каждом опросе: {labels: value}."""
+    def __init__(self, name: str, help: str, fn: Callable[[], Dict[Tuple[str, ...], float]],
+                 labelnames: Tuple[str, ...] = ()):
+        self.name, self.help, self.labelnames, self.fn = name, help, labelnames, fn
+
+    def render(self) -> Iterable[str]:
+        try:
+            values = self.fn()
+        except Exception:
+            return
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} gauge"
+        for labels, v in sorted(values.items()):
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_num(v)}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: list = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(line for m in self._metrics for line in m.render()) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "voice_stage_seconds", "Время этапов обработки запроса", ("stage",)))
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "http_request_seconds", "Время ответа API (до заголовков ответа)", ("route", "status")))
+ANSWERS = REGISTRY.register(Counter(
+    "answers_total", "Ответы AudioRouter по уровню совпадения", ("matched_by",)))
+LLM_CALLS = REGISTRY.register(Counter(
+    "llm_calls_total", "Вызовы LLM-классификатора по исходу", ("result",)))
+REJECTED = REGISTRY.register(Counter(
+    "admission_rejected_total", "Запросы, отклонённые до обработки (rate, busy, too_large, too_long)",
+    ("reason",)))
+
+
+def observe_stage(stage: str, seconds: float):
+    STAGE_SECONDS.observe(seconds, stage)
+    timings = _timings.get()
+    if timings is not None:
+        timings.append((stage, seconds))
+
+
+@contextmanager
+def timed(stage: str):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - t0)
+
+
+def server_timing(timings: List[Tuple[str, float]], total: float) -> str:
+    parts = [f"{stage};dur={seconds * 1000:.2f}" for stage, seconds in timings]
+    parts.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(parts)
+
+
+class MetricsMiddleware:
+    """
+    ASGI-middleware (без BaseHTTPMiddleware — не буферизует потоковые ответы):
+    собирает этапы запроса и добавляет Server-Timing к ответам /api/*.
+    Этап upload_read — приём тела: от первого чтения до последней порции
+    (multipart разбирается и пишется во временный файл по ходу чтения).
+    """
+    def __init__(self, app, prefix: str = "/api/"):
+        self.app = app
+        self.prefix = prefix
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.prefix):
+            return await self.app(scope, receive, send)
+        timings: List[Tuple[str, float]] = []
+        token = _timings.set(timings)
+        t0 = time.perf_counter()
+        body = {"start": None, "bytes": 0}
+
+        async def receive_wrapper():
+            if body["start"] is None:
+                body["start"] = time.perf_counter()
+            message = await receive()
+            if message["type"] == "http.request":
+                body["bytes"] += len(message.get("body", b""))
+                if not message.get("more_body", False) and body["bytes"]:
+                    observe_stage("upload_read", time.perf_counter() - body["start"])
+            return message
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                total = time.perf_counter() - t0
+                endpoint = scope.get("endpoint")
+                route = getattr(endpoint, "__name__", "other")
+                REQUEST_SECONDS.observe(total, route, str(message["status"]))
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", server_timing(timings, total).encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            _timings.reset(token)
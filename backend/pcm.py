@@ -0,0 +1,121 @@
+# backend/pcm.py
+"""
+Разбор несжатых загрузок без ffmpeg: на короткой фразе запуск процесса дороже самого декодирования.
+- WAV (PCM 8/16/24/32 бит, любая частота и число каналов) — по заголовку RIFF
+- audio/L16;rate=...;channels=... (RFC 2586: big-endian) — по объявленному Content-Type
+PCM16 mono в частоте модели отдаётся как есть; остальное сводится в моно и пересчитывается
+в частоту модели NumPy-ом. Сжатые форматы (webm/ogg/mp3...) — None, их декодирует ffmpeg.
+"""
+import io
+import wave
+from typing import BinaryIO, Optional, Tuple, Union
+
+import numpy as np
+
+from .audio_decode import AudioTooLong, DecodeError
+
+
+def _l16_params(content_type: str) -> Optional[Tuple[int, int]]:
+    """'audio/L16;rate=16000;channels=1' -> (16000, 1); другой тип — None."""
+    kind, *params = [p.strip() for p in (content_type or "").split(";")]
+    if kind.lower() != "audio/l16":
+        return None
+    opts = dict(p.split("=", 1) for p in params if "=" in p)
+    # без rate (RFC 2586) частоту не узнать, а ffmpeg сырой PCM без заголовка не разберёт
+    if "rate" not in opts:
+        raise DecodeError("audio/L16 requires a rate= parameter")
+    try:
+        rate, channels = int(opts["rate"]), int(opts.get("channels", 1))
+    except ValueError:
+        raise DecodeError(f"bad audio/L16 parameters: {content_type!r}")
+    _check_format(rate, channels)
+    return rate, channels
+
+
+def _check_format(rate: int, channels: int):
+    if rate <= 0 or channels <= 0:
+        raise DecodeError(f"bad PCM format: rate={rate}, channels={channels}")
+
+
+def _to_float(raw: bytes, width: int, big_endian: bool = False) -> np.ndarray:
+    # обрезанный хвост (неполный отсчёт) отбрасываем — frombuffer на нём падает
+    raw = raw[:len(raw) // width * width] if width > 0 else raw
+    if width == 1:
+        return (np.frombuffer(raw, np.uint8).astype(np.float32) - 128.0) / 128.0
+    if width == 2:
+        return np.frombuffer(raw, ">i2" if big_endian else "<i2").astype(np.float32) / 32768.0
+    if width == 3:
+        b = np.frombuffer(raw, np.uint8).reshape(-1, 3).astype(np.int32)
+        v = b[:, 0] | (b[:, 1] << 8) | (b[:, 2] << 16)
+        v = np.where(v >= 1 << 23, v - (1 << 24), v)
+        return v.astype(np.float32) / float(1 << 23)
+    if width == 4:
+        return np.frombuffer(raw, "<i4").astype(np.float32) / float(1 << 31)
+    raise DecodeError(f"unsupported PCM sample width: {width}")
+
+
+def resample(x: np.ndarray, src: int, dst: int) -> np.ndarray:
+    """Линейная интерполяция; при понижении частоты сначала ФНЧ (windowed sinc) от наложения спектра."""
+    if src <= 0 or dst <= 0:
+        raise ValueError(f"sample rates must be positive: {src} -> {dst}")
+    if src == dst or not len(x):
+        return x
+    if dst < src:
+        cutoff = 0.45 * dst / src  # доля частоты дискретизации src, чуть ниже новой Найквиста
+        half = int(np.ceil(4.0 / cutoff))
+        n = np.arange(-half, half + 1)
+        h = np.sinc(2 * cutoff * n) * np.hamming(len(n))
+        x = np.convolve(x, (h / h.sum()).astype(np.float32), mode="same")
+    t = np.arange(int(len(x) * dst / src)) * (src / dst)
+    return np.interp(t, np.arange(len(x)), x).astype(np.float32)
+
+
+def to_pcm16_mono(raw: bytes, rate: int, channels: int, width: int, target_rate: int,
+                  big_endian: bool = False) -> bytes:
+    # только целые кадры: нечётная длина L16 или недописанный data-чанк WAV
+    frame = width * channels
+    raw = raw[:len(raw) // frame * frame]
+    if rate == target_rate and channels == 1 and width == 2:
+        # L16 в частоте модели — только перестановка байтов, без потерь на float
+        return np.frombuffer(raw, ">i2").astype("<i2").tobytes() if big_endian else raw
+    x = _to_float(raw, width, big_endian)
+    if channels > 1:
+        x = x[:len(x) // channels * channels].reshape(-1, channels).mean(axis=1)
+    x = resample(x, rate, target_rate)
+    return (np.clip(x, -1.0, 1.0) * 32767.0).astype("<i2").tobytes()
+
+
+def decode_pcm_upload(data: Union[bytes, BinaryIO], content_type: str = "", target_rate: int = 16000,
+                      max_seconds: float = 0) -> Optional[bytes]:
+    """
+    PCM16 mono target_rate для несжатой загрузки или None (не WAV/L16 — нужен ffmpeg).
+    Файл после None перемотан в начало. Длиннее max_seconds — AudioTooLong, не читая данные;
+    битый заголовок (нулевая частота/каналы, L16 без rate) — DecodeError.
+    """
+    f = io.BytesIO(data) if isinstance(data, (bytes, bytearray)) else data
+    start = f.tell()
+    l16 = _l16_params(content_type)
+    if l16 is not None:
+        rate, channels = l16
+        raw = f.read()
+        if max_seconds > 0 and len(raw) / (2 * channels * rate) > max_seconds:
+            raise AudioTooLong(f"audio longer than {max_seconds:g}s")
+        return to_pcm16_mono(raw, rate, channels, 2, target_rate, big_endian=True)
+
+    head = f.read(12)
+    f.seek(start)
+    if len(head) < 12 or head[:4] != b"RIFF" or head[8:12] != b"WAVE":
+        return None
+    try:
+        with wave.open(f, "rb") as wf:
+            rate, channels, width, frames = (wf.getframerate(), wf.getnchannels(),
+                                             wf.getsampwidth(), wf.getnframes())
+            _check_format(rate, channels)
+            if max_seconds > 0 and frames / rate > max_seconds:
+                raise AudioTooLong(f"audio longer than {max_seconds:g}s")
+            raw = wf.readframes(frames)
+    except (wave.Error, EOFError):
+        # float/ADPCM и прочие варианты WAV — ffmpeg разберётся
+        f.seek(start)
+        return None
+    return to_pcm16_mono(raw, rate, channels, width, target_rate)
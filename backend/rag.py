@@ -1,38 +1,209 @@
-from typing import List, Tuple
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+import sys
+import threading
 import numpy as np
 
-# Совместимость, если вдруг будет NumPy 2.0
-if not hasattr(np, "float_"):
-    np.float_ = np.float64
-if not hasattr(np, "int_"):
-    np.int_ = np.int64
-if not hasattr(np, "uint"):
-    np.uint = np.uint64
-
-import chromadb
-from chromadb.config import Settings
-from sentence_transformers import SentenceTransformer
+from .bm25 import BM25Index, confident, index_path, rrf
 from .config import cfg
+from .semantic import get_encoder
+from .utils import MicroBatcher
+
+
+# (id чанка, текст, источник)
+Hit = Tuple[str, str, str]
+
+
+def _norm_query(q: str) -> str:
+    return " ".join((q or "").lower().split())
+
+
+class _EmbeddingCache:
+    """LRU эмбеддингов запросов, ограниченный по памяти (байты векторов)."""
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._data: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def get(self, key: str):
+        with self._lock:
+            v = self._data.get(key)
+            if v is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return v
+
+    def put(self, key: str, vec: np.ndarray):
+        if vec.nbytes > self.max_bytes:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old.nbytes
+            self._data[key] = vec
+            self._bytes += vec.nbytes
+            while self._bytes > self.max_bytes:
+                _, ev = self._data.popitem(last=False)
+                self._bytes -= ev.nbytes
+
+
+def _import_chromadb():
+    # chromadb тянет за собой много модулей — импортируем при первом создании RAG
+    # Совместимость, если вдруг будет NumPy 2.0
+    if not hasattr(np, "float_"):
+        np.float_ = np.float64
+    if not hasattr(np, "int_"):
+        np.int_ = np.int64
+    if not hasattr(np, "uint"):
+        np.uint = np.uint64
+    import chromadb
+    from chromadb.config import Settings
+    return chromadb, Settings
+
 
 class RAG:
     def __init__(self):
+        chromadb, Settings = _import_chromadb()
         self.client = chromadb.PersistentClient(
             path=cfg.CHROMA_DIR,
             settings=Settings(allow_reset=False, anonymized_telemetry=False)
         )
         # ⚠️ Больше не "kb", а имя из конфига
         self.collection = self.client.get_or_create_collection(cfg.CHROMA_COLLECTION)
-        self.embedder = SentenceTransformer(cfg.EMBEDDING_MODEL)
+        # та же модель, что у семантического уровня AudioRouter — грузится один раз на процесс
+        self.encoder = get_encoder()
+        self.cache = _EmbeddingCache(int(cfg.RAG_EMBED_CACHE_MB * 1024 * 1024))
+        # одновременные search() в пределах окна уходят одним search_many()
+        self._batcher = MicroBatcher(self._search_batch, window_ms=cfg.RAG_BATCH_WINDOW_MS,
+                                     max_batch=cfg.EMBED_BATCH_MAX, name="rag-batch")
+        # лексический индекс собирает backend.ingest; нет его — работаем как раньше, только векторы
+        self.bm25 = BM25Index.load(index_path(cfg.CHROMA_DIR, cfg.CHROMA_COLLECTION))
+        if self.bm25 is None and cfg.RAG_MODE != "dense":
+            print("[RAG] BM25 index not found, dense search only (run python -m backend.ingest)",
+                  file=sys.stderr)
+        # счётчики путей обслуживания: search() зовут из многих потоков threadpool
+        self.modes = {"lexical": 0, "hybrid": 0, "dense": 0}
+        self._modes_lock = threading.Lock()
+        # 0 — без быстрого лексического пути (bench_rag сравнивает оба варианта)
+        self.lexical_margin = cfg.RAG_LEXICAL_MARGIN
+
+    def _count(self, mode: str):
+        with self._modes_lock:
+            self.modes[mode] += 1
 
     def embed(self, texts: List[str]) -> List[List[float]]:
-        return self.embedder.encode(texts, normalize_embeddings=True).tolist()
+        return self._embed_cached(texts).tolist()
+
+    def _embed_cached(self, texts: List[str]) -> np.ndarray:
+        keys = [_norm_query(t) for t in texts]
+        vecs = [self.cache.get(k) for k in keys]
+        missing = sorted({k for k, v in zip(keys, vecs) if v is None})
+        if missing:
+            # все новые запросы пачки — одним проходом модели
+            # copy(): строка-view держала бы в памяти всю матрицу пачки
+            fresh = {k: v.copy() for k, v in zip(missing, self.encoder.encode(missing))}
+            for k, v in fresh.items():
+                self.cache.put(k, v)
+            vecs = [v if v is not None else fresh[k] for k, v in zip(keys, vecs)]
+        return np.stack(vecs)
 
-    def search(self, query: str, top_k: int = None) -> List[Tuple[str, str]]:
+    def _dense_many(self, queries: List[str], top_k: int) -> List[List[Hit]]:
+        """Пачка запросов: один encode на все новые и один collection.query на всё."""
+        qvs = self._embed_cached(queries).tolist()
+        res = self.collection.query(query_embeddings=qvs, n_results=top_k)
+        empty = [[] for _ in queries]
+        ids_all = res.get("ids") or empty
+        docs_all = res.get("documents") or empty
+        metas_all = res.get("metadatas") or empty
+        return [
+            list(zip(ids, docs, [m.get("source", "") if m else "" for m in metadatas]))
+            for ids, docs, metadatas in zip(ids_all, docs_all, metas_all)
+        ]
+
+    def _search_batch(self, reqs: List[Tuple[str, int]]) -> List[List[Hit]]:
+        # разные top_k в одной пачке: спрашиваем максимум и обрезаем
+        max_k = max(k for _, k in reqs)
+        results = self._dense_many([q for q, _ in reqs], max_k)
+        return [r[:k] for r, (_, k) in zip(results, reqs)]
+
+    def _mode(self, mode: Optional[str]) -> str:
+        mode = (mode or cfg.RAG_MODE).strip().lower()
+        if self.bm25 is None:
+            return "dense"
+        return mode if mode in self.modes else "hybrid"
+
+    def _lexical_first(self, query: str, mode: str, top_k: int) -> Tuple[Optional[List[Tuple[str, str]]], List[Hit]]:
+        """(готовый ответ без векторов или None, кандидаты BM25 для слияния)."""
+        if mode == "dense":
+            return None, []
+        hits, coverage = self.bm25.search(query, max(top_k, cfg.RAG_FUSION_DEPTH))
+        lex = [(self.bm25.ids[i], self.bm25.document(i), self.bm25.sources[i]) for i, _ in hits]
+        if mode == "lexical" or confident(hits, coverage, self.lexical_margin):
+            self._count("lexical")
+            return [(doc, src) for _, doc, src in lex[:top_k]], lex
+        return None, lex
+
+    def _merge(self, mode: str, lex: List[Hit], dense: List[Hit], top_k: int) -> List[Tuple[str, str]]:
+        self._count(mode)
+        if mode != "hybrid":
+            return [(doc, src) for _, doc, src in dense[:top_k]]
+        by_id = {cid: (doc, src) for cid, doc, src in dense + lex}
+        fused = rrf([[h[0] for h in lex], [h[0] for h in dense]], k=cfg.RAG_RRF_K)
+        return [by_id[cid] for cid, _ in fused[:top_k]]
+
+    def _dense_k(self, mode: str, top_k: int) -> int:
+        return max(top_k, cfg.RAG_FUSION_DEPTH) if mode == "hybrid" else top_k
+
+    def search_many(self, queries: List[str], top_k: int = None, mode: str = None) -> List[List[Tuple[str, str]]]:
+        """Пачка запросов: уверенные лексические — сразу, остальные — одним encode и одним query."""
+        if not queries:
+            return []
         top_k = top_k or cfg.TOP_K
-        qv = self.embed([query])[0]
-        res = self.collection.query(query_embeddings=[qv], n_results=top_k)
-        docs = res.get("documents", [[]])[0]
-        metadatas = res.get("metadatas", [[]])[0]
-        return list(zip(docs, [m.get("source", "") if m else "" for m in metadatas]))
+        mode = self._mode(mode)
+        out: List[Optional[List[Tuple[str, str]]]] = []
+        lex_all: List[List[Hit]] = []
+        for q in queries:
+            done, lex = self._lexical_first(q, mode, top_k)
+            out.append(done)
+            lex_all.append(lex)
+        need = [i for i, r in enumerate(out) if r is None]
+        if need:
+            dense_all = self._dense_many([queries[i] for i in need], self._dense_k(mode, top_k))
+            for i, dense in zip(need, dense_all):
+                out[i] = self._merge(mode, lex_all[i], dense, top_k)
+        return out
+
+    def search(self, query: str, top_k: int = None, mode: str = None) -> List[Tuple[str, str]]:
+        top_k = top_k or cfg.TOP_K
+        mode = self._mode(mode)
+        done, lex = self._lexical_first(query, mode, top_k)
+        if done is not None:
+            return done
+        dense = self._batcher.submit((query, self._dense_k(mode, top_k)))
+        return self._merge(mode, lex, dense, top_k)
+
+    def stats(self) -> dict:
+        return {"cache_hits": self.cache.hits, "cache_misses": self.cache.misses,
+                "bm25_chunks": len(self.bm25) if self.bm25 is not None else None,
+                "modes": self.mode_counts(), **self._batcher.stats()}
+
+    def mode_counts(self) -> dict:
+        with self._modes_lock:
+            return dict(self.modes)
+
+
+_rag: Optional[RAG] = None
+_rag_lock = threading.Lock()
+
 
-rag = RAG()
+def get_rag() -> RAG:
+    """RAG создаётся при первом обращении (клиент Chroma + модель), а не при импорте модуля."""
+    global _rag
+    with _rag_lock:
+        if _rag is None:
+            _rag = RAG()
+        return _rag
@@ -0,0 +1,125 @@
+# backend/semantic.py
+"""
+Эмбеддинги для AudioRouter (matched_by="semantic"):
+- один SentenceTransformer на процесс, грузится при первом обращении
+- BatchingEncoder: одновременные запросы из разных потоков склеиваются в один encode()
+- SemanticIndex: все ключи каталога в одной float32-матрице, поиск — одно умножение матрицы на вектор
+"""
+import hashlib
+import os
+import sys
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .config import cfg
+from .utils import MicroBatcher
+
+
+def _prefix(texts: List[str]) -> List[str]:
+    # модели e5 обучены с префиксами; для симметричного сравнения — "query: " с обеих сторон
+    if "e5" in cfg.EMBEDDING_MODEL.lower():
+        return ["query: " + t for t in texts]
+    return texts
+
+
+class BatchingEncoder:
+    """
+    Один SentenceTransformer на процесс + микро-батчинг: encode_one() из разных потоков
+    в пределах window_ms считаются одним вызовом модели. Тексты кодируются как есть —
+    префиксы (e5) добавляет вызывающий.
+    """
+    def __init__(self, model_name: str, window_ms: float = 5.0, max_batch: int = 32):
+        self.model_name = model_name
+        self._model = None
+        self._model_lock = threading.Lock()
+        self._batcher = MicroBatcher(self.encode, window_ms=window_ms, max_batch=max_batch,
+                                     name="embed-batch")
+
+    def _get_model(self):
+        with self._model_lock:
+            if self._model is None:
+                from sentence_transformers import SentenceTransformer
+                self._model = SentenceTransformer(self.model_name)
+        return self._model
+
+    def warm(self) -> "BatchingEncoder":
+        """Загрузить модель заранее (фоновый прогрев), чтобы первый запрос её не ждал."""
+        self._get_model()
+        return self
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Прямой (без очереди) расчёт нормированных эмбеддингов, shape (len(texts), dim)."""
+        vecs = self._get_model().encode(texts, normalize_embeddings=True, convert_to_numpy=True)
+        return np.ascontiguousarray(vecs, dtype=np.float32)
+
+    def encode_one(self, text: str) -> np.ndarray:
+        return self._batcher.submit(text)
+
+    def stats(self) -> Dict:
+        return self._batcher.stats()
+
+
+_encoder: Optional[BatchingEncoder] = None
+_encoder_lock = threading.Lock()
+
+
+def get_encoder() -> BatchingEncoder:
+    global _encoder
+    with _encoder_lock:
+        if _encoder is None:
+            _encoder = BatchingEncoder(cfg.EMBEDDING_MODEL,
+                                       window_ms=cfg.EMBED_BATCH_WINDOW_MS,
+                                       max_batch=cfg.EMBED_BATCH_MAX)
+        return _encoder
+
+
+class SemanticIndex:
+    """
+    Эмбеддинги всех ключей каталога: матрица (n_keys, dim) float32 + номер элемента для каждой строки.
+    Матрица кэшируется на диске по хэшу index.json и имени модели — повторный старт не пересчитывает.
+    """
+    def __init__(self, items: List[Dict], source_hash: str, encoder: BatchingEncoder):
+        self.encoder = encoder
+        texts: List[str] = []
+        key_item: List[int] = []
+        for i, it in enumerate(items):
+            for k in it["keys_norm"]:
+                if k:
+                    texts.append(k)
+                    key_item.append(i)
+        self.key_item = np.asarray(key_item, dtype=np.int32)
+        self.matrix = self._load_or_build(texts, source_hash)
+
+    def _load_or_build(self, texts: List[str], source_hash: str) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        tag = hashlib.sha1(f"{source_hash}:{self.encoder.model_name}".encode("utf-8")).hexdigest()[:16]
+        path = Path(cfg.CACHE_DIR) / f"semantic-{tag}.npy"
+        if path.is_file():
+            try:
+                m = np.load(path)
+                if m.shape[0] == len(texts):
+                    return np.ascontiguousarray(m, dtype=np.float32)
+            except Exception as e:
+                print("[semantic] cache read failed:", e, file=sys.stderr)
+        m = self.encoder.encode(_prefix(texts))
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(".tmp.npy")
+            np.save(tmp, m)
+            os.replace(tmp, path)
+        except OSError as e:
+            print("[semantic] cache write failed:", e, file=sys.stderr)
+        return m
+
+    def best(self, n: str) -> Tuple[Optional[int], float]:
+        """(номер элемента, косинусная близость) ближайшего ключа; (None, 0.0) для пустого каталога."""
+        if not len(self.key_item):
+            return None, 0.0
+        # векторы нормированы — скалярное произведение и есть косинус
+        sims = self.matrix @ self.encoder.encode_one(_prefix([n])[0])
+        j = int(np.argmax(sims))
+        return int(self.key_item[j]), float(sims[j])
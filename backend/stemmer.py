@@ -0,0 +1,44 @@
+# backend/stemmer.py
+"""
+Основа слова для нечёткого поиска: срезание казахских/каракалпакских аффиксов.
+Общая для AudioRouter (нечёткий уровень) и BM25 — запрос и ключи/чанки сводятся одинаково.
+"""
+from functools import lru_cache
+
+# Аффиксы казахского/каракалпакского (кириллица + латиница): множественное число,
+# притяжательные, падежные, частицы. Срезаем самые длинные, пока основа не короче MIN_STEM.
+_SUFFIXES = sorted({
+    # мн. число
+    "лар", "лер", "дар", "дер", "тар", "тер",
+    # падежи
+    "ның", "нің", "дың", "дің", "тың", "тің",
+    "ға", "ге", "қа", "ке", "на", "не",
+    "ны", "ні", "ды", "ді", "ты", "ті",
+    "да", "де", "та", "те", "нда", "нде",
+    "дан", "ден", "тан", "тен", "нан", "нен",
+    "мен", "бен", "пен",
+    "дағы", "дегі", "тағы", "тегі", "ндағы", "ндегі",
+    # притяжательные
+    "ым", "ім", "ың", "ің", "ыңыз", "іңіз", "мыз", "міз", "сы", "сі", "ы", "і",
+    "сын", "сін", "ын", "ін",
+    # вопрос
+    "ма", "ме", "ба", "бе", "па", "пе",
+    # каракалпакская латиница
+    "lar", "ler", "dıń", "diń", "nıń", "niń", "tıń", "tiń",
+    "ǵa", "ge", "qa", "ke", "da", "de", "ta", "te", "dan", "den", "nan", "nen",
+    "ı", "i", "sı", "si",
+}, key=len, reverse=True)
+_MIN_STEM = 3
+
+
+# словари ключей и корпуса невелики, а перебор аффиксов на каждое слово — основная цена сборки
+@lru_cache(maxsize=1 << 16)
+def stem(word: str) -> str:
+    for _ in range(3):
+        for suf in _SUFFIXES:
+            if word.endswith(suf) and len(word) - len(suf) >= _MIN_STEM:
+                word = word[:-len(suf)]
+                break
+        else:
+            break
+    return word
@@ -0,0 +1,141 @@
+# backend/stt_pool.py
+import asyncio
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .metrics import observe_stage
+
+
+class STTBusy(RuntimeError):
+    """Очередь распознавания заполнена — запрос нужно отклонить (503)."""
+
+
+class STTExecutor:
+    """
+    Пул потоков для блокирующей работы STT (ffmpeg + Vosk), чтобы не держать event loop.
+    - все потоки делят одну загруженную Model (Vosk отпускает GIL внутри C-вызовов)
+    - очередь ограничена: workers + queue_max задач одновременно, остальное — STTBusy
+    - считаем глубину очереди и время ожидания/работы для /api/stt/stats
+    """
+    def __init__(self, workers: int = 2, queue_max: int = 8):
+        self.workers = max(1, workers)
+        self.queue_max = max(0, queue_max)
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="stt")
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._done = 0
+        self._rejected = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._run_total = 0.0
+
+    def _call(self, enqueued: float, fn: Callable, args: tuple) -> Any:
+        started = time.perf_counter()
+        wait = started - enqueued
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+            self._wait_total += wait
+            self._wait_max = max(self._wait_max, wait)
+        observe_stage("stt_wait", wait)
+        try:
+            return fn(*args)
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._done += 1
+                self._run_total += time.perf_counter() - started
+
+    async def run(self, fn: Callable, *args) -> Any:
+        with self._lock:
+            if self._queued + self._running >= self.workers + self.queue_max:
+                self._rejected += 1
+                raise STTBusy("STT queue is full")
+            self._queued += 1
+        try:
+            # контекст запроса (этапы для Server-Timing) переезжает в поток пула вместе с задачей
+            ctx = contextvars.copy_context()
+            fut = self._pool.submit(ctx.run, self._call, time.perf_counter(), fn, args)
+        except RuntimeError:
+            # пул уже остановлен (shutdown) — задача не попала в очередь
+            self._dequeue_cancelled(None)
+            raise
+        # клиент ушёл, а задача ещё ждала в очереди — она так и не стартует
+        fut.add_done_callback(lambda f: f.cancelled() and self._dequeue_cancelled(f))
+        return await asyncio.wrap_future(fut)
+
+    def _dequeue_cancelled(self, _fut):
+        with self._lock:
+            self._queued -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            done = self._done
+            return {
+                "workers": self.workers,
+                "queue_max": self.queue_max,
+                "queue_depth": self._queued,
+                "in_flight": self._running,
+                "done": done,
+                "rejected": self._rejected,
+                "wait_avg_ms": round(1000 * self._wait_total / done, 2) if done else 0.0,
+                "wait_max_ms": round(1000 * self._wait_max, 2),
+                "run_avg_ms": round(1000 * self._run_total / done, 2) if done else 0.0,
+            }
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+class RecognizerPool:
+    """
+    Готовые KaldiRecognizer по ключу (sample_rate, grammar): сборка распознавателя с
+    грамматикой компилирует граф, поэтому между фразами его только сбрасываем (Reset).
+    Распознаватель не потокобезопасен — acquire() отдаёт его в монопольное пользование.
+    Новая грамматика для той же частоты (каталог перезагрузили) вытесняет старые.
+    """
+    def __init__(self, factory: Callable[[int, Optional[str]], Any], max_idle: int = 4):
+        self.factory = factory
+        self.max_idle = max(1, max_idle)
+        self._idle: Dict[Tuple[int, Optional[str]], List[Any]] = {}
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+        self._build_total = 0.0
+
+    def acquire(self, key: Tuple[int, Optional[str]]) -> Any:
+        with self._lock:
+            if key not in self._idle:
+                for k in [k for k in self._idle if k[0] == key[0]]:
+                    del self._idle[k]
+                self._idle[key] = []
+            idle = self._idle[key]
+            if idle:
+                self.reused += 1
+                return idle.pop()
+        t0 = time.perf_counter()
+        rec = self.factory(*key)
+        with self._lock:
+            self.created += 1
+            self._build_total += time.perf_counter() - t0
+        return rec
+
+    def release(self, key: Tuple[int, Optional[str]], rec: Any):
+        rec.Reset()
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle is not None and len(idle) < self.max_idle:
+                idle.append(rec)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "created": self.created,
+                "reused": self.reused,
+                "idle": sum(len(v) for v in self._idle.values()),
+                "build_avg_ms": round(1000 * self._build_total / self.created, 2) if self.created else 0.0,
+            }
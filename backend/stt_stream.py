@@ -0,0 +1,97 @@
+# backend/stt_stream.py
+import json
+from typing import Callable, Dict, List, Optional
+
+from .audio_decode import AudioTooLong, FFmpegStreamDecoder
+
+# форматы, которые клиент может объявить в сообщении {"type": "start", "format": ...}
+PCM_FORMATS = ("pcm16", "s16le")
+CONTAINER_FORMATS = ("webm", "ogg")
+
+
+class StreamTooLarge(ValueError):
+    """За одну фразу клиент прислал больше max_bytes."""
+
+
+class StreamSession:
+    """
+    Одна фраза потокового распознавания: долгоживущий KaldiRecognizer,
+    в который порции аудио попадают по мере записи.
+    Методы синхронные и блокирующие — вызываются из потока STT_POOL.
+    События — словари для отправки клиенту:
+      {"type": "partial", "partial": "..."}
+      {"type": "result",  "text": "...", "raw": {...}}   — Vosk закрыл сегмент
+      {"type": "final",   "text": "..."}                 — конец фразы, весь текст
+    Лимиты те же, что у загрузки файлом: больше max_bytes присланных данных — StreamTooLarge,
+    дольше max_seconds распознанного аудио — AudioTooLong (0 — без лимита).
+    """
+    def __init__(self, recognizer, fmt: str, sample_rate: int, loudnorm: bool = False,
+                 release: Optional[Callable] = None, max_bytes: int = 0, max_seconds: float = 0):
+        if sample_rate <= 0:
+            raise ValueError(f"bad sample rate: {sample_rate}")
+        self.rec = recognizer
+        # release(rec) — вернуть распознаватель в пул после финала или обрыва
+        self._release = release
+        self.decoder: Optional[FFmpegStreamDecoder] = None
+        if fmt in CONTAINER_FORMATS:
+            self.decoder = FFmpegStreamDecoder(rate=sample_rate, loudnorm=loudnorm)
+        elif fmt not in PCM_FORMATS:
+            raise ValueError(f"unsupported stream format: {fmt}")
+        self._texts: List[str] = []
+        self._last_partial = ""
+        self.max_bytes, self.max_seconds = max_bytes, max_seconds
+        self._pcm_limit = int(max_seconds * sample_rate) * 2 if max_seconds > 0 else 0
+        self.bytes_in = 0
+        self.pcm_bytes = 0
+
+    def _accept(self, pcm: bytes) -> List[Dict]:
+        if not pcm:
+            return []
+        self.pcm_bytes += len(pcm)
+        if self._pcm_limit and self.pcm_bytes > self._pcm_limit:
+            raise AudioTooLong(f"audio longer than {self.max_seconds:g}s")
+        if self.rec.AcceptWaveform(pcm):
+            res = json.loads(self.rec.Result())
+            text = (res.get("text") or "").strip()
+            if text:
+                self._texts.append(text)
+            self._last_partial = ""
+            return [{"type": "result", "text": text, "raw": res}]
+        partial = (json.loads(self.rec.PartialResult()).get("partial") or "").strip()
+        # не шлём одинаковые partial на каждую порцию
+        if partial == self._last_partial:
+            return []
+        self._last_partial = partial
+        return [{"type": "partial", "partial": partial}]
+
+    def feed(self, data: bytes) -> List[Dict]:
+        self.bytes_in += len(data)
+        if self.max_bytes > 0 and self.bytes_in > self.max_bytes:
+            raise StreamTooLarge(f"stream larger than {self.max_bytes} bytes")
+        pcm = self.decoder.feed(data) if self.decoder else data
+        return self._accept(pcm)
+
+    def finish(self) -> List[Dict]:
+        events = []
+        if self.decoder:
+            events.extend(self._accept(self.decoder.close()))
+            self.decoder = None
+        final = json.loads(self.rec.FinalResult())
+        tail = (final.get("text") or "").strip()
+        if tail:
+            self._texts.append(tail)
+        events.append({"type": "final", "text": " ".join(self._texts)})
+        self._give_back()
+        return events
+
+    def close(self):
+        # обрыв соединения посреди фразы
+        if self.decoder:
+            self.decoder.kill()
+            self.decoder = None
+        self._give_back()
+
+    def _give_back(self):
+        if self._release is not None and self.rec is not None:
+            self._release(self.rec)
+        self._release = None
@@ -0,0 +1,166 @@
+# backend/transcribe_batch.py
+"""
+Пакетная расшифровка архива записей киоска (для подбора ключей index.json):
+
+    python -m backend.transcribe_batch recordings/ --out storage/transcripts.jsonl --route --jobs 8
+    python -m backend.transcribe_batch --manifest files.txt --out out.jsonl
+
+- файлы раздаются пулу процессов; каждый процесс один раз грузит модель (stt_vosk.get_model)
+  и переиспользует свой KaldiRecognizer (Reset между файлами)
+- результат пишется в JSONL по мере готовности; повторный запуск с тем же --out
+  пропускает уже расшифрованные файлы (продолжение после обрыва); с --retry-errors
+  упавшие файлы пробуются снова и дописываются ниже — действует последняя строка файла
+- скорость — в долях реального времени (RTF) на ядро и в сумме
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set
+
+AUDIO_EXTS = (".webm", ".ogg", ".opus", ".wav", ".mp3", ".m4a", ".mp4", ".flac")
+
+# состояние процесса-воркера (заполняет _init_worker)
+_rec = None
+_router = None
+
+
+def _init_worker(route: bool, index_path: str):
+    global _rec, _router
+    from vosk import KaldiRecognizer
+    from .stt_vosk import SAMPLE_RATE, get_model
+    _rec = KaldiRecognizer(get_model(), SAMPLE_RATE)
+    _rec.SetWords(True)
+    if route:
+        from .audio_router import AudioRouter
+        _router = AudioRouter(index_path)
+
+
+def _transcribe_file(path: str) -> Dict:
+    from .audio_decode import ffmpeg_pcm_chunks
+    from .stt_vosk import SAMPLE_RATE
+    t0 = time.perf_counter()
+    row: Dict = {"path": path}
+    try:
+        data = Path(path).read_bytes()
+        n_bytes = 0
+        _rec.Reset()
+        for chunk in ffmpeg_pcm_chunks(data, rate=SAMPLE_RATE):
+            n_bytes += len(chunk)
+            _rec.AcceptWaveform(chunk)
+        final = json.loads(_rec.FinalResult())
+    except Exception as e:
+        return {**row, "error": str(e), "proc_s": round(time.perf_counter() - t0, 3)}
+    text = (final.get("text") or "").strip()
+    row.update({
+        "text": text,
+        "words": final.get("result", []),
+        "duration_s": round(n_bytes / 2 / SAMPLE_RATE, 3),
+        "proc_s": round(time.perf_counter() - t0, 3),
+    })
+    if _router is not None:
+        _, tag, matched_by = _router.find(text)
+        row.update({"tag": tag, "matched_by": matched_by})
+    return row
+
+
+def _collect(paths: Iterable[str], manifest: Optional[Path]) -> List[str]:
+    files: List[str] = []
+    if manifest is not None:
+        for line in manifest.read_text(encoding="utf-8").splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            # строка — путь или JSON с полем "audio"
+            p = json.loads(line)["audio"] if line.startswith("{") else line
+            files.append(str((manifest.parent / p) if not os.path.isabs(p) else Path(p)))
+    for p in paths:
+        path = Path(p)
+        if path.is_dir():
+            files.extend(str(f) for f in sorted(path.rglob("*")) if f.suffix.lower() in AUDIO_EXTS)
+        elif path.is_file():
+            files.append(str(path))
+    return list(dict.fromkeys(files))
+
+
+def _done(out: Path, retry_errors: bool) -> Set[str]:
+    done: Set[str] = set()
+    if not out.is_file():
+        return done
+    with open(out, encoding="utf-8") as f:
+        for line in f:
+            try:
+                row = json.loads(line)
+            except ValueError:
+                continue  # оборванная последняя строка
+            if retry_errors and row.get("error"):
+                continue
+            done.add(row["path"])
+    return done
+
+
+def main():
+    from .config import cfg
+    ap = argparse.ArgumentParser(description="Пакетная расшифровка записей Vosk в JSONL (с продолжением).")
+    ap.add_argument("paths", nargs="*", help="папки (рекурсивно) и/или файлы")
+    ap.add_argument("--manifest", type=Path, help="список файлов: путь или JSON {\"audio\": ...} в строке")
+    ap.add_argument("--out", type=Path, required=True, help="JSONL с результатами (дописывается)")
+    ap.add_argument("--jobs", type=int, default=os.cpu_count() or 2, help="процессов распознавания")
+    ap.add_argument("--route", action="store_true", help="добавить тег AudioRouter для текста")
+    ap.add_argument("--index", default=cfg.AUDIO_INDEX_PATH)
+    ap.add_argument("--retry-errors", action="store_true", help="повторить файлы, упавшие в прошлый раз")
+    args = ap.parse_args()
+
+    files = _collect(args.paths, args.manifest)
+    done = _done(args.out, args.retry_errors)
+    todo = [f for f in files if f not in done]
+    print(f"{len(files)} files, {len(files) - len(todo)} already done, {len(todo)} to go")
+    if not todo:
+        return
+
+    jobs = max(1, args.jobs)
+    args.out.parent.mkdir(parents=True, exist_ok=True)
+    t0 = time.perf_counter()
+    n = errors = 0
+    audio_s = proc_s = 0.0
+    with open(args.out, "a", encoding="utf-8") as out, \
+            ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                                initargs=(args.route, args.index)) as pool:
+        queue = iter(todo)
+        pending = set()
+        while True:
+            # в полёте не больше 2*jobs файлов — архив не читается в память целиком
+            for path in queue:
+                pending.add(pool.submit(_transcribe_file, path))
+                if len(pending) >= 2 * jobs:
+                    break
+            if not pending:
+                break
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                row = fut.result()
+                out.write(json.dumps(row, ensure_ascii=False) + "\n")
+                n += 1
+                errors += 1 if row.get("error") else 0
+                audio_s += row.get("duration_s", 0.0)
+                proc_s += row.get("proc_s", 0.0)
+            out.flush()
+            if n % 100 < len(finished) or not pending:
+                wall = time.perf_counter() - t0
+                print(f"  {n}/{len(todo)} files, {audio_s / 60:.1f} min audio, "
+                      f"{audio_s / max(wall, 1e-9):.1f}x real time", file=sys.stderr)
+
+    wall = time.perf_counter() - t0
+    # RTF на ядро: секунд обработки на секунду аудио в одном процессе (меньше 1 — быстрее реального времени)
+    rtf_core = proc_s / audio_s if audio_s else 0.0
+    print(f"Transcribed {n} files ({errors} errors), {audio_s / 3600:.2f} h audio in {wall:.1f}s: "
+          f"{audio_s / max(wall, 1e-9):.1f}x real time on {jobs} processes, "
+          f"RTF per core {rtf_core:.3f} ({1 / rtf_core if rtf_core else 0:.1f}x real time per core)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+# backend/translit.py
+"""
+Сведение латиницы к кириллице для сопоставления запросов с ключами index.json.
+Ключи каталога — кириллица (казахская модель Vosk пишет ею же), а текстовые запросы
+приходят и на каракалпакской латинице (2016), и на казахской (2021), и вперемешку:
+"nөкіс туралы" -> "нөкіс туралы".
+Кириллица не трогается, поэтому чисто кириллический текст проходит без копирования.
+"""
+import re
+from functools import lru_cache
+
+# двухбуквенные сочетания — раньше одиночных букв
+_DIGRAPHS = {"sh": "ш", "ch": "ч", "ya": "я", "yu": "ю"}
+
+_LETTERS = {
+    "a": "а", "á": "ә", "ä": "ә", "b": "б", "c": "ц", "d": "д", "e": "е", "f": "ф",
+    "g": "г", "ǵ": "ғ", "ğ": "ғ", "h": "х", "i": "і", "ı": "ы", "í": "ы", "j": "ж",
+    "k": "к", "l": "л", "m": "м", "n": "н", "ń": "ң", "ñ": "ң", "o": "о", "ó": "ө",
+    "ö": "ө", "p": "п", "q": "қ", "r": "р", "s": "с", "ş": "ш", "ç": "ч", "t": "т",
+    "u": "у", "ū": "ұ", "ú": "ү", "ü": "ү", "v": "в", "w": "у", "x": "х", "y": "й",
+    "z": "з", "ý": "й",
+}
+
+_TABLE = str.maketrans(_LETTERS)
+_DIGRAPH_RE = re.compile("|".join(_DIGRAPHS))
+_HAS_LATIN = re.compile("[" + "".join(_LETTERS) + "]")
+
+
+@lru_cache(maxsize=4096)
+def to_cyrillic(text: str) -> str:
+    """Латинские буквы нижнего регистра -> кириллица; прочие символы как есть."""
+    if not _HAS_LATIN.search(text):
+        return text
+    return _DIGRAPH_RE.sub(lambda m: _DIGRAPHS[m.group()], text).translate(_TABLE)
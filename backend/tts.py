@@ -1,22 +1,198 @@
 import os
+import sys
+import json
+import hashlib
+import argparse
+import threading
 import subprocess
 from pathlib import Path
+from typing import Iterator, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+
 from .config import cfg
 from .utils import unique_filename
 
-def synthesize_tts(text: str, out_dir: str = None) -> str:
-    out_dir = out_dir or cfg.OUTPUT_DIR
-    Path(out_dir).mkdir(parents=True, exist_ok=True)
+STREAM_CHUNK = 16 * 1024
+
+
+def _cache_name(text: str, voice: str, wpm: int) -> str:
+    # один и тот же текст тем же голосом и темпом — один файл
+    key = json.dumps([text, voice, int(wpm)], ensure_ascii=False)
+    return hashlib.sha1(key.encode("utf-8")).hexdigest() + ".mp3"
+
+
+def _feed(stdin, data: bytes):
+    try:
+        stdin.write(data)
+    except BrokenPipeError:
+        pass  # espeak уже упал — код возврата проверит вызывающий
+    finally:
+        try:
+            stdin.close()
+        except BrokenPipeError:
+            pass
+
+
+def _pipeline(text: str):
+    # текст — через stdin, а не аргументом: иначе "-w/путь" или "-f/etc/passwd" espeak разберёт как опцию
     wav_cmd = [
         "espeak-ng",
         "-v", cfg.KAA_TTS_VOICE,
         "-s", str(cfg.TTS_WPM),
         "--stdout",
-        text
+        "--stdin",
     ]
-    mp3_path = os.path.join(out_dir, unique_filename("mp3"))
-    # espeak stdout -> ffmpeg to mp3
-    ffmpeg_cmd = ["ffmpeg", "-y", "-i", "pipe:0", "-f", "mp3", mp3_path]
-    p1 = subprocess.Popen(wav_cmd, stdout=subprocess.PIPE)
-    p2 = subprocess.run(ffmpeg_cmd, stdin=p1.stdout, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
-    return mp3_path
+    # espeak stdout -> ffmpeg -> mp3 в stdout
+    ffmpeg_cmd = ["ffmpeg", "-hide_banner", "-loglevel", "error", "-i", "pipe:0", "-f", "mp3", "pipe:1"]
+    p1 = subprocess.Popen(wav_cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    p2 = subprocess.Popen(ffmpeg_cmd, stdin=p1.stdout, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    p1.stdout.close()  # теперь stdout espeak держит только ffmpeg
+    # пишем отдельным потоком: длинный текст не упрётся в заполненные трубы, пока мы не читаем mp3
+    threading.Thread(target=_feed, args=(p1.stdin, text.encode("utf-8")), daemon=True).start()
+    return p1, p2
+
+
+def _evict(out_dir: str, keep: Optional[Path] = None):
+    """LRU по mtime (обращение к кэшу его обновляет): удаляем старые, пока не влезем в лимит."""
+    limit = cfg.TTS_CACHE_MAX_MB * 1024 * 1024
+    if limit <= 0:
+        return
+    files = []
+    for p in Path(out_dir).glob("*.mp3"):
+        try:
+            st = p.stat()
+        except OSError:
+            continue
+        files.append((st.st_mtime, st.st_size, p))
+    total = sum(size for _, size, _ in files)
+    for _, size, p in sorted(files, key=lambda f: f[0]):
+        if total <= limit:
+            break
+        if p == keep:
+            continue
+        try:
+            p.unlink()
+            total -= size
+        except OSError:
+            pass
+
+
+def _cached(text: str, out_dir: str) -> Path:
+    return Path(out_dir) / _cache_name(text, cfg.KAA_TTS_VOICE, cfg.TTS_WPM)
+
+
+def _touch(path: Path) -> bool:
+    try:
+        os.utime(path)
+        return True
+    except OSError:
+        return False
+
+
+def synthesize_tts(text: str, out_dir: str = None) -> str:
+    """Путь к mp3 с озвучкой text; повторный вызов с тем же текстом берёт файл из кэша."""
+    out_dir = out_dir or cfg.OUTPUT_DIR
+    Path(out_dir).mkdir(parents=True, exist_ok=True)
+    mp3_path = _cached(text, out_dir)
+    if _touch(mp3_path):
+        return str(mp3_path)
+
+    tmp_path = Path(out_dir) / (unique_filename("mp3") + ".part")
+    p1, p2 = _pipeline(text)
+    try:
+        with open(tmp_path, "wb") as f:
+            for chunk in iter(lambda: p2.stdout.read(STREAM_CHUNK), b""):
+                f.write(chunk)
+        p2.wait()
+        p1.wait()
+        if p2.returncode != 0 or p1.returncode != 0:
+            raise subprocess.CalledProcessError(p2.returncode or p1.returncode, "espeak-ng | ffmpeg")
+        os.replace(tmp_path, mp3_path)
+    finally:
+        # запись упала (диск, I/O) — не оставляем espeak/ffmpeg висеть или зомби
+        for p in (p2, p1):
+            if p.poll() is None:
+                p.kill()
+            p.wait()
+        tmp_path.unlink(missing_ok=True)
+    _evict(out_dir, keep=mp3_path)
+    return str(mp3_path)
+
+
+def stream_tts(text: str, out_dir: str = None) -> Iterator[bytes]:
+    """
+    MP3 кусками по мере кодирования ffmpeg — для StreamingResponse.
+    Попутно пишет файл в кэш, поэтому следующий такой же запрос отдаётся с диска.
+    """
+    out_dir = out_dir or cfg.OUTPUT_DIR
+    Path(out_dir).mkdir(parents=True, exist_ok=True)
+    mp3_path = _cached(text, out_dir)
+    if _touch(mp3_path):
+        with open(mp3_path, "rb") as f:
+            yield from iter(lambda: f.read(STREAM_CHUNK), b"")
+        return
+
+    tmp_path = Path(out_dir) / (unique_filename("mp3") + ".part")
+    p1, p2 = _pipeline(text)
+    complete = False
+    try:
+        with open(tmp_path, "wb") as f:
+            for chunk in iter(lambda: p2.stdout.read1(STREAM_CHUNK), b""):
+                f.write(chunk)
+                yield chunk
+        complete = p2.wait() == 0 and p1.wait() == 0
+        if complete:
+            os.replace(tmp_path, mp3_path)
+    finally:
+        if not complete:
+            # клиент ушёл или синтез упал — недописанный файл в кэш не кладём
+            for p in (p2, p1):
+                if p.poll() is None:
+                    p.kill()
+                p.wait()
+        tmp_path.unlink(missing_ok=True)
+    if complete:
+        _evict(out_dir, keep=mp3_path)
+
+
+def _known_texts(index_path: str) -> List[str]:
+    with open(index_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    items = data.get("items", []) if isinstance(data, dict) else data
+    return [it["screen_text"] for it in items if isinstance(it, dict) and (it.get("screen_text") or "").strip()]
+
+
+def prewarm(texts: List[str], jobs: int = 2, out_dir: str = None) -> int:
+    """Синтезирует все тексты заранее (параллельно), возвращает число готовых файлов."""
+    texts = list(dict.fromkeys(t.strip() for t in texts if t.strip()))
+    done = 0
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        for text, fut in [(t, pool.submit(synthesize_tts, t, out_dir)) for t in texts]:
+            try:
+                fut.result()
+                done += 1
+            except Exception as e:
+                print(f"[TTS] failed: {text[:40]!r}: {e}", file=sys.stderr)
+    return done
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Предварительный синтез TTS в кэш (screen_text из index.json).")
+    ap.add_argument("--index", default=cfg.AUDIO_INDEX_PATH)
+    ap.add_argument("--texts", nargs="*", default=[], help="доп. файлы: по одному тексту в строке")
+    ap.add_argument("--jobs", type=int, default=os.cpu_count() or 2)
+    args = ap.parse_args()
+
+    texts = _known_texts(args.index)
+    for path in args.texts:
+        texts.extend(Path(path).read_text(encoding="utf-8").splitlines())
+    if not any(t.strip() for t in texts):
+        # screen_text есть только в схеме-списке index.json; для схемы с "items" тексты — через --texts
+        print(f"[TTS] nothing to prewarm: no screen_text in {args.index} and no --texts", file=sys.stderr)
+        sys.exit(1)
+    n = prewarm(texts, jobs=args.jobs)
+    print(f"Prewarmed {n} TTS clips into {cfg.OUTPUT_DIR}")
+
+
+if __name__ == "__main__":
+    main()
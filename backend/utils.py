@@ -1,8 +1,14 @@
 import os
 import re
+import queue
 import subprocess
+import threading
+import time
 import uuid
+from concurrent.futures import Future
 from pathlib import Path
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, List, Optional
 
 KAA_LATIN_CHARS = "A-Za-zÁáǴǵÍíŃńÓóÚúÝý"
 KAA_CYR_CHARS = "А-Яа-яҚқҒғҢңӨөҮүЎўІі"
@@ -23,9 +29,125 @@ def ffmpeg_to_wav(src_path: str, dst_path: str, rate: int = 16000):
 def unique_filename(ext: str) -> str:
     return f"{uuid.uuid4().hex}.{ext}"
 
+def _expand(spec: str) -> str:
+    # "A-Za-z" -> все символы диапазонов, как в классе символов регулярки
+    out, i = [], 0
+    while i < len(spec):
+        if i + 2 < len(spec) and spec[i + 1] == "-":
+            out.extend(chr(c) for c in range(ord(spec[i]), ord(spec[i + 2]) + 1))
+            i += 3
+        else:
+            out.append(spec[i])
+            i += 1
+    return "".join(out)
+
+
+# таблица удаления для str.translate: строится один раз при импорте;
+# \s — как в re: всё, что str.isspace() (последний такой символ — U+3000)
+_KAA_ALLOWED = (_expand(KAA_LATIN_CHARS + KAA_CYR_CHARS) + ".,!?;:-()\"'0123456789"
+                + "".join(chr(c) for c in range(0x3001) if chr(c).isspace()))
+_KAA_DELETE = dict.fromkeys(map(ord, _KAA_ALLOWED))
+
+
 def is_mostly_karakalpak(text: str, threshold: float = 0.7) -> bool:
-    # Грубая эвристика: доля символов из KAA алфавитов
+    # Грубая эвристика: доля символов из KAA алфавитов (латиница и кириллица вперемешку — тоже KAA).
+    # Разрешённые символы вырезаются одним проходом translate в C — без списка совпадений.
     if not text:
         return True
-    allowed = re.findall(fr"[{KAA_LATIN_CHARS}{KAA_CYR_CHARS}\s\.,!?;:\-\(\)\"'0-9]", text)
-    return (len(allowed) / max(len(text), 1)) >= threshold
+    allowed = len(text) - len(text.translate(_KAA_DELETE))
+    return (allowed / len(text)) >= threshold
+
+
+class MicroBatcher:
+    """
+    Склеивает одиночные вызовы из разных потоков в пачки: submit(x) ждёт до window_ms
+    соседей (не больше max_batch) и считает всю пачку одним fn(list) -> list.
+    """
+    def __init__(self, fn: Callable[[List[Any]], List[Any]], window_ms: float = 5.0,
+                 max_batch: int = 32, name: str = "micro-batch"):
+        self.fn = fn
+        self.window = window_ms / 1000.0
+        self.max_batch = max(1, max_batch)
+        self.name = name
+        self._q: "queue.Queue" = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+
+    def _loop(self):
+        while True:
+            batch = [self._q.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._q.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            try:
+                results = self.fn([x for x, _ in batch])
+            except Exception as e:
+                for _, fut in batch:
+                    fut.set_exception(e)
+                continue
+            self.batches += 1
+            self.items += len(batch)
+            for (_, fut), r in zip(batch, results):
+                fut.set_result(r)
+
+    def submit(self, x: Any) -> Any:
+        if self._worker is None:
+            with self._lock:
+                if self._worker is None:
+                    self._worker = threading.Thread(target=self._loop, name=self.name, daemon=True)
+                    self._worker.start()
+        fut: Future = Future()
+        self._q.put((x, fut))
+        return fut.result()
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch": round(self.items / self.batches, 2) if self.batches else 0.0,
+        }
+
+
+class TTLCache:
+    """LRU с ограничением по числу записей и сроком жизни каждой записи."""
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize, self.ttl = maxsize, ttl
+        self._data: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] < time.monotonic():
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def put(self, key: Hashable, value: Any):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
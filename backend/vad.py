@@ -0,0 +1,104 @@
+# backend/vad.py
+"""
+Серверный VAD перед Vosk: по энергии и частоте переходов через ноль (NumPy, кадры 30 мс)
+находим первый и последний участок речи и отрезаем тишину по краям. Без речи —
+KaldiRecognizer вообще не вызывается.
+"""
+import threading
+from dataclasses import dataclass
+from typing import Dict, Iterator
+
+import numpy as np
+
+from .audio_decode import PCM_CHUNK_BYTES
+
+
+@dataclass
+class Speech:
+    pcm: bytes          # PCM16 mono с отрезанной тишиной по краям (b"", если речи нет)
+    total_ms: int
+    kept_ms: int
+
+    @property
+    def speech(self) -> bool:
+        return bool(self.pcm)
+
+    @property
+    def trimmed_ms(self) -> int:
+        return self.total_ms - self.kept_ms
+
+    def chunks(self, size: int = PCM_CHUNK_BYTES) -> Iterator[bytes]:
+        for i in range(0, len(self.pcm), size):
+            yield self.pcm[i:i + size]
+
+    def report(self) -> Dict:
+        return {"speech": self.speech, "total_ms": self.total_ms, "trimmed_ms": self.trimmed_ms}
+
+
+def _frame_features(x: np.ndarray, frame: int):
+    """Энергия (dBFS) и доля переходов через ноль для каждого полного кадра."""
+    n = len(x) // frame
+    f = x[:n * frame].reshape(n, frame).astype(np.float32) / 32768.0
+    energy_db = 10.0 * np.log10(np.mean(f * f, axis=1) + 1e-10)
+    zcr = np.mean(np.signbit(f[:, 1:]) != np.signbit(f[:, :-1]), axis=1)
+    return energy_db, zcr
+
+
+def trim_silence(pcm: bytes, rate: int = 16000, *, frame_ms: int = 30, min_db: float = -45.0,
+                 margin_db: float = 10.0, pad_ms: int = 200, min_speech_ms: int = 90) -> Speech:
+    """
+    Порог речи — шум (10-й перцентиль энергии кадров) + margin_db, но не ниже min_db
+    и не выше «пик − 20 дБ» (иначе в записи без пауз тихие края считались бы тишиной),
+    но всегда хоть на 3 дБ выше шума.
+    Тихие кадры с высоким ZCR (глухие с/ш/ф на краях слов) тоже считаются речью,
+    если они хотя бы на 3 дБ громче шума (у ровного шума ZCR тоже высокий).
+    Речь — не менее min_speech_ms подряд; вокруг неё оставляем pad_ms.
+    """
+    x = np.frombuffer(pcm[:len(pcm) - len(pcm) % 2], dtype=np.int16)
+    total_ms = len(x) * 1000 // rate
+    frame = max(1, rate * frame_ms // 1000)
+    if len(x) < frame:
+        return Speech(b"", total_ms, 0)
+
+    energy_db, zcr = _frame_features(x, frame)
+    floor_db = float(np.percentile(energy_db, 10))
+    thr = max(min_db, floor_db + 3.0, min(floor_db + margin_db, float(energy_db.max()) - 20.0))
+    # глухие согласные тише порога, но всё же заметно громче шума
+    soft = energy_db > max(thr - 10.0, floor_db + 3.0)
+    voiced = (energy_db > thr) | (soft & (zcr > 0.25))
+
+    run = max(1, -(-min_speech_ms // frame_ms))
+    # окно из run кадров целиком речь — отсекаем щелчки короче min_speech_ms
+    full = np.flatnonzero(np.convolve(voiced.astype(np.int32), np.ones(run, dtype=np.int32), "valid") == run)
+    if not len(full):
+        return Speech(b"", total_ms, 0)
+
+    pad = pad_ms // frame_ms
+    start = max(0, int(full[0]) - pad) * frame
+    end = min(len(x), (int(full[-1]) + run + pad) * frame)
+    return Speech(x[start:end].tobytes(), total_ms, (end - start) * 1000 // rate)
+
+
+class VadStats:
+    """Сводка по запросам: сколько без речи и сколько миллисекунд тишины не ушло в Vosk."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = self.no_speech = 0
+        self.total_ms = self.trimmed_ms = 0
+
+    def record(self, s: Speech):
+        with self._lock:
+            self.requests += 1
+            self.no_speech += 0 if s.speech else 1
+            self.total_ms += s.total_ms
+            self.trimmed_ms += s.trimmed_ms
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "no_speech": self.no_speech,
+                "audio_ms": self.total_ms,
+                "trimmed_ms": self.trimmed_ms,
+                "trimmed_share": round(self.trimmed_ms / self.total_ms, 3) if self.total_ms else 0.0,
+            }
@@ -0,0 +1,108 @@
+# bench/bench_grammar.py
+"""
+Грамматика Vosk: цена сборки KaldiRecognizer и точность с ней и без неё.
+
+- build: сколько стоит новый KaldiRecognizer (без грамматики / VOSK_PHRASES / слова index.json)
+  против взятия готового из RecognizerPool (Reset между фразами)
+- accuracy (--manifest): WER транскрипта и доля верных тегов AudioRouter по размеченным записям.
+  Формат манифеста — JSONL: {"audio": "path.webm", "text": "эталон", "tag": "nukus_area"}
+  ("tag" необязателен).
+
+    python -m bench.bench_grammar --builds 20 --manifest data/eval/utterances.jsonl
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from backend.config import cfg  # noqa: E402
+from backend.audio_router import AudioRouter  # noqa: E402
+from backend.audio_decode import ffmpeg_pcm_chunks  # noqa: E402
+from backend import main as app  # noqa: E402
+
+
+def _wer_counts(ref: str, hyp: str) -> tuple[int, int]:
+    r, h = ref.lower().split(), hyp.lower().split()
+    prev = list(range(len(h) + 1))
+    for i, rw in enumerate(r, 1):
+        cur = [i] + [0] * len(h)
+        for j, hw in enumerate(h, 1):
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (rw != hw))
+        prev = cur
+    return prev[-1], len(r)
+
+
+def _stt(mode: str, router: AudioRouter) -> "app.VoskSTT":
+    phrases = app.VOSK_PHRASES if mode != "none" else []
+    vocab = (lambda: (router.version, router.vocabulary() + list(app.VOICE_WAKE_WORDS))) if mode == "index" else None
+    return app.VoskSTT(app.VOSK_MODEL_PATH, sample_rate=app.VOSK_SAMPLE_RATE, phrases=phrases, vocabulary=vocab)
+
+
+def bench_build(stt: "app.VoskSTT", builds: int) -> dict:
+    key = stt.recognizer_key(stt.sample_rate)
+    t0 = time.perf_counter()
+    for _ in range(builds):
+        stt._make_recognizer(*key)
+    build = (time.perf_counter() - t0) / builds
+    stt.recognizers.release(key, stt.recognizers.acquire(key))
+    t0 = time.perf_counter()
+    for _ in range(builds):
+        stt.recognizers.release(key, stt.recognizers.acquire(key))
+    reuse = (time.perf_counter() - t0) / builds
+    grammar = key[1]
+    return {
+        "grammar_words": len(json.loads(grammar)) if grammar else 0,
+        "build_ms": round(build * 1000, 2),
+        "pooled_ms": round(reuse * 1000, 3),
+    }
+
+
+def bench_accuracy(stt: "app.VoskSTT", router: AudioRouter, manifest: Path) -> dict:
+    errs = words = n = tagged = tag_ok = 0
+    t_total = 0.0
+    for line in manifest.read_text(encoding="utf-8").splitlines():
+        if not line.strip():
+            continue
+        row = json.loads(line)
+        audio = Path(row["audio"])
+        if not audio.is_absolute():
+            audio = manifest.parent / audio
+        t0 = time.perf_counter()
+        hyp = stt.transcribe_pcm(ffmpeg_pcm_chunks(audio.read_bytes(), rate=stt.sample_rate))["text"]
+        t_total += time.perf_counter() - t0
+        e, w = _wer_counts(row.get("text", ""), hyp)
+        errs, words, n = errs + e, words + w, n + 1
+        if row.get("tag"):
+            query, _ = app._strip_wake_word(hyp, app.VOICE_WAKE_WORDS)
+            tagged += 1
+            tag_ok += router.find(query)[1] == row["tag"]
+    return {
+        "utterances": n,
+        "wer": round(errs / words, 4) if words else None,
+        "tag_accuracy": round(tag_ok / tagged, 4) if tagged else None,
+        "decode_ms_avg": round(1000 * t_total / n, 1) if n else None,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--builds", type=int, default=20, help="сколько раз собрать распознаватель")
+    ap.add_argument("--manifest", type=Path, help="JSONL с размеченными записями для точности")
+    ap.add_argument("--index", default=cfg.AUDIO_INDEX_PATH)
+    args = ap.parse_args()
+
+    router = AudioRouter(args.index)
+    modes = ["none"] + (["phrases"] if app.VOSK_PHRASES else []) + ["index"]
+    for mode in modes:
+        stt = _stt(mode, router)
+        row = {"grammar": mode, **bench_build(stt, args.builds)}
+        if args.manifest:
+            row.update(bench_accuracy(stt, router, args.manifest))
+        print(json.dumps(row, ensure_ascii=False), flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+# bench/bench_pipeline.py
+"""
+Нагрузочный прогон голосового конвейера: корпус записей и текстовых запросов
+-> /api/transcribe, /api/ask-voice, /api/ask-text при заданной параллельности.
+
+- цель: приложение в этом же процессе (по умолчанию) или запущенный сервер (--url)
+- задержки p50/p95/p99 и пропускная способность на эндпоинт + по этапам из заголовка
+  Server-Timing (decode, stt, route, ...)
+- точность маршрутизации: matched_tag против размеченного "tag"
+- результат — JSON (--out); --compare старый.json печатает разницу между коммитами
+
+Корпус — JSONL, строка либо {"audio": "path", "text": "эталон", "tag": "..."},
+либо {"query": "текст", "tag": "..."} ("tag"/"text" необязательны).
+Без --corpus: текстовые запросы — ключи index.json со своими тегами,
+записи — клипы static/audio (без разметки).
+
+    python -m bench.bench_pipeline --concurrency 1 4 8 --repeat 3 --out bench/results/$(git rev-parse --short HEAD).json
+    python -m bench.bench_pipeline --url http://127.0.0.1:8000 --compare bench/results/abc123.json
+
+С --url сервер стоит запускать с ADMISSION_RATE_PER_SEC=0, иначе бенчмарк упрётся в 429.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))
+
+
+def default_corpus(index_path: Path, audio_dir: Path) -> List[Dict]:
+    data = json.loads(index_path.read_text(encoding="utf-8"))
+    items = data.get("items", []) if isinstance(data, dict) else data
+    rows = []
+    for it in items:
+        tag = it.get("tag") or it.get("id")
+        for k in it.get("keys") or []:
+            rows.append({"query": k, "tag": tag})
+    rows += [{"audio": str(p)} for p in sorted(audio_dir.glob("*.mp3"))]
+    return rows
+
+
+def load_corpus(path: Path) -> List[Dict]:
+    rows = []
+    for line in path.read_text(encoding="utf-8").splitlines():
+        if not line.strip():
+            continue
+        row = json.loads(line)
+        if row.get("audio") and not Path(row["audio"]).is_absolute():
+            row["audio"] = str(path.parent / row["audio"])
+        rows.append(row)
+    return rows
+
+
+def parse_server_timing(header: Optional[str]) -> Dict[str, float]:
+    """'stt;dur=12.3, route;dur=0.4' -> {"stt": 12.3, "route": 0.4} (мс); повторы этапа складываются."""
+    out: Dict[str, float] = {}
+    for part in (header or "").split(","):
+        name, *params = [p.strip() for p in part.split(";")]
+        for p in params:
+            if p.startswith("dur="):
+                try:
+                    out[name] = out.get(name, 0.0) + float(p[4:])
+                except ValueError:
+                    pass
+    return out
+
+
+def percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    if not values:
+        return {"p50": None, "p95": None, "p99": None}
+    v = sorted(values)
+
+    def q(p: float) -> float:
+        return round(v[min(len(v) - 1, int(p * len(v)))], 2)
+    return {"p50": q(0.50), "p95": q(0.95), "p99": q(0.99)}
+
+
+class Job:
+    def __init__(self, endpoint: str, row: Dict, audio: Optional[bytes] = None):
+        self.endpoint, self.row, self.audio = endpoint, row, audio
+
+    async def send(self, client: httpx.AsyncClient) -> httpx.Response:
+        if self.endpoint == "/api/ask-text":
+            return await client.post(self.endpoint, json={"text": self.row["query"]})
+        return await client.post(self.endpoint, files={"file": (Path(self.row["audio"]).name, self.audio)})
+
+
+def make_jobs(rows: List[Dict], endpoints: List[str]) -> Dict[str, List[Job]]:
+    audio_cache: Dict[str, bytes] = {}
+    jobs: Dict[str, List[Job]] = {e: [] for e in endpoints}
+    for row in rows:
+        if row.get("query") and "/api/ask-text" in jobs:
+            jobs["/api/ask-text"].append(Job("/api/ask-text", row))
+        if row.get("audio"):
+            data = audio_cache.setdefault(row["audio"], Path(row["audio"]).read_bytes())
+            for e in ("/api/transcribe", "/api/ask-voice"):
+                if e in jobs and (e != "/api/ask-voice" or row.get("tag")):
+                    jobs[e].append(Job(e, row, data))
+    return {e: j for e, j in jobs.items() if j}
+
+
+async def run_endpoint(client: httpx.AsyncClient, jobs: List[Job], concurrency: int, repeat: int) -> Dict:
+    queue: asyncio.Queue = asyncio.Queue()
+    for _ in range(repeat):
+        for j in jobs:
+            queue.put_nowait(j)
+    e2e: List[float] = []
+    stages: Dict[str, List[float]] = {}
+    codes: Dict[str, int] = {}
+    labelled = correct = 0
+
+    async def worker():
+        nonlocal labelled, correct
+        while not queue.empty():
+            job = queue.get_nowait()
+            t0 = time.perf_counter()
+            try:
+                r = await job.send(client)
+                code = str(r.status_code)
+            except httpx.HTTPError:
+                r, code = None, "error"
+            codes[code] = codes.get(code, 0) + 1
+            if r is None or r.status_code != 200:
+                continue
+            e2e.append(1000 * (time.perf_counter() - t0))
+            for name, ms in parse_server_timing(r.headers.get("server-timing")).items():
+                stages.setdefault(name, []).append(ms)
+            if job.row.get("tag"):
+                labelled += 1
+                correct += r.json().get("matched_tag") == job.row["tag"]
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - t0
+    return {
+        "requests": sum(codes.values()),
+        "codes": codes,
+        "throughput_rps": round(len(e2e) / elapsed, 2) if elapsed else None,
+        "e2e_ms": percentiles(e2e),
+        # "total" из Server-Timing — время сервера без сети и клиента
+        "stages_ms": {k: percentiles(v) for k, v in sorted(stages.items())},
+        "accuracy": round(correct / labelled, 4) if labelled else None,
+        "labelled": labelled,
+    }
+
+
+def _inprocess_client(timeout: float) -> tuple[httpx.AsyncClient, object]:
+    # все запросы идут от одного "клиента" — корзина на клиента мерила бы себя, а не конвейер
+    os.environ.setdefault("ADMISSION_RATE_PER_SEC", "0")
+    from backend import main as app_module
+    app_module._startup()
+    transport = httpx.ASGITransport(app=app_module.app)
+    return httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=timeout), app_module
+
+
+def _wait_ready(app_module, timeout: float):
+    from backend.engines import ENGINES
+    t0 = time.perf_counter()
+    while time.perf_counter() - t0 < timeout and not ENGINES.is_ready(app_module.cfg.WARMUP_ENGINES):
+        if any(ENGINES.status()[n]["state"] == "error" for n in app_module.cfg.WARMUP_ENGINES
+               if n in ENGINES.status()):
+            break
+        time.sleep(0.1)
+
+
+async def run_all(args, jobs: Dict[str, List[Job]]) -> List[Dict]:
+    results = []
+    app_module = None
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=args.timeout,
+                                   limits=httpx.Limits(max_connections=max(args.concurrency)))
+    else:
+        client, app_module = _inprocess_client(args.timeout)
+        _wait_ready(app_module, args.ready_timeout)
+    try:
+        for endpoint, js in jobs.items():
+            for c in args.concurrency:
+                if args.warmup:
+                    await run_endpoint(client, js[:args.warmup], 1, 1)
+                res = await run_endpoint(client, js, c, args.repeat)
+                row = {"endpoint": endpoint, "concurrency": c, **res}
+                print(json.dumps(row, ensure_ascii=False), flush=True)
+                results.append(row)
+    finally:
+        await client.aclose()
+        if app_module is not None:
+            app_module._shutdown()
+    return results
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(old: Dict, new: Dict):
+    """Печатает изменение p50/p95 и точности для совпадающих (endpoint, concurrency)."""
+    prev = {(r["endpoint"], r["concurrency"]): r for r in old.get("results", [])}
+    print(f"\ncompare {old.get('commit')} -> {new.get('commit')}")
+    for r in new["results"]:
+        o = prev.get((r["endpoint"], r["concurrency"]))
+        if o is None:
+            continue
+        parts = []
+        for q in ("p50", "p95"):
+            a, b = o["e2e_ms"][q], r["e2e_ms"][q]
+            if a and b:
+                parts.append(f"{q} {a:.1f}->{b:.1f} ms ({100 * (b - a) / a:+.0f}%)")
+        if o.get("accuracy") is not None and r.get("accuracy") is not None:
+            parts.append(f"accuracy {o['accuracy']:.3f}->{r['accuracy']:.3f}")
+        print(f"  {r['endpoint']} c={r['concurrency']}: " + ", ".join(parts))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--url", help="адрес запущенного сервера; без него — приложение в этом процессе")
+    ap.add_argument("--corpus", type=Path, help="JSONL корпус (см. описание модуля)")
+    ap.add_argument("--index", type=Path, default=ROOT / "data/answers/index.json")
+    ap.add_argument("--audio-dir", type=Path, default=ROOT / "static/audio")
+    ap.add_argument("--endpoints", nargs="+", default=["/api/transcribe", "/api/ask-voice", "/api/ask-text"])
+    ap.add_argument("--concurrency", type=int, nargs="+", default=[1, 4])
+    ap.add_argument("--repeat", type=int, default=1, help="сколько раз прогнать корпус на каждом уровне")
+    ap.add_argument("--warmup", type=int, default=2, help="запросов на прогрев перед замером")
+    ap.add_argument("--timeout", type=float, default=60.0)
+    ap.add_argument("--ready-timeout", type=float, default=120.0)
+    ap.add_argument("--out", type=Path, help="сохранить результат в JSON")
+    ap.add_argument("--compare", type=Path, help="JSON прошлого прогона для сравнения")
+    args = ap.parse_args()
+
+    rows = load_corpus(args.corpus) if args.corpus else default_corpus(args.index, args.audio_dir)
+    jobs = make_jobs(rows, args.endpoints)
+    results = asyncio.run(run_all(args, jobs))
+    report = {
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "target": args.url or "in-process",
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "corpus": str(args.corpus) if args.corpus else "default",
+        "concurrency": args.concurrency,
+        "repeat": args.repeat,
+        "results": results,
+    }
+    if args.out:
+        args.out.parent.mkdir(parents=True, exist_ok=True)
+        args.out.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"saved {args.out}")
+    if args.compare:
+        compare(json.loads(args.compare.read_text(encoding="utf-8")), report)
+
+
+if __name__ == "__main__":
+    main()
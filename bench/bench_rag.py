@@ -0,0 +1,105 @@
+# bench/bench_rag.py
+"""
+Поиск RAG по режимам: dense (только Chroma), lexical (только BM25), hybrid (RRF)
+и hybrid без быстрого лексического пути. Для каждого — recall@k и задержка p50/p95 на запрос.
+
+Корпус — JSONL: {"query": "...", "source": "путь к документу"} или {"query": "...", "doc": "текст чанка"}.
+Без --corpus запросы берутся из самих чанков индекса: 3–6 подряд идущих слов случайного чанка,
+верный ответ — этот чанк (грубо, но показывает разницу режимов на именах и числах).
+
+    python -m backend.ingest && python -m bench.bench_rag --queries 300 --k 1 5
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from backend.rag import get_rag  # noqa: E402
+
+MODES = ("dense", "lexical", "hybrid", "hybrid-nofast")
+
+
+def synthetic_corpus(rag, n: int, rnd: random.Random) -> List[Dict]:
+    rows = []
+    for _ in range(n * 3):
+        if len(rows) >= n:
+            break
+        i = rnd.randrange(len(rag.bm25))
+        doc = rag.bm25.document(i)
+        words = doc.split()
+        if len(words) < 6:
+            continue
+        size = rnd.randint(3, 6)
+        start = rnd.randrange(len(words) - size + 1)
+        rows.append({"query": " ".join(words[start:start + size]), "doc": doc})
+    return rows
+
+
+def _relevant(row: Dict, hit) -> bool:
+    doc, source = hit
+    return doc == row["doc"] if row.get("doc") else source == row.get("source")
+
+
+def run_mode(rag, rows: List[Dict], mode: str, ks: List[int]) -> Dict:
+    margin = rag.lexical_margin
+    if mode == "hybrid-nofast":
+        rag.lexical_margin, mode = 0.0, "hybrid"
+    before = rag.mode_counts()
+    top = max(ks)
+    found = {k: 0 for k in ks}
+    lat: List[float] = []
+    try:
+        for row in rows:
+            t0 = time.perf_counter()
+            hits = rag.search(row["query"], top_k=top, mode=mode)
+            lat.append(1000 * (time.perf_counter() - t0))
+            for k in ks:
+                found[k] += any(_relevant(row, h) for h in hits[:k])
+    finally:
+        rag.lexical_margin = margin
+    lat.sort()
+    n = len(rows) or 1
+    return {
+        **{f"recall@{k}": round(found[k] / n, 4) for k in ks},
+        "p50_ms": round(lat[len(lat) // 2], 2) if lat else None,
+        "p95_ms": round(lat[min(len(lat) - 1, int(0.95 * len(lat)))], 2) if lat else None,
+        # каким путём обслужены запросы (lexical — без эмбеддинга)
+        "served_by": {m: n - before.get(m, 0) for m, n in rag.mode_counts().items()},
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--corpus", type=Path, help="JSONL с query и source/doc (см. описание модуля)")
+    ap.add_argument("--queries", type=int, default=200, help="размер синтетического корпуса")
+    ap.add_argument("--k", type=int, nargs="+", default=[1, 5])
+    ap.add_argument("--modes", nargs="+", default=list(MODES), choices=MODES)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    rag = get_rag()
+    if rag.bm25 is None:
+        sys.exit("BM25 index not found: run python -m backend.ingest first")
+    if args.corpus:
+        rows = [json.loads(line) for line in args.corpus.read_text(encoding="utf-8").splitlines() if line.strip()]
+    else:
+        rows = synthetic_corpus(rag, args.queries, random.Random(args.seed))
+    if rows:
+        # прогрев модели и страниц индекса — не в замер
+        for mode in ("dense", "lexical"):
+            rag.search(rows[0]["query"], mode=mode)
+    print(f"{len(rows)} queries, {len(rag.bm25)} chunks, k={args.k}")
+    for mode in args.modes:
+        # кэш эмбеддингов запросов исказил бы следующие режимы — каждый начинает с пустым
+        rag.cache = type(rag.cache)(rag.cache.max_bytes)
+        res = run_mode(rag, rows, mode, args.k)
+        print(json.dumps({"mode": mode, **res}, ensure_ascii=False), flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+# bench/bench_router.py
+"""
+Задержка AudioRouter._rule_match на синтетических каталогах (10k / 100k ключей):
+индекс (_RuleIndex) против эталонного линейного перебора + проверка, что ответы совпадают.
+Отдельно — нечёткий уровень (_fuzzy_match): доля верных и неверных ответов на ключах
+с аффиксами и опечатками и доля ложных срабатываний на словах, чьих основ нет в каталоге.
+
+    python -m bench.bench_router --keys 10000 100000 --queries 300
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from backend.audio_router import AudioRouter  # noqa: E402
+from backend.stemmer import stem  # noqa: E402
+
+SYLLABLES = ["на", "қа", "ла", "сы", "ның", "да", "ме", "кен", "ау", "дан", "нө", "кіс",
+             "ха", "лық", "са", "ны", "жер", "ор", "та", "лы", "ғы", "бө", "лі", "ні"]
+
+
+def _word(rnd: random.Random) -> str:
+    return "".join(rnd.choice(SYLLABLES) for _ in range(rnd.randint(1, 4)))
+
+
+def make_index(n_keys: int, keys_per_item: int, rnd: random.Random) -> dict:
+    vocab = [_word(rnd) for _ in range(max(200, n_keys // 5))]
+    items = []
+    for i in range(0, n_keys, keys_per_item):
+        keys = [" ".join(rnd.choice(vocab) for _ in range(rnd.randint(1, 4))) for _ in range(keys_per_item)]
+        items.append({"tag": f"t{i}", "keys": keys, "audio": f"static/audio/t{i}.mp3"})
+    return {"default_audio": "static/audio/default_not_found.mp3", "items": items, "_vocab": vocab}
+
+
+def _noisy(word: str, rnd: random.Random) -> str:
+    # как у маленькой модели Vosk: лишний аффикс или одна потерянная буква
+    if rnd.random() < 0.5:
+        return word + rnd.choice(["тің", "ның", "ы", "лары", "да"])
+    i = rnd.randrange(len(word))
+    return word[:i] + word[i + 1:] if len(word) > 4 else word
+
+
+def _timeit(fn, queries) -> tuple[list, float]:
+    t0 = time.perf_counter()
+    res = [fn(q) for q in queries]
+    return res, (time.perf_counter() - t0) / len(queries)
+
+
+def run(n_keys: int, n_queries: int, scan_queries: int, seed: int) -> dict:
+    rnd = random.Random(seed)
+    data = make_index(n_keys, 8, rnd)
+    vocab = data.pop("_vocab")
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False, encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+        path = f.name
+    try:
+        t0 = time.perf_counter()
+        router = AudioRouter(path)
+        build_s = time.perf_counter() - t0
+    finally:
+        os.remove(path)
+
+    queries = [" ".join(rnd.choice(vocab) for _ in range(rnd.randint(2, 6))) for _ in range(n_queries)]
+    idx_res, idx_avg = _timeit(router._rule_match, queries)
+    scan_res, scan_avg = _timeit(router._rule_match_scan, queries[:scan_queries])
+    mismatches = sum(1 for a, b in zip(idx_res, scan_res) if a is not b)
+    # искажённые ключи каталога: попадание — элемент, у которого есть исходный ключ
+    sources = [rnd.choice(rnd.choice(router.items)["keys_norm"]) for _ in range(n_queries)]
+    noisy = [" ".join(_noisy(w, rnd) for w in k.split()) for k in sources]
+    fuzzy_res, fuzzy_avg = _timeit(router._fuzzy_match, noisy)
+    hits = sum(1 for k, r in zip(sources, fuzzy_res) if r and k in r["keys_norm"])
+    # те же слоги, но основы не из словаря ключей (совпасть могут только через опечатку) — не должно
+    known = {stem(w) for w in vocab}
+    stray = []
+    while len(stray) < n_queries:
+        words = [_word(rnd) for _ in range(rnd.randint(2, 6))]
+        if not known.intersection(stem(w) for w in words):
+            stray.append(" ".join(words))
+    stray_res, _ = _timeit(router._fuzzy_match, stray)
+    return {
+        "keys": n_keys,
+        "items": len(router.items),
+        "build_ms": round(build_s * 1000, 1),
+        "index_us_per_query": round(idx_avg * 1e6, 1),
+        "scan_us_per_query": round(scan_avg * 1e6, 1),
+        "checked": len(scan_res),
+        "mismatches": mismatches,
+        "fuzzy_us_per_query": round(fuzzy_avg * 1e6, 1),
+        "fuzzy_hit_rate": round(hits / len(noisy), 3),
+        "fuzzy_wrong_rate": round((sum(1 for r in fuzzy_res if r) - hits) / len(noisy), 3),
+        "fuzzy_false_rate": round(sum(1 for r in stray_res if r) / len(stray), 3),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--keys", type=int, nargs="+", default=[10_000, 100_000])
+    ap.add_argument("--queries", type=int, default=300)
+    ap.add_argument("--scan-queries", type=int, default=50, help="сколько запросов прогнать линейным перебором")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+    for n in args.keys:
+        print(json.dumps(run(n, args.queries, args.scan_queries, args.seed), ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
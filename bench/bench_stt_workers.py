@@ -0,0 +1,169 @@
+# bench/bench_stt_workers.py
+"""
+Пропускная способность /api/transcribe и память при 1/2/4/8 воркерах gunicorn
+(gunicorn.conf.py): с моделью Vosk, загруженной в master до fork (STT_PRELOAD=1),
+и без (--compare-no-preload — каждый воркер грузит свою копию).
+
+Память — сумма по master + воркерам: RSS (общие страницы считаются в каждом процессе)
+и PSS (общие страницы делятся между процессами — реальный расход). Только Linux (/proc).
+
+    python -m bench.bench_stt_workers --workers 1 2 4 8 --duration 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def _children(pid: int) -> list[int]:
+    out = []
+    for task in Path(f"/proc/{pid}/task").glob("*"):
+        try:
+            out += [int(c) for c in (task / "children").read_text().split()]
+        except OSError:
+            pass
+    return out
+
+
+def _mem_kb(pid: int) -> tuple[int, int]:
+    rss = pss = 0
+    try:
+        for line in Path(f"/proc/{pid}/smaps_rollup").read_text().splitlines():
+            if line.startswith("Rss:"):
+                rss = int(line.split()[1])
+            elif line.startswith("Pss:"):
+                pss = int(line.split()[1])
+    except OSError:
+        pass
+    return rss, pss
+
+
+def tree_memory_mb(pid: int) -> dict:
+    pids, stack = [], [pid]
+    while stack:
+        p = stack.pop()
+        pids.append(p)
+        stack += _children(p)
+    rss = pss = 0
+    for p in pids:
+        r, s = _mem_kb(p)
+        rss += r
+        pss += s
+    return {"processes": len(pids), "rss_mb": round(rss / 1024, 1), "pss_mb": round(pss / 1024, 1)}
+
+
+def start_server(workers: int, port: int, preload: bool) -> subprocess.Popen:
+    env = dict(os.environ, WEB_CONCURRENCY=str(workers), PORT=str(port),
+               STT_PRELOAD="1" if preload else "0", WARMUP_ENGINES="stt,router")
+    return subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "backend.main:app"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+
+
+def wait_ready(base: str, workers: int, timeout: float) -> float:
+    """Ждём, пока /api/ready ответит 200 несколько раз подряд (запросы попадают в разные воркеры)."""
+    t0 = time.perf_counter()
+    streak = 0
+    with httpx.Client(base_url=base, timeout=2.0) as c:
+        while time.perf_counter() - t0 < timeout:
+            try:
+                ok = c.get("/api/ready").status_code == 200
+            except httpx.HTTPError:
+                ok = False
+            streak = streak + 1 if ok else 0
+            if streak >= 3 * workers:
+                return time.perf_counter() - t0
+            time.sleep(0.05 if ok else 0.2)
+    raise TimeoutError(f"server not ready after {timeout}s")
+
+
+async def load(base: str, audio: bytes, filename: str, concurrency: int, duration: float) -> dict:
+    lat: list[float] = []
+    codes: dict[int, int] = {}
+    deadline = time.perf_counter() + duration
+
+    async def worker(client: httpx.AsyncClient):
+        while time.perf_counter() < deadline:
+            t = time.perf_counter()
+            try:
+                r = await client.post("/api/transcribe", files={"file": (filename, audio)})
+                code = r.status_code
+            except httpx.HTTPError:
+                code = 0
+            codes[code] = codes.get(code, 0) + 1
+            if code == 200:
+                lat.append(time.perf_counter() - t)
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base, timeout=60.0, limits=limits) as client:
+        t0 = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - t0
+    lat.sort()
+    return {
+        "ok_per_s": round(len(lat) / elapsed, 2),
+        "p50_ms": round(1000 * statistics.median(lat), 1) if lat else None,
+        "p95_ms": round(1000 * lat[int(0.95 * (len(lat) - 1))], 1) if lat else None,
+        "codes": {str(k): v for k, v in sorted(codes.items())},
+    }
+
+
+def run(workers: int, preload: bool, args, audio: bytes) -> dict:
+    port = args.port
+    base = f"http://127.0.0.1:{port}"
+    proc = start_server(workers, port, preload)
+    try:
+        startup_s = wait_ready(base, workers, args.ready_timeout)
+        idle = tree_memory_mb(proc.pid)
+        concurrency = args.concurrency or 2 * workers
+        stats = asyncio.run(load(base, audio, Path(args.audio).name, concurrency, args.duration))
+        loaded = tree_memory_mb(proc.pid)
+    finally:
+        os.killpg(proc.pid, signal.SIGTERM)
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            os.killpg(proc.pid, signal.SIGKILL)
+            proc.wait()
+    return {
+        "workers": workers,
+        "preload": preload,
+        "concurrency": concurrency,
+        "startup_s": round(startup_s, 2),
+        **stats,
+        "idle_rss_mb": idle["rss_mb"], "idle_pss_mb": idle["pss_mb"],
+        "load_rss_mb": loaded["rss_mb"], "load_pss_mb": loaded["pss_mb"],
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    ap.add_argument("--audio", default=str(ROOT / "static/audio/01_overview.mp3"))
+    ap.add_argument("--duration", type=float, default=20.0, help="секунд нагрузки на каждую конфигурацию")
+    ap.add_argument("--concurrency", type=int, default=0, help="одновременных клиентов (0 — 2×воркеры)")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--ready-timeout", type=float, default=180.0)
+    ap.add_argument("--compare-no-preload", action="store_true",
+                    help="дополнительно прогнать без загрузки модели в master")
+    args = ap.parse_args()
+    audio = Path(args.audio).read_bytes()
+    for n in args.workers:
+        for preload in ([True, False] if args.compare_no_preload else [True]):
+            print(json.dumps(run(n, preload, args, audio), ensure_ascii=False), flush=True)
+
+
+if __name__ == "__main__":
+    main()
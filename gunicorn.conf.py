@@ -0,0 +1,33 @@
+# gunicorn.conf.py — многопроцессный режим: gunicorn -c gunicorn.conf.py backend.main:app
+#
+# Модель Vosk грузится один раз в master-процессе до fork(): воркеры получают её
+# copy-on-write, страницы модели (только чтение) остаются общими, поэтому N воркеров
+# не умножают RSS на размер модели и не грузят её N раз.
+import gc
+import os
+import sys
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+worker_class = "uvicorn.workers.UvicornWorker"
+# STT_PRELOAD=0 — каждый воркер грузит модель сам (для сравнения в bench/bench_stt_workers.py)
+preload_app = os.getenv("STT_PRELOAD", "1") == "1"
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = 30
+keepalive = 5
+
+
+def when_ready(server):
+    # вызывается в master после загрузки приложения, до запуска воркеров
+    if not preload_app:
+        return
+    from backend.engines import ENGINES, EngineUnavailable
+    try:
+        stt = ENGINES.get("stt")
+        server.log.info("Vosk model preloaded in master: %s", getattr(stt, "model_path", "?"))
+    except EngineUnavailable as e:
+        # воркеры попробуют загрузить модель сами при первом запросе
+        print("[gunicorn] STT preload failed:", e, file=sys.stderr)
+    # объекты, созданные до fork, убираем из-под сборщика мусора — иначе его проходы
+    # пишут в их заголовки и копируют общие страницы в каждый воркер
+    gc.freeze()
@@ -1,3 +1,7 @@
 #!/usr/bin/env bash
 export PYTHONUNBUFFERED=1
+# WEB_CONCURRENCY>1 — несколько воркеров с общей моделью Vosk (gunicorn.conf.py), без --reload
+if [ "${WEB_CONCURRENCY:-1}" -gt 1 ]; then
+  exec gunicorn -c gunicorn.conf.py --bind 127.0.0.1:8000 backend.main:app
+fi
 uvicorn backend.main:app --host 127.0.0.1 --port 8000 --reload
@@ -3,6 +3,16 @@
   const AWAKE_TIMEOUT_MS = 10000;
   const VAD_HANG_MS = 500;
   const ENERGY_THR = 0.012;
+  const STREAM_TIMESLICE_MS = 250;   // как часто MediaRecorder отдаёт куски в сокет
+  const WS_FINAL_TIMEOUT_MS = 4000;  // не дождались final — шлём фразу целиком
+  const WS_RETRY_MS = 5000;
+  // AudioWorklet-захват: сразу PCM16 mono 16 кГц — сервер распознаёт его без ffmpeg.
+  // ?capture=recorder — прежний путь через MediaRecorder (webm/opus)
+  const PCM_RATE = 16000;
+  const PCM_PREROLL_MS = 300;        // звук до срабатывания VAD — начало первого слова
+  const PCM_MIN_MS = 200;            // фразы короче не отправляем
+  const PCM_CAPTURE = !!window.AudioWorkletNode &&
+    new URLSearchParams(location.search).get("capture") !== "recorder";
 
   const statusEl = document.getElementById("status");
   const sttEl    = document.getElementById("last-stt");
@@ -171,6 +181,9 @@
   let awakeUntil = 0;
   let isSpeaking = false;
   let prevLevel = 0;
+  let sttWs = null;        // открытый WebSocket потокового STT
+  let streamPhrase = null; // фраза, которая сейчас идёт через сокет
+  let streamFinal = null;  // resolve() ожидания {"type":"final"}
 
   const setStatus = t => statusEl && (statusEl.textContent = t);
   const setSTT = t => sttEl && (sttEl.textContent = t || "");
@@ -211,31 +224,120 @@
     return "chunk.bin";
   }
 
-  async function startLoop() {
-    await ensureAudioCtx();
-    srcNode = audioCtx.createMediaStreamSource(stream);
-    analyser = audioCtx.createAnalyser();
-    analyser.fftSize = 2048;
-    srcNode.connect(analyser);
+  // конец фразы: через сокет ждём final, иначе (нет сокета, сломался, таймаут) — целым файлом
+  async function finishPhrase(phrase, tooShort, fileArgs) {
+    const live = phrase.streaming && !phrase.failed && sttWs;
+    if (tooShort) { if (live) sttWs.send(JSON.stringify({ type:"end" })); return; }
+    if (live) {
+      const done = waitStreamFinal();
+      sttWs.send(JSON.stringify({ type:"end" }));
+      const j = await done;
+      if (j.type === "final") { await handleText((j.text || "").trim()); return; }
+    }
+    const fd = new FormData();
+    fd.append("file", ...fileArgs());
+    await handleUtterance(fd);
+  }
 
+  function recorderCapture() {
     const mime = pickMime();
-    let recordedBlob = null;
-
-    const startPhrase = () => {
+    const start = () => {
       if (mediaRecorder && mediaRecorder.state === "recording") return;
       try { mediaRecorder = new MediaRecorder(stream, mime ? { mimeType: mime } : undefined); }
       catch (e) { setStatus("Brauzer MediaRecorder-dı qollamaydı. Chrome paydalanıń."); throw e; }
-      recordedBlob = null;
-      mediaRecorder.ondataavailable = (e) => { if (e.data && e.data.size > 0) recordedBlob = e.data; };
-      mediaRecorder.onstop = async () => {
-        if (!recordedBlob || recordedBlob.size < 2000) return; // слишком коротко
-        const fd = new FormData();
-        fd.append("file", recordedBlob, filenameForMime(mediaRecorder.mimeType || mime));
-        await handleUtterance(fd);
+      const recMime = mediaRecorder.mimeType || mime;
+      const fmt = streamFormat(recMime);
+      // своя запись на каждую фразу: onstop прошлой фразы может сработать уже после старта следующей
+      const phrase = { chunks: [], streaming: !!(fmt && sttWs && sttWs.readyState === WebSocket.OPEN), failed: false };
+      if (phrase.streaming) { streamPhrase = phrase; sttWs.send(JSON.stringify({ type:"start", format: fmt })); }
+
+      mediaRecorder.ondataavailable = (e) => {
+        if (!e.data || e.data.size === 0) return;
+        phrase.chunks.push(e.data);
+        if (phrase.streaming && !phrase.failed && sttWs) sttWs.send(e.data);
+      };
+      mediaRecorder.onstop = () => {
+        const blob = new Blob(phrase.chunks, { type: recMime });
+        finishPhrase(phrase, blob.size < 2000, () => [blob, filenameForMime(recMime)]);
       };
-      mediaRecorder.start();
+      if (phrase.streaming) mediaRecorder.start(STREAM_TIMESLICE_MS);
+      else mediaRecorder.start();
+    };
+    const stop = () => { if (mediaRecorder && mediaRecorder.state === "recording") mediaRecorder.stop(); };
+    return { start, stop };
+  }
+
+  /* =================== AudioWorklet: PCM16 16 кГц без ffmpeg на сервере =================== */
+  async function openPcmNode() {
+    // контекст ниже 16 кГц пришлось бы повышать — такое отдаём MediaRecorder
+    if (!PCM_CAPTURE || audioCtx.sampleRate < PCM_RATE) return null;
+    try {
+      await audioCtx.audioWorklet.addModule("/static/pcm-worklet.js");
+      const node = new AudioWorkletNode(audioCtx, "pcm-capture", {
+        numberOfOutputs: 0, processorOptions: { targetRate: PCM_RATE }
+      });
+      srcNode.connect(node);
+      return node;
+    } catch (e) { console.warn("AudioWorklet capture unavailable:", e); return null; }
+  }
+
+  function wavBlob(chunks, samples) {
+    const buf = new ArrayBuffer(44 + samples * 2);
+    const v = new DataView(buf);
+    const str = (off, s) => { for (let i = 0; i < s.length; i++) v.setUint8(off + i, s.charCodeAt(i)); };
+    str(0, "RIFF"); v.setUint32(4, 36 + samples * 2, true); str(8, "WAVE");
+    str(12, "fmt "); v.setUint32(16, 16, true); v.setUint16(20, 1, true); v.setUint16(22, 1, true);
+    v.setUint32(24, PCM_RATE, true); v.setUint32(28, PCM_RATE * 2, true);
+    v.setUint16(32, 2, true); v.setUint16(34, 16, true);
+    str(36, "data"); v.setUint32(40, samples * 2, true);
+    let off = 44;
+    for (const c of chunks) { new Int16Array(buf, off, c.length).set(c); off += c.length * 2; }
+    return new Blob([buf], { type: "audio/wav" });
+  }
+
+  function pcmCapture(node) {
+    let phrase = null;
+    let preroll = [], prerollLen = 0;
+    const prerollMax = PCM_RATE * PCM_PREROLL_MS / 1000;
+    const push = (p, chunk) => {
+      p.chunks.push(chunk); p.samples += chunk.length;
+      if (p.streaming && !p.failed && sttWs) sttWs.send(chunk.buffer);
+    };
+    node.port.onmessage = (e) => {
+      if (phrase) { push(phrase, e.data); return; }
+      preroll.push(e.data); prerollLen += e.data.length;
+      while (prerollLen - preroll[0].length >= prerollMax) prerollLen -= preroll.shift().length;
     };
-    const stopPhrase = () => { if (mediaRecorder && mediaRecorder.state === "recording") mediaRecorder.stop(); };
+    const start = () => {
+      if (phrase) return;
+      phrase = { chunks: [], samples: 0, streaming: !!(sttWs && sttWs.readyState === WebSocket.OPEN), failed: false };
+      if (phrase.streaming) {
+        streamPhrase = phrase;
+        sttWs.send(JSON.stringify({ type:"start", format:"pcm16", sample_rate: PCM_RATE }));
+      }
+      for (const c of preroll) push(phrase, c);
+      preroll = []; prerollLen = 0;
+    };
+    const stop = () => {
+      const p = phrase;
+      if (!p) return;
+      phrase = null;
+      finishPhrase(p, p.samples < PCM_RATE * PCM_MIN_MS / 1000, () => [wavBlob(p.chunks, p.samples), "chunk.wav"]);
+    };
+    return { start, stop };
+  }
+
+  async function startLoop() {
+    await ensureAudioCtx();
+    srcNode = audioCtx.createMediaStreamSource(stream);
+    analyser = audioCtx.createAnalyser();
+    analyser.fftSize = 2048;
+    srcNode.connect(analyser);
+    openSttSocket();
+
+    const pcmNode = await openPcmNode();
+    const capture = pcmNode ? pcmCapture(pcmNode) : recorderCapture();
+    const startPhrase = capture.start, stopPhrase = capture.stop;
 
     const loop = () => {
       const eng = energyLevel();
@@ -263,13 +365,55 @@
     triggerRipple(); // стартовый сплэш
   }
 
+  /* =================== Потоковое STT (WebSocket) =================== */
+  // если сокет открыт — аудио уходит на сервер кусками прямо во время записи,
+  // иначе (старый сервер, прокси без WS) работаем через POST /api/transcribe
+  function streamFormat(m) {
+    if (!m) return "";
+    if (m.includes("webm")) return "webm";
+    if (m.includes("ogg"))  return "ogg";
+    return ""; // mp4 (Safari) через pipe не декодируется по кускам
+  }
+
+  function openSttSocket() {
+    if (!window.WebSocket) return;
+    const proto = location.protocol === "https:" ? "wss:" : "ws:";
+    let ws;
+    try { ws = new WebSocket(`${proto}//${location.host}/api/transcribe/ws`); } catch { return; }
+    ws.onopen = () => { sttWs = ws; };
+    ws.onmessage = (e) => {
+      let j; try { j = JSON.parse(e.data); } catch { return; }
+      if (j.type === "partial") setSTT(j.partial);
+      else if (j.type === "result") setSTT(j.text);
+      else if (j.type === "error" && streamPhrase) streamPhrase.failed = true;
+      if ((j.type === "final" || j.type === "error") && streamFinal) { streamFinal(j); streamFinal = null; }
+    };
+    ws.onclose = () => {
+      if (sttWs === ws) sttWs = null;
+      if (streamPhrase) streamPhrase.failed = true;
+      if (streamFinal) { streamFinal({ type:"error", detail:"closed" }); streamFinal = null; }
+      setTimeout(openSttSocket, WS_RETRY_MS);
+    };
+  }
+
+  function waitStreamFinal() {
+    return new Promise(resolve => {
+      const timer = setTimeout(() => { streamFinal = null; resolve({ type:"error", detail:"timeout" }); }, WS_FINAL_TIMEOUT_MS);
+      streamFinal = (j) => { clearTimeout(timer); resolve(j); };
+    });
+  }
+
   async function handleUtterance(fd){
-    let sttText = "";
+    // один запрос: сервер распознаёт и сразу подбирает ответ (/api/ask-voice)
+    let j;
     try {
-      const r = await fetch("/api/transcribe", { method:"POST", body: fd });
-      const j = await r.json();
-      sttText = (j.text || "").trim();
+      const r = await fetch("/api/ask-voice", { method:"POST", body: fd });
+      j = await r.json();
     } catch(e){ console.error(e); setStatus("Qáte: transcribe."); return; }
+    await handleText((j.text || "").trim(), j.audio_url ? j : null);
+  }
+
+  async function handleText(sttText, prefetched = null){
     if (!sttText) return;
     setSTT(sttText);
 
@@ -279,25 +423,30 @@
     if (!awake && hasWake) {
       awake = true; awakeUntil = Date.now() + AWAKE_TIMEOUT_MS;
       const q = sttText.replace(/^(көмекші|көмекши|көмек ші|көмек ши)\s*/i, "").trim();
-      if (q) { await askText(q); awake=false; } else { await askText("__wake_ack__"); awake=false; }
+      if (q) { await askText(q, prefetched); awake=false; } else { await askText("__wake_ack__", prefetched); awake=false; }
       return;
     }
     if (awake) {
       if (Date.now() > awakeUntil) { awake=false; setStatus('Tıńlaw: aytıń "Hurliman"...'); return; }
-      await askText(sttText); awake=false;
+      await askText(sttText, prefetched); awake=false;
     }
   }
 
-  async function askText(q){
+  async function askText(q, prefetched = null){
     setStatus("Qıdıraw atır...");
     try{
-      const r = await fetch("/api/ask-text", {
-        method:"POST", headers:{ "Content-Type":"application/json" }, body: JSON.stringify({ text:q })
-      });
-      const j = await r.json();
+      // ответ уже пришёл вместе с транскриптом и на тот же вопрос — второй запрос не нужен
+      const key = q === "__wake_ack__" ? "" : q;
+      let j = prefetched && prefetched.query === key ? prefetched : null;
+      if (!j) {
+        const r = await fetch("/api/ask-text", {
+          method:"POST", headers:{ "Content-Type":"application/json" }, body: JSON.stringify({ text:q })
+        });
+        j = await r.json();
+      }
 
       if (j.audio_url) {
-        audioEl.src = j.audio_url;
+        audioEl.src = clipUrl(j.audio_url);
         try { await audioEl.play(); } catch(e){}
       }
       setAnswer(`<div class="ans-text">${j.screen_text || ""}</div>`);
@@ -307,6 +456,32 @@
     }
   }
 
+  /* =================== Аудио-ответы: Opus и предзагрузка =================== */
+  // клипы с версией в адресе кэшируются навсегда — скачиваем их заранее, пока киоск простаивает,
+  // тогда ответ играет сразу после /api/ask-text, без ожидания сети
+  const OPUS_OK = !!audioEl.canPlayType?.('audio/ogg; codecs="opus"');
+  const opusClips = new Set();
+
+  function clipUrl(url) {
+    if (!OPUS_OK || !url.startsWith("/api/audio/")) return url;
+    const base = url.split("?")[0];
+    return opusClips.has(base) ? url + (url.includes("?") ? "&" : "?") + "fmt=opus" : url;
+  }
+
+  async function prefetchClips() {
+    if (navigator.connection?.saveData) return;
+    try {
+      const r = await fetch("/api/audio/manifest");
+      const { clips = [] } = await r.json();
+      for (const c of clips) if (c.opus) opusClips.add(c.url.split("?")[0]);
+      // по одному, чтобы не забивать медленный канал параллельными загрузками
+      for (const c of clips) {
+        await new Promise(res => (window.requestIdleCallback || setTimeout)(res));
+        try { await fetch(clipUrl(c.url), { cache: "force-cache", priority: "low" }); } catch {}
+      }
+    } catch (e) { console.warn("prefetch clips:", e); }
+  }
+
   /* =================== Инициализация =================== */
   window.addEventListener("load", async () => {
     resize();
@@ -316,6 +491,7 @@
     audioEl.addEventListener("play",  () => { isSpeaking = true;  setOrbState("speaking"); triggerRipple(); burstSparks(90, 2.0); });
     audioEl.addEventListener("ended", () => { isSpeaking = false; });
     audioEl.addEventListener("pause", () => { isSpeaking = false; });
+    prefetchClips();
 
     try {
       stream = await navigator.mediaDevices.getUserMedia({
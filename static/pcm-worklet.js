@@ -0,0 +1,38 @@
+// static/pcm-worklet.js
+// AudioWorklet: микрофон (float32, частота AudioContext) -> PCM16 mono targetRate порциями ~100 мс.
+// Понижение частоты — усреднение по окну входных отсчётов: простой антиалиасинг, для речи хватает.
+class PcmCapture extends AudioWorkletProcessor {
+  constructor(options) {
+    super();
+    const target = options.processorOptions?.targetRate || 16000;
+    this.step = sampleRate / target; // входных отсчётов на один выходной (>= 1)
+    this.pos = 0; this.acc = 0; this.n = 0;
+    this.out = new Int16Array(Math.round(target / 10));
+    this.len = 0;
+  }
+
+  process(inputs) {
+    const chans = inputs[0];
+    if (!chans || !chans.length) return true;
+    const frames = chans[0].length;
+    for (let i = 0; i < frames; i++) {
+      let v = 0;
+      for (let c = 0; c < chans.length; c++) v += chans[c][i];
+      this.acc += v / chans.length; this.n++;
+      if (++this.pos < this.step) continue;
+      this.pos -= this.step;
+      const s = Math.max(-1, Math.min(1, this.acc / this.n));
+      this.out[this.len++] = s < 0 ? s * 0x8000 : s * 0x7fff;
+      this.acc = 0; this.n = 0;
+      if (this.len === this.out.length) {
+        // буфер передаётся без копирования; себе — новый
+        this.port.postMessage(this.out, [this.out.buffer]);
+        this.out = new Int16Array(this.out.length);
+        this.len = 0;
+      }
+    }
+    return true;
+  }
+}
+
+registerProcessor("pcm-capture", PcmCapture);
@@ -0,0 +1,79 @@
+# tests/test_audio_router.py
+"""
+Уровни AudioRouter на маленьком каталоге во временной папке.
+
+    python -m unittest tests.test_audio_router
+"""
+import json
+import os
+import tempfile
+import unittest
+
+from backend.audio_router import AudioRouter
+from backend.stemmer import stem
+
+CATALOGUE = {
+    "default_audio": "static/audio/default.mp3",
+    "items": [
+        {"tag": "greet", "keys": ["сәлем", "сәлеметсіз бе"], "audio": "static/audio/greet.mp3"},
+        {"tag": "nukus_overview", "keys": ["нөкіс туралы қысқа", "нөкіс ауданы жөнінде"],
+         "audio": "static/audio/overview.mp3"},
+        {"tag": "nukus_population", "keys": ["нөкіс ауданының халқы", "нөкіс ауданындағы халық саны"],
+         "audio": "static/audio/population.mp3"},
+        {"tag": "nukus_economy", "keys": ["нөкіс ауданы экономикасы"], "audio": "static/audio/economy.mp3"},
+    ],
+}
+
+
+class AudioRouterFuzzyTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        path = os.path.join(cls.tmp.name, "index.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(CATALOGUE, f, ensure_ascii=False)
+        cls.router = AudioRouter(path)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def route(self, q):
+        _, tag, by = self.router.find(q)
+        return tag, by
+
+    def test_stem(self):
+        self.assertEqual(stem("нөкістің"), "нөкіс")
+        self.assertEqual(stem("сәлемдер"), "сәлем")
+
+    def test_single_inflected_word(self):
+        # пример из задачи: одно слово в падеже — основа есть во всех ключах про Нөкіс,
+        # при равенстве выигрывает более ранний элемент (как у правил для "нөкіс")
+        self.assertEqual(self.route("нөкістің"), ("nukus_overview", "fuzzy"))
+        self.assertEqual(self.route("нөкіс"), ("nukus_overview", "rules"))
+
+    def test_single_word_with_typo(self):
+        self.assertEqual(self.route("нөкистің"), ("nukus_overview", "fuzzy"))
+
+    def test_distinctive_single_word(self):
+        self.assertEqual(self.route("экономикасын"), ("nukus_economy", "fuzzy"))
+
+    def test_multi_word_inflected(self):
+        self.assertEqual(self.route("нөкістің халқын"), ("nukus_population", "fuzzy"))
+
+    def test_unrelated_words_stay_default(self):
+        self.assertEqual(self.route("бүгін ауа райы қандай"), ("default", "default"))
+        # одно слово запроса из ключа, другое — мимо: ни ключ, ни запрос не покрыты
+        self.assertEqual(self.route("нөкістің футбол командасы"), ("default", "default"))
+
+    def test_no_fuzzy_overmatch(self):
+        # опечатка в одном слове, остальное мимо: одних исправлений мало
+        self.assertEqual(self.route("сәламдер нөкістің"), ("default", "default"))
+        # два элемента объясняют запрос разными словами и почти поровну — не угадываем
+        self.assertEqual(self.route("нөкістің экономикасын халқын"), ("default", "default"))
+        # частицы в нечётком поиске не участвуют
+        self.assertIsNone(self.router._fuzzy_match("бе ма"))
+
+
+if __name__ == "__main__":
+    unittest.main()
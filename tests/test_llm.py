@@ -0,0 +1,219 @@
+# tests/test_llm.py
+"""
+LLM-классификатор против локального фейкового Ollama (http.server в потоке):
+ранний обрыв NDJSON-стрима, кэш, circuit breaker и клиент на каждый event loop.
+
+    python -m unittest tests.test_llm
+"""
+import asyncio
+import dataclasses
+import json
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+from backend import llm
+from backend.config import cfg
+from backend.utils import TTLCache
+
+TAGS = ["weather", "weather_tomorrow", "time"]
+
+
+class FakeOllama:
+    """
+    POST /api/generate: отдаёт chunks построчно (NDJSON, chunked) с паузой delay между строками.
+    status != 200 — сразу ошибка. Запоминает число запросов и сколько дошло до конца стрима.
+    """
+    def __init__(self):
+        self.chunks = []
+        self.delay = 0.0
+        self.status = 200
+        self.requests = 0
+        self.completed = 0
+        self.payloads = []
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                fake.requests += 1
+                fake.payloads.append(json.loads(body))
+                if fake.status != 200:
+                    self.send_response(fake.status)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                try:
+                    for chunk in fake.chunks:
+                        line = (json.dumps(chunk) + "\n").encode()
+                        self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+                        self.wfile.flush()
+                        time.sleep(fake.delay)
+                    self.wfile.write(b"0\r\n\r\n")
+                    fake.completed += 1
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # клиент закрыл соединение раньше конца
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def answer(self, *parts, tail=0, delay=0.0):
+        """Ответ модели кусками parts, затем tail лишних токенов и done."""
+        self.status = 200
+        self.delay = delay
+        self.chunks = ([{"response": p, "done": False} for p in parts]
+                       + [{"response": " lorem", "done": False}] * tail
+                       + [{"response": "", "done": True}])
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def _run(coro):
+    """asyncio.run + закрытие AsyncClient этого loop (как при остановке приложения)."""
+    async def main():
+        try:
+            return await coro
+        finally:
+            await llm._client.aclose()
+    return asyncio.run(main())
+
+
+class OllamaClassifierTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.fake = FakeOllama()
+        # Config заморожен — подменяем сам объект в модуле
+        cls._cfg = mock.patch.object(llm, "cfg", dataclasses.replace(
+            cfg, OLLAMA_BASE_URL=cls.fake.url, LLM_PROVIDER="ollama"))
+        cls._cfg.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._cfg.stop()
+        cls.fake.close()
+
+    def setUp(self):
+        self.fake.requests = self.fake.completed = 0
+        self.fake.payloads.clear()
+        self.fake.answer("time")
+        # чистое состояние модуля: пустой кэш, закрытый breaker
+        self._saved_state = (llm._cache, llm._client.breaker)
+        llm._cache = TTLCache(16, 60)
+        llm._client.breaker = llm._CircuitBreaker(threshold=2, cooldown=0.3)
+
+    def tearDown(self):
+        llm._cache, llm._client.breaker = self._saved_state
+
+    def test_stops_reading_stream_on_complete_tag(self):
+        # "weath" + "er" — ещё не тег однозначно (есть weather_tomorrow), дальше 20 лишних токенов по 50 мс
+        self.fake.answer("weath", "er", "\n", tail=20, delay=0.05)
+        t0 = time.monotonic()
+        tag = _run(llm.classify_to_tag_async("ауа райы", TAGS))
+        elapsed = time.monotonic() - t0
+        self.assertEqual(tag, "weather")
+        self.assertLess(elapsed, 0.6)
+        time.sleep(0.2)  # серверу нужна ещё запись, чтобы заметить закрытое соединение
+        self.assertEqual(self.fake.completed, 0)
+
+    def test_unambiguous_tag_stops_without_newline(self):
+        self.fake.answer("ti", "me", tail=20, delay=0.05)
+        t0 = time.monotonic()
+        self.assertEqual(_run(llm.classify_to_tag_async("саат неше", TAGS)), "time")
+        self.assertLess(time.monotonic() - t0, 0.6)
+
+    def test_ready_predicate(self):
+        done = llm._tag_ready(TAGS)
+        self.assertFalse(done("weath"))
+        self.assertFalse(done("weather"))  # может оказаться weather_tomorrow
+        self.assertTrue(done("weather\n"))
+        self.assertTrue(done("weather_tomorrow"))
+        self.assertTrue(done("NONE"))
+
+    def test_unknown_answer_is_none(self):
+        self.fake.answer("banana")
+        self.assertEqual(_run(llm.classify_to_tag_async("не знаю", TAGS)), "NONE")
+        self.assertEqual(self.fake.payloads[0]["options"]["temperature"], 0.0)
+
+    def test_cache_hit_skips_server(self):
+        self.assertEqual(_run(llm.classify_to_tag_async("Саат  неше", TAGS)), "time")
+        # тот же запрос после нормализации (регистр, пробелы) — из кэша
+        self.assertEqual(_run(llm.classify_to_tag_async("саат неше ", TAGS)), "time")
+        self.assertEqual(self.fake.requests, 1)
+        self.assertEqual(llm.llm_stats()["cache_hits"], 1)
+        # другой набор тегов — другой ключ
+        _run(llm.classify_to_tag_async("саат неше", TAGS[:1] + ["time"]))
+        self.assertEqual(self.fake.requests, 2)
+
+    def test_breaker_opens_after_failures_and_recovers(self):
+        self.fake.status = 500
+        for q in ("a", "b"):
+            self.assertEqual(_run(llm.classify_to_tag_async(q, TAGS)), "NONE")
+        self.assertEqual(self.fake.requests, 2)
+        self.assertTrue(llm.llm_stats()["breaker_open"])
+
+        # открыт: сервер не трогаем, сразу фолбэк
+        self.assertEqual(_run(llm.classify_to_tag_async("c", TAGS)), "NONE")
+        self.assertEqual(self.fake.requests, 2)
+
+        # после cooldown — один пробный запрос; сервер поднялся — breaker закрывается
+        time.sleep(0.35)
+        self.fake.answer("time")
+        self.assertEqual(_run(llm.classify_to_tag_async("d", TAGS)), "time")
+        self.assertEqual(self.fake.requests, 3)
+        self.assertFalse(llm.llm_stats()["breaker_open"])
+        self.assertEqual(llm.llm_stats()["breaker_fails"], 0)
+
+    def test_failed_probe_reopens_breaker(self):
+        self.fake.status = 500
+        for q in ("a", "b"):
+            _run(llm.classify_to_tag_async(q, TAGS))
+        time.sleep(0.35)
+        self.assertEqual(_run(llm.classify_to_tag_async("c", TAGS)), "NONE")
+        self.assertEqual(self.fake.requests, 3)
+        # проба упала — снова открыт на cooldown
+        self.assertEqual(_run(llm.classify_to_tag_async("d", TAGS)), "NONE")
+        self.assertEqual(self.fake.requests, 3)
+
+    def test_half_open_lets_one_probe_through(self):
+        br = llm._CircuitBreaker(threshold=1, cooldown=0.2)
+        br.failure()
+        self.assertFalse(br.allow())
+        time.sleep(0.25)
+        self.assertTrue(br.allow())
+        self.assertFalse(br.allow())  # пока проба не вернулась
+        br.success()
+        self.assertTrue(br.allow())
+
+    def test_client_per_event_loop(self):
+        # каждый asyncio.run — новый loop: клиент прошлого loop не переиспользуется
+        self.assertEqual(_run(llm.classify_to_tag_async("бір", TAGS)), "time")
+        self.assertEqual(_run(llm.classify_to_tag_async("екі", TAGS)), "time")
+        # синхронная обёртка — свой фоновый loop со своим клиентом
+        self.assertEqual(llm.classify_to_tag("үш", TAGS), "time")
+        self.assertEqual(self.fake.requests, 3)
+
+    def test_paraphrase_falls_back_to_source_text(self):
+        self.fake.status = 500
+        self.assertEqual(_run(llm.paraphrase_to_kaa_async("сәлем")), "сәлем")
+        self.fake.answer("Sálem")
+        time.sleep(0.35)
+        self.assertEqual(_run(llm.paraphrase_to_kaa_async("сәлем")), "Sálem")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+# tests/test_pcm.py
+"""
+Разбор несжатых загрузок без ffmpeg: битые заголовки, нечётная длина, обрезанный data-чанк.
+
+    python -m unittest tests.test_pcm
+"""
+import io
+import struct
+import unittest
+import wave
+from unittest import mock
+
+import numpy as np
+
+from backend.audio_decode import DecodeError
+from backend.pcm import decode_pcm_upload
+
+
+def _wav(frames: bytes, rate=16000, channels=1, width=2) -> bytes:
+    b = io.BytesIO()
+    with wave.open(b, "wb") as w:
+        w.setnchannels(channels)
+        w.setsampwidth(width)
+        w.setframerate(rate)
+        w.writeframes(frames)
+    return b.getvalue()
+
+
+def _truncated(wav: bytes, cut: int) -> bytes:
+    # заголовок обещает больше данных, чем есть (запись оборвалась)
+    return wav[:-cut]
+
+
+class DecodePcmUploadTest(unittest.TestCase):
+    def test_l16_odd_length_drops_partial_sample(self):
+        body = struct.pack(">3h", 100, -200, 300) + b"\x01"
+        pcm = decode_pcm_upload(body, "audio/L16;rate=16000")
+        self.assertEqual(pcm, struct.pack("<3h", 100, -200, 300))
+
+    def test_l16_stereo_partial_frame(self):
+        body = struct.pack(">4h", 1000, 3000, -1000, -3000) + b"\x00\x01\x02"
+        pcm = decode_pcm_upload(body, "audio/L16;rate=16000;channels=2")
+        self.assertEqual(len(pcm), 4)  # два моно-отсчёта
+        self.assertEqual(np.frombuffer(pcm, "<i2").tolist(), [1999, -1999])
+
+    def test_l16_resampled_odd_length(self):
+        body = b"\x00\x10" * 4801 + b"\x7f"
+        pcm = decode_pcm_upload(body, "audio/L16;rate=48000")
+        self.assertEqual(len(pcm) % 2, 0)
+        self.assertAlmostEqual(len(pcm) / 2, 1600, delta=1)
+
+    def test_l16_malformed_params(self):
+        for ct in ("audio/L16", "audio/L16;rate=0", "audio/L16;rate=16000;channels=0",
+                   "audio/L16;rate=abc", "audio/L16;rate=-8000"):
+            with self.subTest(ct=ct), self.assertRaises(DecodeError):
+                decode_pcm_upload(b"\x00\x00" * 10, ct)
+
+    def test_l16_empty_body(self):
+        self.assertEqual(decode_pcm_upload(b"", "audio/L16;rate=16000"), b"")
+        self.assertEqual(decode_pcm_upload(b"\x01", "audio/L16;rate=16000"), b"")
+
+    def test_truncated_wav_16_and_32_bit(self):
+        for width, rate in ((2, 16000), (2, 8000), (4, 16000), (3, 16000)):
+            with self.subTest(width=width, rate=rate):
+                wav = _truncated(_wav(b"\x00\x01\x02\x03\x04\x05" * 400, rate=rate, width=width), 1)
+                pcm = decode_pcm_upload(wav, "audio/wav")
+                self.assertIsNotNone(pcm)
+                self.assertEqual(len(pcm) % 2, 0)
+
+    def test_wav_zero_rate(self):
+        wav = bytearray(_wav(b"\x00\x00" * 100))
+        struct.pack_into("<I", wav, 24, 0)
+        with self.assertRaises(DecodeError):
+            decode_pcm_upload(bytes(wav), "audio/wav")
+
+    def test_not_pcm_goes_to_ffmpeg(self):
+        f = io.BytesIO(b"OggS" + b"\x00" * 100)
+        self.assertIsNone(decode_pcm_upload(f, "audio/ogg"))
+        self.assertEqual(f.tell(), 0)
+
+
+class TranscribeRouteTest(unittest.TestCase):
+    """Через /api/transcribe: битые тела — 400, а не 500 (распознаватель подменён)."""
+    def setUp(self):
+        from fastapi.testclient import TestClient
+        from backend import main
+        from backend.stt_pool import STTExecutor
+
+        stt = mock.Mock()
+        stt.transcribe_pcm.side_effect = lambda chunks: {"text": "", "raw": {"bytes": sum(map(len, chunks))}}
+        self.patches = [mock.patch.object(main, "_stt", lambda: stt),
+                        mock.patch.object(main, "STT_POOL", STTExecutor(workers=1, queue_max=4)),
+                        mock.patch.object(main, "VAD_ENABLED", False)]
+        for p in self.patches:
+            p.start()
+        self.client = TestClient(main.app)
+
+    def tearDown(self):
+        for p in reversed(self.patches):
+            p.stop()
+
+    def post(self, body: bytes, content_type: str):
+        return self.client.post("/api/transcribe", files={"file": ("a", body, content_type)})
+
+    def test_odd_length_l16_is_accepted(self):
+        r = self.post(b"\x00\x01" * 800 + b"\x02", "audio/L16;rate=16000")
+        self.assertEqual(r.status_code, 200, r.text)
+
+    def test_truncated_wav_is_accepted(self):
+        r = self.post(_truncated(_wav(b"\x00\x01" * 1600, rate=8000), 1), "audio/wav")
+        self.assertEqual(r.status_code, 200, r.text)
+
+    def test_malformed_headers_are_400(self):
+        for ct in ("audio/L16", "audio/L16;rate=0", "audio/L16;rate=16000;channels=0"):
+            with self.subTest(ct=ct):
+                self.assertEqual(self.post(b"\x00\x00" * 100, ct).status_code, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,164 @@
+# tests/test_rag.py
+"""
+RAG без Chroma и модели: подменённые коллекция и энкодер считают вызовы.
+Проверяются кэш эмбеддингов запросов (нормализация ключа, лимит по байтам)
+и склейка одновременных search() в один encode.
+
+    python -m unittest tests.test_rag
+"""
+import dataclasses
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from backend import rag as rag_module
+from backend.rag import RAG, _EmbeddingCache
+
+DIM = 4
+
+
+class FakeEncoder:
+    def __init__(self):
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def encode(self, texts):
+        with self._lock:
+            self.calls.append(list(texts))
+        return np.stack([np.full(DIM, len(t), dtype=np.float32) for t in texts])
+
+
+class FakeCollection:
+    def __init__(self):
+        self.calls = 0
+
+    def query(self, query_embeddings, n_results):
+        self.calls += 1
+        ids = [f"c{i}" for i in range(n_results)]
+        n = len(query_embeddings)
+        return {"ids": [ids] * n, "documents": [[f"doc {i}" for i in ids]] * n,
+                "metadatas": [[{"source": f"src/{i}"} for i in ids]] * n}
+
+
+class FakeClient:
+    collection = None
+
+    def __init__(self, **kwargs):
+        pass
+
+    def get_or_create_collection(self, name):
+        return FakeClient.collection
+
+
+class FakeChroma:
+    PersistentClient = FakeClient
+
+
+class RagCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.encoder = FakeEncoder()
+        FakeClient.collection = self.collection = FakeCollection()
+        # широкое окно: все потоки теста успевают в одну пачку; BM25 в пустой папке нет -> dense
+        cfg = dataclasses.replace(rag_module.cfg, CHROMA_DIR=self.tmp.name, RAG_BATCH_WINDOW_MS=200.0,
+                                  RAG_MODE="dense", TOP_K=2)
+        self.patches = [
+            mock.patch.object(rag_module, "cfg", cfg),
+            mock.patch.object(rag_module, "_import_chromadb", lambda: (FakeChroma, lambda **kw: None)),
+            mock.patch.object(rag_module, "get_encoder", lambda: self.encoder),
+        ]
+        for p in self.patches:
+            p.start()
+        self.rag = RAG()
+
+    def tearDown(self):
+        for p in reversed(self.patches):
+            p.stop()
+        self.tmp.cleanup()
+
+    def _concurrent(self, queries, top_ks=None):
+        top_ks = top_ks or [None] * len(queries)
+        barrier = threading.Barrier(len(queries))
+        results = [None] * len(queries)
+
+        def run(i):
+            barrier.wait()
+            results[i] = self.rag.search(queries[i], top_k=top_ks[i])
+
+        threads = [threading.Thread(target=run, args=(i,)) for i in range(len(queries))]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(5)
+        return results
+
+    def test_concurrent_searches_share_one_encode(self):
+        queries = [f"сұрақ {i}" for i in range(8)]
+        results = self._concurrent(queries)
+        self.assertEqual(len(self.encoder.calls), 1)
+        self.assertEqual(sorted(self.encoder.calls[0]), sorted(queries))
+        self.assertEqual(self.collection.calls, 1)
+        self.assertTrue(all(r == [("doc c0", "src/c0"), ("doc c1", "src/c1")] for r in results))
+        self.assertEqual(self.rag.stats()["modes"]["dense"], 8)
+
+    def test_duplicate_queries_in_batch_encoded_once(self):
+        self._concurrent(["нөкіс халқы", "Нөкіс  халқы", "нөкіс халқы "])
+        self.assertEqual(self.encoder.calls, [["нөкіс халқы"]])
+
+    def test_repeated_query_hits_cache(self):
+        self.rag.search("Нөкіс ауданы")
+        # регистр и пробелы не важны — тот же ключ кэша
+        self.rag.search("  нөкіс   АУДАНЫ ")
+        self.assertEqual(self.encoder.calls, [["нөкіс ауданы"]])
+        self.assertEqual(self.rag.cache.hits, 1)
+        # поиск в Chroma всё равно идёт — кэшируется только эмбеддинг
+        self.assertEqual(self.collection.calls, 2)
+
+    def test_mixed_top_k_in_one_batch(self):
+        # одна пачка, один запрос к Chroma на максимум top_k — каждому своя длина
+        r1, r3 = self._concurrent(["бір", "екі"], top_ks=[1, 3])
+        self.assertEqual((len(r1), len(r3)), (1, 3))
+        self.assertEqual(self.collection.calls, 1)
+
+    def test_search_many_uses_cache(self):
+        self.rag.search("бір")
+        out = self.rag.search_many(["БІР", "екі"], top_k=1)
+        self.assertEqual(out, [[("doc c0", "src/c0")]] * 2)
+        self.assertEqual(self.encoder.calls, [["бір"], ["екі"]])
+
+
+class EmbeddingCacheTest(unittest.TestCase):
+    def test_bounded_by_bytes(self):
+        vec = np.zeros(DIM, dtype=np.float32)  # 16 байт
+        cache = _EmbeddingCache(max_bytes=3 * vec.nbytes)
+        for i in range(5):
+            cache.put(str(i), vec.copy())
+        self.assertEqual(list(cache._data), ["2", "3", "4"])
+        self.assertLessEqual(cache._bytes, cache.max_bytes)
+        self.assertIsNone(cache.get("0"))
+        # больше всего кэша — не кладётся и ничего не вытесняет
+        cache.put("big", np.zeros(DIM * 4, dtype=np.float32))
+        self.assertIsNone(cache.get("big"))
+        self.assertEqual(len(cache._data), 3)
+
+    def test_get_refreshes_lru_order(self):
+        vec = np.zeros(DIM, dtype=np.float32)
+        cache = _EmbeddingCache(max_bytes=2 * vec.nbytes)
+        cache.put("a", vec)
+        cache.put("b", vec)
+        cache.get("a")
+        cache.put("c", vec)
+        self.assertEqual(list(cache._data), ["a", "c"])
+
+    def test_replacing_key_keeps_byte_count(self):
+        cache = _EmbeddingCache(max_bytes=1024)
+        cache.put("a", np.zeros(DIM, dtype=np.float32))
+        cache.put("a", np.zeros(DIM, dtype=np.float32))
+        self.assertEqual(cache._bytes, DIM * 4)
+
+
+if __name__ == "__main__":
+    unittest.main()